@@ -1,12 +1,11 @@
 #!/usr/bin/env python3
 
-from functions import remote_entrypoint, remote_entrypoint_addon, curl_command, map_family, is_valid_image, sim_home
+from functions import RenderConfig, InvalidImageError, render_config
 
 
-def install_root_from_source(image: str, root_version: str) -> str:
+def install_root_from_source(cfg: RenderConfig, root_version: str) -> str:
 	# On fedora/arch we install ROOT via the native package manager elsewhere
-	family = map_family(image)
-	if family in ("fedora", "archlinux"):
+	if cfg.family in ("fedora", "archlinux"):
 		return ""
 
 	root_install_dir = "/usr/local"
@@ -18,7 +17,7 @@ def install_root_from_source(image: str, root_version: str) -> str:
 	]
 	root_skip = "".join(f" -D{feature}=OFF" for feature in features_to_skip)
 
-	ep = remote_entrypoint_addon()
+	ep = cfg.entrypoint_addon
 
 	commands = "\n\n"
 	commands += "# ROOT installation from source\n"
@@ -27,9 +26,10 @@ def install_root_from_source(image: str, root_version: str) -> str:
 		f" && git clone -c advice.detachedHead=false --single-branch --depth=1 -b {root_version} {root_github} root_src \\\n"
 		" && mkdir -p root_build root \\\n"
 		" && cd root_build \\\n"
+		f" && eval \"$(bash {cfg.distcc_pool_script})\" \\\n"
 		f" && ( cmake{root_skip} -Dminimal=ON -DCMAKE_INSTALL_PREFIX=../root ../root_src >cmake_log.txt 2>cmake_err.txt \\\n"
 		"      || { rc=$?; cat cmake_err.txt cmake_log.txt; exit $rc; } ) \\\n"
-		" && ( cmake --build . --target install -j\"$(nproc)\" >build_log.txt 2>build_err.txt \\\n"
+		" && ( cmake --build . --target install -j\"$G4_BUILD_JOBS\" >build_log.txt 2>build_err.txt \\\n"
 		"      || { rc=$?; cat build_err.txt build_log.txt; exit $rc; } ) \\\n"
 		f" && rm -rf {root_install_dir}/root_src {root_install_dir}/root_build \\\n"
 	f" && echo \"cd {root_install_dir}/root/bin ; source thisroot.sh ; cd -\" >> {ep}\n"
@@ -41,7 +41,13 @@ def install_root_from_source(image: str, root_version: str) -> str:
 
 
 
-def install_meson(meson_version: str) -> str:
+def install_distcc_pool_arg() -> str:
+	# the source builds below (ROOT, Geant4) compile on distcc helpers with
+	# docker build --build-arg G4_DISTCC_HOSTS="node01/16 node02/16" (ci/distcc_pool.sh)
+	return "ARG G4_DISTCC_HOSTS=\n"
+
+
+def install_meson(cfg: RenderConfig, meson_version: str) -> str:
 	meson_location = f'https://github.com/mesonbuild/meson/releases/download/{meson_version}'
 	meson_file = f'meson-{meson_version}.tar.gz'
 	meson_remote_file = f'{meson_location}/{meson_file}'
@@ -49,21 +55,21 @@ def install_meson(meson_version: str) -> str:
 	commands = '\n'
 	commands += '# meson installation using tarball\n'
 	commands += f'RUN cd {meson_install_dir} \\\n'
-	commands += f'    && {curl_command(meson_remote_file)}  \\\n'
+	commands += f'    && {cfg.curl_command(meson_remote_file)}  \\\n'
 	commands += f'    && tar -xzf {meson_file} \\\n'
 	commands += f'    && rm {meson_file} \\\n'
 	commands += f'    && ln -s {meson_install_dir}/meson-{meson_version}/meson.py /usr/bin/meson\n'
 	return commands
 
 
-def install_novnc(novnc_ver: str) -> str:
+def install_novnc(cfg: RenderConfig, novnc_ver: str) -> str:
 	url = f"https://github.com/novnc/noVNC/archive/refs/tags/{novnc_ver}.tar.gz"
 	websockify_url = "https://github.com/novnc/websockify"
 
 	return (
 		"\n# Install noVNC\n"
 		"RUN mkdir -p /opt && cd /opt \\\n"
-		f"    && {curl_command(url)} \\\n"
+		f"    && {cfg.curl_command(url)} \\\n"
 		f"    && tar -xzf {novnc_ver}.tar.gz \\\n"
 		f"    && rm {novnc_ver}.tar.gz \\\n"
 		f"    && mv noVNC-{novnc_ver.lstrip('v')} /opt/novnc \\\n"
@@ -101,57 +107,61 @@ RUN pacman -Syu --noconfirm \
 
 # adding UPSTREAM_REV (which changes with every commit to g4install) so that this
 # function is never cached by docker
-def install_g4install(is_cvfms: bool, geant4_version: str) -> str:
-	g4install = sim_home(is_cvfms)
+def install_g4install(cfg: RenderConfig, geant4_version: str) -> str:
+	g4install = cfg.sim_home
 	commands = ''
 	commands += '\n# Clone g4install\n'
 	commands += 'ARG UPSTREAM_REV=unknown\n'
 	commands += f'RUN mkdir -p {g4install} \\\n'
 	commands += f'    && cd {g4install} \\\n'
 	commands += f'    && git clone --depth=1 https://github.com/gemc/g4install . \\\n'
-	commands += f'    && echo "module use {g4install}/modules" >> {remote_entrypoint_addon()} \\\n'
-	commands += f'    && echo "module load geant4/{geant4_version}" >> {remote_entrypoint_addon()}\n'
+	commands += f'    && echo "module use {g4install}/modules" >> {cfg.entrypoint_addon} \\\n'
+	commands += f'    && echo "module load geant4/{geant4_version}" >> {cfg.entrypoint_addon}\n'
 	return commands
 
 
-def install_clhep(version: str) -> str:
+def install_clhep(cfg: RenderConfig, version: str) -> str:
 	commands = f"\n# Install CLHEP {version}\n"
-	commands += f'RUN source {remote_entrypoint()} \\\n'
+	commands += f'RUN source {cfg.entrypoint} \\\n'
 	commands += f'    && install_clhep {version}\n'
 	return commands
 
 
-def install_xercesc(version: str) -> str:
+def install_xercesc(cfg: RenderConfig, version: str) -> str:
 	commands = f"\n# Install XERCESC {version}\n"
-	commands += f'RUN source {remote_entrypoint()} \\\n'
+	commands += f'RUN source {cfg.entrypoint} \\\n'
 	commands += f'    && install_xercesc {version}\n'
 	return commands
 
 
-def install_geant4(version: str) -> str:
+def install_geant4(cfg: RenderConfig, version: str, data_dir: str = "") -> str:
+	# with data_dir, the datasets come from the data image instead of the build
+	data = f"G4INSTALL_DATADIR={data_dir} " if data_dir else ""
 	commands = f"\n# Install Geant4 {version}\n"
-	commands += f"RUN cat {remote_entrypoint()} \\\n"
-	commands += f" && DOCKER_ENTRYPOINT_SOURCE_ONLY=1 . {remote_entrypoint()} \\\n"
-	commands += f" && install_geant4 {version}\n"
+	commands += f"RUN cat {cfg.entrypoint} \\\n"
+	commands += f" && DOCKER_ENTRYPOINT_SOURCE_ONLY=1 . {cfg.entrypoint} \\\n"
+	commands += f" && {data}install_geant4 {version}\n"
 	return commands
 
 
-def install_additional_libraries(image: str, geant4_version: str, root_version: str,
+def install_additional_libraries(cfg: RenderConfig, geant4_version: str, root_version: str,
                                  meson_version: str,
-                                 novnc_version: str) -> str:
+                                 novnc_version: str,
+                                 geant4_data_dir: str = "") -> str:
 	commands = '\n'
-	if image == "archlinux":
+	if cfg.image == "archlinux":
 		commands += install_envmod_on_arch()
 
 	commands += '\n# Install additional libraries\n'
 	commands += f'# ROOT version: {root_version}\n'
 	commands += f'# Meson version: {meson_version}\n'
 	commands += f'# noVNC version: {novnc_version}\n'
-	commands += install_root_from_source(image, root_version)
-	commands += install_meson(meson_version)
-	commands += install_novnc(novnc_version)
-	commands += install_g4install(True, geant4_version)
-	commands += install_geant4(geant4_version)
+	commands += install_distcc_pool_arg()
+	commands += install_root_from_source(cfg, root_version)
+	commands += install_meson(cfg, meson_version)
+	commands += install_novnc(cfg, novnc_version)
+	commands += install_g4install(cfg, geant4_version)
+	commands += install_geant4(cfg, geant4_version, geant4_data_dir)
 
 	return commands
 
@@ -198,10 +208,14 @@ def main():
 		parser.print_usage(sys.stderr)
 		sys.exit(2)
 
-	is_valid_image(args.image)
+	try:
+		cfg = render_config(args.image)
+	except InvalidImageError as e:
+		print(f"Error: {e}", file=sys.stderr)
+		sys.exit(1)
 
 	commands = install_additional_libraries(
-		args.image,
+		cfg,
 		args.geant4_version,
 		args.root_version,
 		args.meson_version,
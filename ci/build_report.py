@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# Image size, tarball size and build time tracking for the matrix cells of
+# ci/distros_tags.sh (<geant4>-<image>-<tag>-<arch>, e.g. 11.4.2-ubuntu-24.04-amd64).
+#
+# Everything is read from text captured at build time, so it also runs offline:
+#
+#   docker history --no-trunc --format '{{.Size}}\t{{.CreatedBy}}' IMAGE > history.txt
+#   docker buildx build --progress=plain ... 2> build.log
+#
+#   build_report.py add 11.4.2-ubuntu-24.04-amd64 --history-file report.json --csv report.csv \
+#       --docker-history history.txt --build-log build.log \
+#       --staging /dist/stage/runtime/<package> --tarball /dist/<package>.tar.gz
+#   build_report.py show report.json
+#   build_report.py cells
+#
+# One record per cell and commit holds flat metrics:
+#   layer/<step>        bytes of the image layers of a Dockerfile step (the
+#                       comment above it in the rendered Dockerfile)
+#   image/total         bytes of the image, base image included
+#   step_time/<step>    seconds BuildKit spent on a step (cached steps: none)
+#   component/<dir>     bytes of a top-level directory of the package_install.sh
+#                       staging tree (hard links counted once)
+#   tarball/<flavor>    bytes of the runtime, -debug and -static tarballs
+#   phase/<pkg>/<phase> seconds of the install script phases (the "timing:"
+#                       lines of install/functions.zsh)
+# `add` compares the new record with the previous one of the same cell and exits
+# 1 if a metric grew by more than --threshold percent (and by more than 1 MB or
+# 10 s, to ignore noise).
+import argparse
+import csv
+import datetime
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_FORMAT = 1
+DEFAULT_THRESHOLD = 10.0
+MIN_BYTES = 1000 ** 2
+MIN_SECONDS = 10.0
+BASE_IMAGE = "(base image)"
+BUILDKIT_SUFFIX = " # buildkit"
+
+# docker prints sizes with decimal units (go-units HumanSize)
+SIZE_UNITS = {"B": 1, "kB": 1000, "KB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3, "TB": 1000 ** 4}
+
+
+class ReportError(Exception):
+	pass
+
+
+def matrix_cells() -> List[dict]:
+	"""The cells of ci/distros_tags.sh, from the same ci/env.sh."""
+	script = (
+		'source ci/env.sh; '
+		'for g4 in $(get_geant4_tags); do for arch in $(get_cpu_architectures); do '
+		'for pair in "${OS_VERSIONS[@]}"; do '
+		'echo "$g4 ${pair%%=*} ${pair#*=} $arch $(get_root_tag $g4) $(get_meson_tag $g4) $(get_novnc_tag $g4)"; '
+		'done; done; done'
+	)
+	out = subprocess.check_output(["bash", "-c", script], cwd=os.path.dirname(SCRIPT_DIR), text=True)
+	cells = []
+	for line in out.splitlines():
+		g4, image, tag, arch, root, meson, novnc = line.split()
+		# archlinux is amd64-only
+		if image == "archlinux" and arch == "arm64":
+			continue
+		cells.append({"name": f"{g4}-{image}-{tag}-{arch}", "geant4_version": g4, "image": image, "tag": tag,
+		              "arch": arch, "root_version": root, "meson_version": meson, "novnc_version": novnc})
+	return cells
+
+
+def find_cell(name: str) -> dict:
+	for cell in matrix_cells():
+		if cell["name"] == name:
+			return cell
+	raise ReportError(f"unknown matrix cell '{name}' (see: build_report.py cells)")
+
+
+def render_dockerfile(cell: dict) -> str:
+	"""The Dockerfile CI builds for cell (deploy.yml: --with-package)."""
+	from dockerfile_creator import create_dockerfile
+	from functions import render_config
+	return create_dockerfile(render_config(cell["image"], cell["tag"]), cell["geant4_version"],
+	                         cell["root_version"], cell["meson_version"], cell["novnc_version"],
+	                         True, cell["arch"])
+
+
+def normalize(instruction: str, created_by: bool = False) -> str:
+	"""An instruction without whitespace, for matching. created_by: as docker
+	history prints it, with the build arguments and the shell of RUN steps."""
+	text = instruction.replace("\\\n", " ").strip()
+	text = re.sub(r"\s*# buildkit$", "", text)
+	keyword, _, rest = text.partition(" ")
+	keyword = keyword.upper()
+	if keyword == "RUN" and created_by:
+		# |2 ARG1=value ARG2=value: the build arguments of the step
+		match = re.match(r"\|(\d+)\s+", rest)
+		if match:
+			rest = rest[match.end():].split(None, int(match.group(1)))[-1]
+		rest = re.sub(r"^/bin/(ba)?sh -l?c ", "", rest)
+	elif keyword in ("ENV", "LABEL"):
+		# docker history drops the quotes of the values
+		rest = rest.replace('"', "")
+	return keyword + re.sub(r"\s+", "", rest)
+
+
+def dockerfile_steps(dockerfile: str) -> List[Tuple[str, str]]:
+	"""(label, normalized instruction) of the steps of the first stage. The
+	label is the first line of the comment block above the step, carried over
+	to the following steps of the same paragraph."""
+	steps = []
+	label = None
+	previous_comment = False
+	instruction = None
+	stages = 0
+	for line in dockerfile.splitlines():
+		if instruction is not None:
+			instruction += "\n" + line
+			if not line.endswith("\\"):
+				steps.append((label or instruction.split("\n")[0][:60].strip(), normalize(instruction)))
+				instruction = None
+			continue
+		stripped = line.strip()
+		if not stripped:
+			label = None
+			previous_comment = False
+		elif stripped.startswith("#"):
+			if not previous_comment:
+				label = stripped.lstrip("#").strip()
+			previous_comment = True
+		else:
+			previous_comment = False
+			if stripped.upper().startswith("FROM "):
+				stages += 1
+				if stages > 1:
+					break
+				continue
+			instruction = line
+			if not line.endswith("\\"):
+				steps.append((label or line[:60].strip(), normalize(line)))
+				instruction = None
+	return steps
+
+
+def match_step(text: str, steps: List[Tuple[str, str]], used: set, created_by: bool = False) -> Optional[str]:
+	"""Label of the first unused step matching text (which may be truncated)."""
+	truncated = text.rstrip().endswith(("…", "..."))
+	text = text.rstrip().rstrip("…").rstrip(".")
+	if truncated:
+		# a cut " # buildkit" suffix
+		for end in range(len(BUILDKIT_SUFFIX), 1, -1):
+			if text.endswith(BUILDKIT_SUFFIX[:end]):
+				text = text[:-end]
+				break
+	key = normalize(text, created_by)
+	for i, (label, normalized) in enumerate(steps):
+		if i not in used and (normalized == key or (truncated and normalized.startswith(key))):
+			used.add(i)
+			return label
+	return None
+
+
+def parse_size(text: str) -> int:
+	match = re.fullmatch(r"\s*([\d.]+)\s*([kKMGT]?B)\s*", text)
+	if not match:
+		raise ReportError(f"cannot parse size '{text}'")
+	return int(round(float(match.group(1)) * SIZE_UNITS[match.group(2)]))
+
+
+def parse_docker_history(lines: List[str]) -> List[Tuple[int, str]]:
+	"""(bytes, created by) of each layer, newest first. Reads the
+	--format '{{.Size}}\\t{{.CreatedBy}}' output or the default table."""
+	lines = [line.rstrip("\n") for line in lines if line.strip()]
+	layers = []
+	if lines and lines[0].startswith("IMAGE") and "CREATED BY" in lines[0]:
+		header = lines[0]
+		created_by = header.index("CREATED BY")
+		size = header.index("SIZE")
+		comment = header.find("COMMENT")
+		for line in lines[1:]:
+			size_text = line[size:comment if comment > 0 else None].split()[0]
+			layers.append((parse_size(size_text), line[created_by:size].strip()))
+		return layers
+	for line in lines:
+		size_text, _, created = line.partition("\t")
+		layers.append((parse_size(size_text), created))
+	return layers
+
+
+def layer_sizes(layers: List[Tuple[int, str]], steps: List[Tuple[str, str]]) -> Dict[str, int]:
+	sizes = {}
+	used = set()
+	# oldest first, in the order of the Dockerfile
+	for size, created in reversed(layers):
+		label = match_step(created, steps, used, created_by=True) or BASE_IMAGE
+		sizes[label] = sizes.get(label, 0) + size
+	return sizes
+
+
+def parse_build_log(lines: List[str], steps: List[Tuple[str, str]]) -> Dict[str, float]:
+	"""Seconds per step of a `--progress=plain` BuildKit log, final stage only."""
+	names = {}
+	times = {}
+	for line in lines:
+		line = line.rstrip("\n")
+		match = re.match(r"#(\d+) \[(\S+) +\d+/\d+\] (.*)$", line)
+		if match:
+			if match.group(2) == "final":
+				names[match.group(1)] = match.group(3)
+			continue
+		match = re.match(r"#(\d+) DONE ([\d.]+)s$", line)
+		if match and match.group(1) in names:
+			times[match.group(1)] = float(match.group(2))
+	used = set()
+	step_times = {}
+	for step_id, seconds in sorted(times.items(), key=lambda item: int(item[0])):
+		label = match_step(names[step_id], steps, used)
+		if label is not None:
+			step_times[label] = round(step_times.get(label, 0.0) + seconds, 1)
+	return step_times
+
+
+def parse_install_log(lines: List[str]) -> Dict[str, float]:
+	"""Seconds per package and phase from the ' > timing: <package> <phase> <s>s'
+	lines of install/functions.zsh."""
+	phases = {}
+	for line in lines:
+		match = re.search(r" > timing: (\S+) (\S+) ([\d.]+)s", line)
+		if match:
+			key = f"{match.group(1)}/{match.group(2)}"
+			phases[key] = phases.get(key, 0.0) + float(match.group(3))
+	return phases
+
+
+def component_sizes(staging: str) -> Dict[str, int]:
+	"""Bytes per top-level entry of a staging tree; top-level files are summed
+	as "(files)". Hard-linked files (package_install.sh --dedupe) count once."""
+	sizes = {}
+	seen = set()
+	for entry in sorted(os.listdir(staging)):
+		path = os.path.join(staging, entry)
+		name = entry if os.path.isdir(path) and not os.path.islink(path) else "(files)"
+		paths = [path]
+		if name != "(files)":
+			paths = [os.path.join(dirpath, f) for dirpath, _, files in os.walk(path) for f in files]
+		for file_path in paths:
+			st = os.lstat(file_path)
+			if (st.st_dev, st.st_ino) in seen:
+				continue
+			seen.add((st.st_dev, st.st_ino))
+			sizes[name] = sizes.get(name, 0) + st.st_size
+	return sizes
+
+
+def manifest_component_sizes(manifest: dict) -> Dict[str, int]:
+	"""component_sizes() from a geant4-manifest.json (ci/tarball_update.py)."""
+	sizes = {}
+	for rel, entry in manifest["files"].items():
+		name = rel.split("/", 1)[0] if "/" in rel else "(files)"
+		sizes[name] = sizes.get(name, 0) + entry["size"]
+	return sizes
+
+
+def tarball_flavor(path: str) -> str:
+	name = os.path.basename(path)
+	for flavor in ("debug", "static"):
+		if name.endswith(f"-{flavor}.tar.gz"):
+			return flavor
+	return "runtime"
+
+
+def read_lines(path: str) -> List[str]:
+	with open(path, encoding="utf-8", errors="replace") as f:
+		return f.readlines()
+
+
+def git_commit() -> str:
+	try:
+		return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR,
+		                               text=True, stderr=subprocess.DEVNULL).strip()
+	except (OSError, subprocess.CalledProcessError):
+		return "unknown"
+
+
+def collect(cell: dict, dockerfile: Optional[str] = None, docker_history: Optional[str] = None,
+            build_log: Optional[str] = None, install_logs: Optional[List[str]] = None,
+            staging: Optional[str] = None, manifest: Optional[str] = None,
+            tarballs: Optional[List[str]] = None, commit: Optional[str] = None) -> dict:
+	metrics = {}
+	if docker_history or build_log:
+		steps = dockerfile_steps(dockerfile if dockerfile is not None else render_dockerfile(cell))
+		if docker_history:
+			layers = parse_docker_history(read_lines(docker_history))
+			for label, size in layer_sizes(layers, steps).items():
+				metrics[f"layer/{label}"] = size
+			metrics["image/total"] = sum(size for size, _ in layers)
+		if build_log:
+			for label, seconds in parse_build_log(read_lines(build_log), steps).items():
+				metrics[f"step_time/{label}"] = seconds
+	for log in install_logs or []:
+		for key, seconds in parse_install_log(read_lines(log)).items():
+			metrics[f"phase/{key}"] = metrics.get(f"phase/{key}", 0.0) + seconds
+	if staging:
+		for name, size in component_sizes(staging).items():
+			metrics[f"component/{name}"] = size
+	elif manifest:
+		with open(manifest, encoding="utf-8") as f:
+			for name, size in manifest_component_sizes(json.load(f)).items():
+				metrics[f"component/{name}"] = size
+	for tarball in tarballs or []:
+		metrics[f"tarball/{tarball_flavor(tarball)}"] = os.path.getsize(tarball)
+	if not metrics:
+		raise ReportError("nothing to report: give at least one input")
+	return {
+		"cell": cell["name"],
+		"geant4_version": cell["geant4_version"],
+		"image": cell["image"],
+		"tag": cell["tag"],
+		"arch": cell["arch"],
+		"commit": commit or git_commit(),
+		"date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+		"metrics": metrics,
+	}
+
+
+def load_history(path: str) -> dict:
+	if not os.path.exists(path):
+		return {"format": HISTORY_FORMAT, "records": []}
+	with open(path, encoding="utf-8") as f:
+		history = json.load(f)
+	if history.get("format") != HISTORY_FORMAT:
+		raise ReportError(f"{path}: unsupported history format {history.get('format')}")
+	return history
+
+
+def save_history(path: str, history: dict):
+	tmp = f"{path}.tmp"
+	with open(tmp, "w", encoding="utf-8") as f:
+		json.dump(history, f, indent=1, sort_keys=True)
+		f.write("\n")
+	os.replace(tmp, path)
+
+
+def write_csv(path: str, history: dict):
+	"""One row per record and metric, for spreadsheets and plotting."""
+	with open(path, "w", newline="", encoding="utf-8") as f:
+		writer = csv.writer(f)
+		writer.writerow(["date", "commit", "cell", "geant4_version", "image", "tag", "arch", "metric", "value"])
+		for record in history["records"]:
+			for metric, value in sorted(record["metrics"].items()):
+				writer.writerow([record["date"], record["commit"], record["cell"], record["geant4_version"],
+				                 record["image"], record["tag"], record["arch"], metric, value])
+
+
+def is_time(metric: str) -> bool:
+	return metric.startswith(("step_time/", "phase/"))
+
+
+def human(metric: str, value: float) -> str:
+	if is_time(metric):
+		return f"{value:.0f} s"
+	return f"{value / 1000 ** 2:.1f} MB"
+
+
+def regressions(previous: dict, current: dict, threshold: float = DEFAULT_THRESHOLD) -> List[dict]:
+	"""Metrics of current more than threshold percent above previous."""
+	found = []
+	for metric, value in sorted(current["metrics"].items()):
+		old = previous["metrics"].get(metric)
+		if not old:
+			continue
+		change = 100.0 * (value - old) / old
+		noise = MIN_SECONDS if is_time(metric) else MIN_BYTES
+		if change > threshold and value - old > noise:
+			found.append({"metric": metric, "previous": old, "current": value, "change": round(change, 1)})
+	return found
+
+
+def previous_record(history: dict, cell: str) -> Optional[dict]:
+	for record in reversed(history["records"]):
+		if record["cell"] == cell:
+			return record
+	return None
+
+
+def add(history_file: str, record: dict, csv_file: Optional[str] = None,
+        threshold: float = DEFAULT_THRESHOLD) -> List[dict]:
+	"""Append record to the history and return its regressions."""
+	history = load_history(history_file)
+	previous = previous_record(history, record["cell"])
+	found = regressions(previous, record, threshold) if previous else []
+	history["records"].append(record)
+	save_history(history_file, history)
+	if csv_file:
+		write_csv(csv_file, history)
+	return found
+
+
+def show(history: dict, cell: Optional[str] = None):
+	latest = {}
+	for record in history["records"]:
+		latest[record["cell"]] = record
+	for name in sorted(latest):
+		if cell and name != cell:
+			continue
+		record = latest[name]
+		print(f"{name}  ({record['commit']}, {record['date']})")
+		for metric, value in sorted(record["metrics"].items()):
+			print(f"  {metric:<60} {human(metric, value):>12}")
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Image size, tarball size and build time tracking")
+	sub = parser.add_subparsers(dest="command", required=True)
+
+	add_parser = sub.add_parser("add", help="add the report of a matrix cell to a history file")
+	add_parser.add_argument("cell", help="matrix cell, e.g. 11.4.2-ubuntu-24.04-amd64")
+	add_parser.add_argument("--history-file", required=True, help="JSON history, created if missing")
+	add_parser.add_argument("--csv", help="also write the whole history as CSV")
+	add_parser.add_argument("--dockerfile", help="the Dockerfile that was built (default: rendered for the cell)")
+	add_parser.add_argument("--docker-history", help="docker history output (--format '{{.Size}}\\t{{.CreatedBy}}' or the table)")
+	add_parser.add_argument("--build-log", help="docker build --progress=plain log")
+	add_parser.add_argument("--install-log", action="append", help="install script output (repeatable)")
+	add_parser.add_argument("--staging", help="package_install.sh staging tree (the package root)")
+	add_parser.add_argument("--manifest", help="geant4-manifest.json, instead of --staging")
+	add_parser.add_argument("--tarball", action="append", help="binary tarball (repeatable)")
+	add_parser.add_argument("--commit", help="commit of the build (default: git HEAD)")
+	add_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+	                        help="regression threshold in percent (default: %(default)s)")
+
+	show_parser = sub.add_parser("show", help="print the latest record of each cell")
+	show_parser.add_argument("history_file")
+	show_parser.add_argument("--cell")
+
+	sub.add_parser("cells", help="list the matrix cells")
+
+	args = parser.parse_args()
+	try:
+		if args.command == "add":
+			dockerfile = None
+			if args.dockerfile:
+				with open(args.dockerfile, encoding="utf-8") as f:
+					dockerfile = f.read()
+			record = collect(find_cell(args.cell), dockerfile, args.docker_history, args.build_log,
+			                 args.install_log, args.staging, args.manifest, args.tarball, args.commit)
+			found = add(args.history_file, record, args.csv, args.threshold)
+			print(f"{args.cell}: {len(record['metrics'])} metrics added to {args.history_file}")
+			for item in found:
+				print(f"REGRESSION {item['metric']}: {human(item['metric'], item['previous'])} -> "
+				      f"{human(item['metric'], item['current'])} (+{item['change']}%)")
+			return 1 if found else 0
+		if args.command == "show":
+			show(load_history(args.history_file), args.cell)
+		elif args.command == "cells":
+			for cell in matrix_cells():
+				print(cell["name"])
+	except (OSError, ValueError, ReportError) as e:
+		print(f"Error: {e}", file=sys.stderr)
+		return 1
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env bash
+
+# Size Geant4 multithreading to the CPUs this container may actually use.
+#
+# Containers see every core of the host, while Kubernetes and Slurm cap them
+# with a cgroup CPU quota, a cpuset and a memory limit. An application that
+# starts one thread per host core then oversubscribes its quota and its
+# throughput collapses. From the cgroup (v1 or v2) limits this computes
+#
+#   threads = min(CPU quota, cpuset, nproc, memory limit / per-thread memory)
+#
+# and, when a quota, cpuset or memory limit is below nproc (or G4_THREADS is
+# set), exports unless they are already set:
+#   G4FORCENUMBEROFTHREADS  Geant4 MT, tasking and TBB run managers
+#   PTL_NUM_THREADS         the Geant4 tasking thread pool
+#   OMP_NUM_THREADS         OpenMP code in user applications
+# Without such a limit (a workstation, a container without limits) the
+# applications keep choosing their thread count. G4_CPU_LIMIT always holds the
+# computed value.
+#
+# Sourced by docker-entrypoint.sh and by the binary tarball's geant4.env (bash
+# or zsh). Run it to see the reasoning:
+#
+#   g4-cpu-limits --explain
+#   eval "$(g4-cpu-limits)"        # print the exports instead of sourcing
+#
+# Overrides: G4_CPU_AUTOTUNE=0 turns it off; G4_THREADS=N forces N threads;
+# G4_MEMORY_PER_THREAD_MB (default 400) and G4_MEMORY_BASE_MB (default 600)
+# size the memory bound; G4_CGROUP_ROOT (default /sys/fs/cgroup) and
+# G4_CGROUP_NPROC replace the cgroup mount and nproc, for tests.
+
+# first line of a file, in g4_cl_value; fails if it cannot be read
+g4_cl_read() {
+	g4_cl_value=""
+	[ -r "$1" ] && read -r g4_cl_value <"$1" 2>/dev/null
+	[ -n "$g4_cl_value" ]
+}
+
+# number of CPUs in a cpuset list such as 0-3,8,10-11
+g4_cl_count_cpus() {
+	local list="$1" item count=0
+	while [ -n "$list" ]; do
+		item="${list%%,*}"
+		case "$list" in
+			*,*) list="${list#*,}" ;;
+			*) list="" ;;
+		esac
+		case "$item" in
+			*-*) count=$((count + ${item#*-} - ${item%-*} + 1)) ;;
+			"") ;;
+			*) count=$((count + 1)) ;;
+		esac
+	done
+	echo "$count"
+}
+
+# sets G4_CPU_LIMIT, g4_cl_reason and g4_cl_explain
+g4_cl_detect() {
+	local root="${G4_CGROUP_ROOT:-/sys/fs/cgroup}"
+	local quota="" period="" cpuset="" memory="" limit reason dir
+	local per_thread="${G4_MEMORY_PER_THREAD_MB:-400}" base="${G4_MEMORY_BASE_MB:-600}"
+
+	if [ -r "$root/cgroup.controllers" ]; then
+		g4_cl_explain="cgroup v2 at $root"
+		if g4_cl_read "$root/cpu.max"; then
+			quota="${g4_cl_value%% *}"
+			period="${g4_cl_value#* }"
+			[ "$quota" = "max" ] && quota=""
+		fi
+		g4_cl_read "$root/cpuset.cpus.effective" && cpuset="$g4_cl_value"
+		if g4_cl_read "$root/memory.max"; then
+			[ "$g4_cl_value" = "max" ] || memory="$g4_cl_value"
+		fi
+	else
+		g4_cl_explain="cgroup v1 at $root"
+		for dir in "$root/cpu,cpuacct" "$root/cpu"; do
+			if g4_cl_read "$dir/cpu.cfs_quota_us"; then
+				[ "$g4_cl_value" -gt 0 ] 2>/dev/null && quota="$g4_cl_value"
+				g4_cl_read "$dir/cpu.cfs_period_us" && period="$g4_cl_value"
+				break
+			fi
+		done
+		g4_cl_read "$root/cpuset/cpuset.effective_cpus" || g4_cl_read "$root/cpuset/cpuset.cpus"
+		cpuset="$g4_cl_value"
+		if g4_cl_read "$root/memory/memory.limit_in_bytes"; then
+			# "unlimited" is reported as a number close to 2^63
+			[ "${#g4_cl_value}" -lt 19 ] && memory="$g4_cl_value"
+		fi
+	fi
+
+	limit="${G4_CGROUP_NPROC:-$(nproc 2>/dev/null || getconf _NPROCESSORS_ONLN 2>/dev/null || echo 1)}"
+	reason="nproc"
+	g4_cl_explain="$g4_cl_explain
+  nproc (host CPUs usable by this process): $limit"
+
+	if [ -n "$quota" ] && [ -n "$period" ] && [ "$period" -gt 0 ] 2>/dev/null; then
+		local quota_cpus=$((quota / period))
+		[ "$quota_cpus" -lt 1 ] && quota_cpus=1
+		g4_cl_explain="$g4_cl_explain
+  CPU quota: $quota/$period us = $((quota * 100 / period))% of a CPU -> $quota_cpus threads"
+		if [ "$quota_cpus" -lt "$limit" ]; then
+			limit="$quota_cpus"
+			reason="CPU quota"
+		fi
+	else
+		g4_cl_explain="$g4_cl_explain
+  CPU quota: none"
+	fi
+
+	if [ -n "$cpuset" ]; then
+		local cpuset_cpus
+		cpuset_cpus="$(g4_cl_count_cpus "$cpuset")"
+		g4_cl_explain="$g4_cl_explain
+  cpuset: $cpuset -> $cpuset_cpus CPUs"
+		if [ "$cpuset_cpus" -gt 0 ] && [ "$cpuset_cpus" -lt "$limit" ]; then
+			limit="$cpuset_cpus"
+			reason="cpuset"
+		fi
+	else
+		g4_cl_explain="$g4_cl_explain
+  cpuset: none"
+	fi
+
+	if [ -n "$memory" ]; then
+		local memory_mb=$((memory / 1048576)) memory_threads
+		memory_threads=$(((memory_mb - base) / per_thread))
+		[ "$memory_threads" -lt 1 ] && memory_threads=1
+		g4_cl_explain="$g4_cl_explain
+  memory limit: $memory_mb MB -> ($memory_mb - $base) / $per_thread MB per thread = $memory_threads threads"
+		if [ "$memory_threads" -lt "$limit" ]; then
+			limit="$memory_threads"
+			reason="memory limit"
+		fi
+	else
+		g4_cl_explain="$g4_cl_explain
+  memory limit: none"
+	fi
+
+	if [ -n "${G4_THREADS:-}" ]; then
+		limit="$G4_THREADS"
+		reason="G4_THREADS"
+	fi
+	G4_CPU_LIMIT="$limit"
+	g4_cl_reason="$reason"
+	g4_cl_explain="$g4_cl_explain
+  => $limit threads (bound by $reason)"
+}
+
+# export the variables that are not set yet
+g4_cpu_limits() {
+	[ "${G4_CPU_AUTOTUNE:-1}" = "0" ] && return 0
+	g4_cl_detect
+	export G4_CPU_LIMIT
+	# nothing below the host CPUs: do not force the thread count
+	[ "$g4_cl_reason" = "nproc" ] && return 0
+	local name
+	for name in G4FORCENUMBEROFTHREADS PTL_NUM_THREADS OMP_NUM_THREADS; do
+		eval "[ -n \"\${$name:-}\" ]" || export "$name=$G4_CPU_LIMIT"
+	done
+}
+
+if [ -n "${BASH_VERSION:-}" ] && [ "${BASH_SOURCE[0]}" = "$0" ]; then
+	# executed, not sourced
+	case "${1:-}" in
+		--explain)
+			if [ "${G4_CPU_AUTOTUNE:-1}" = "0" ]; then
+				echo "G4_CPU_AUTOTUNE=0: thread auto-tuning is off"
+				exit 0
+			fi
+			g4_cl_detect
+			echo "$g4_cl_explain"
+			for name in G4FORCENUMBEROFTHREADS PTL_NUM_THREADS OMP_NUM_THREADS; do
+				if [ "$g4_cl_reason" = "nproc" ]; then
+					echo "  $name not set (no limit below nproc)"
+				elif [ -n "${!name:-}" ]; then
+					echo "  $name=${!name} (already set, kept)"
+				else
+					echo "  $name=$G4_CPU_LIMIT"
+				fi
+			done
+			;;
+		"")
+			g4_cpu_limits
+			for name in G4_CPU_LIMIT G4FORCENUMBEROFTHREADS PTL_NUM_THREADS OMP_NUM_THREADS; do
+				[ -n "${!name:-}" ] && echo "export $name=${!name}"
+			done
+			;;
+		*)
+			echo "Usage: ${0##*/} [--explain]" >&2
+			exit 2
+			;;
+	esac
+else
+	g4_cpu_limits
+	unset -f g4_cl_read g4_cl_count_cpus g4_cl_detect g4_cpu_limits
+	unset g4_cl_value g4_cl_reason g4_cl_explain
+fi
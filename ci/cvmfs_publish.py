@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# Prepare an installed SIM_HOME/<osrelease> tree for publication on CVMFS.
+#
+#   catalogs  write .cvmfscatalog markers so that each install prefix
+#             (<package>/<version>), each Geant4 dataset and any other subtree
+#             large enough gets its own nested catalog: a job then downloads
+#             the catalogs of what it uses, not one catalog of the whole tree
+#   trace     run a command (e.g. `module load geant4/11.4.2 && exampleB1`)
+#             under strace and keep the log
+#   prefetch  turn strace logs into the list of files under the tree, in
+#             first-access order
+#   warm      read the files of a prefetch list in parallel, to fill the
+#             CVMFS cache of a fresh node before the first job
+#   pack-data write one uncompressed tar per Geant4 dataset: one large file is
+#             fetched in a few big chunks instead of thousands of small
+#             requests; install_geant4_data.sh unpacks them from
+#             GEANT4_DATA_PACK_DIR
+#
+# Example, on the publisher:
+#   ci/cvmfs_publish.py catalogs $SIM_HOME
+#   ci/cvmfs_publish.py trace -o startup.strace -- bash -lc 'module load geant4/11.4.2 && exampleB1 run1.mac'
+#   ci/cvmfs_publish.py prefetch --root $SIM_HOME startup.strace > $SIM_HOME/prefetch.list
+#   ci/cvmfs_publish.py pack-data $SIM_HOME --output $SIM_HOME/geant4-data-packs
+# and on a worker node:
+#   ci/cvmfs_publish.py warm $SIM_HOME/prefetch.list
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+CATALOG_MARKER = ".cvmfscatalog"
+
+# CVMFS recommends nested catalogs of a few thousand to ~200k entries
+DEFAULT_THRESHOLD = 20000
+DEFAULT_MIN_ENTRIES = 1000
+
+# <package>/<version> install prefixes, as laid out by the modulefiles
+VERSION_DIR = re.compile(r"^\d[\w.+-]*$|^dev$")
+
+# path arguments of the file syscalls in an strace -f log
+STRACE_CALL = re.compile(
+	r'^(?:\[pid\s+)?\d*\]?\s*(?:open|openat|openat2|stat|lstat|newfstatat|statx|access|faccessat2?|execve|readlink)'
+	r'\((?:AT_FDCWD|-?\d+)?,?\s*"([^"]+)"')
+STRACE_FAILED = re.compile(r"=\s+-1\s+E[A-Z]+")
+
+
+class PublishError(Exception):
+	pass
+
+
+def dataset_dirs(root: str) -> List[str]:
+	"""Geant4 dataset directories: the children of every share/Geant4*/data."""
+	found = []
+	for dirpath, dirnames, _ in os.walk(root):
+		if os.path.basename(dirpath) == "data" and os.path.basename(os.path.dirname(dirpath)).startswith("Geant4"):
+			found += [os.path.join(dirpath, d) for d in sorted(dirnames)]
+			dirnames[:] = []
+	return found
+
+
+def is_install_prefix(root: str, path: str) -> bool:
+	"""<package>/<version> directly under root (the SIM_HOME/<osrelease> tree)."""
+	rel = os.path.relpath(path, root).split(os.sep)
+	return len(rel) == 2 and bool(VERSION_DIR.match(rel[1]))
+
+
+def plan_catalogs(root: str, threshold: int = DEFAULT_THRESHOLD,
+                  min_entries: int = DEFAULT_MIN_ENTRIES) -> List[str]:
+	"""Directories that should get a nested catalog, sorted.
+
+	Install prefixes and datasets with at least min_entries entries always get
+	one; any other directory gets one when the entries it would otherwise keep
+	in its parent's catalog reach threshold."""
+	datasets = set(dataset_dirs(root))
+	remaining: Dict[str, int] = {}
+	catalogs = []
+	for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+		count = len(filenames) + sum(1 for d in dirnames if os.path.islink(os.path.join(dirpath, d)))
+		for d in dirnames:
+			child = os.path.join(dirpath, d)
+			if child in remaining:
+				# the directory entry itself stays in this catalog
+				count += 1 + remaining.pop(child)
+		if CATALOG_MARKER in filenames:
+			count -= 1
+		if dirpath != root:
+			boundary = (dirpath in datasets or is_install_prefix(root, dirpath)) and count >= min_entries
+			if boundary or count >= threshold:
+				catalogs.append(dirpath)
+				count = 0
+		remaining[dirpath] = count
+	return sorted(catalogs)
+
+
+def write_catalogs(root: str, catalogs: List[str], clean: bool = False) -> int:
+	"""Create the markers; with clean, remove the ones not in catalogs first."""
+	wanted = set(catalogs)
+	if clean:
+		for dirpath, _, filenames in os.walk(root):
+			if CATALOG_MARKER in filenames and dirpath not in wanted and dirpath != root:
+				os.remove(os.path.join(dirpath, CATALOG_MARKER))
+	for path in catalogs:
+		open(os.path.join(path, CATALOG_MARKER), "a").close()
+	return len(catalogs)
+
+
+def parse_strace(lines, root: str) -> List[str]:
+	"""Regular files under root touched by successful calls, in first-access order."""
+	root = os.path.normpath(root) + os.sep
+	seen = {}
+	for line in lines:
+		if STRACE_FAILED.search(line):
+			continue
+		match = STRACE_CALL.match(line.strip())
+		if not match:
+			continue
+		path = os.path.normpath(match.group(1))
+		if path.startswith(root) and path not in seen and os.path.isfile(path):
+			seen[path] = None
+	return list(seen)
+
+
+def trace(command: List[str], output: str) -> int:
+	strace = shutil.which("strace")
+	if strace is None:
+		raise PublishError("strace not found")
+	return subprocess.run([strace, "-f", "-qq", "-e", "trace=%file,execve", "-o", output, *command]).returncode
+
+
+def warm(paths: List[str], jobs: int = 16) -> int:
+	"""Read every file once; returns the number of bytes read."""
+	def read(path: str) -> int:
+		size = 0
+		try:
+			with open(path, "rb") as f:
+				for block in iter(lambda: f.read(1024 * 1024), b""):
+					size += len(block)
+		except OSError:
+			pass
+		return size
+
+	with ThreadPoolExecutor(max_workers=jobs) as pool:
+		return sum(pool.map(read, paths))
+
+
+def _reset(info: tarfile.TarInfo) -> tarfile.TarInfo:
+	info.uid = info.gid = 0
+	info.uname = info.gname = ""
+	return info
+
+
+def pack_dataset(directory: str, output_dir: str) -> dict:
+	"""Write <output_dir>/<dataset>.tar (reproducible: sorted, no owners)."""
+	name = os.path.basename(directory)
+	target = os.path.join(output_dir, f"{name}.tar")
+	tmp = f"{target}.tmp"
+	with tarfile.open(tmp, "w", format=tarfile.PAX_FORMAT) as tar:
+		tar.add(directory, arcname=name, recursive=False, filter=_reset)
+		for dirpath, dirnames, filenames in os.walk(directory):
+			dirnames.sort()
+			for entry in sorted(dirnames + filenames):
+				path = os.path.join(dirpath, entry)
+				arcname = os.path.join(name, os.path.relpath(path, directory))
+				tar.add(path, arcname=arcname, recursive=False, filter=_reset)
+	os.replace(tmp, target)
+	digest = hashlib.sha256()
+	with open(target, "rb") as f:
+		for block in iter(lambda: f.read(1024 * 1024), b""):
+			digest.update(block)
+	return {"tar": os.path.basename(target), "size": os.path.getsize(target), "sha256": digest.hexdigest()}
+
+
+def pack_data(root: str, output_dir: str, data_dir: Optional[str] = None) -> dict:
+	directories = ([os.path.join(data_dir, d) for d in sorted(os.listdir(data_dir))
+	                if os.path.isdir(os.path.join(data_dir, d))] if data_dir else dataset_dirs(root))
+	if not directories:
+		raise PublishError(f"no Geant4 datasets found under {data_dir or root}")
+	os.makedirs(output_dir, exist_ok=True)
+	index = {os.path.basename(d): pack_dataset(d, output_dir) for d in directories}
+	with open(os.path.join(output_dir, "index.json"), "w", encoding="utf-8") as f:
+		json.dump(index, f, indent=1, sort_keys=True)
+		f.write("\n")
+	return index
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Prepare a g4install tree for CVMFS")
+	sub = parser.add_subparsers(dest="command", required=True)
+
+	cat = sub.add_parser("catalogs", help="write .cvmfscatalog markers")
+	cat.add_argument("root", help="the SIM_HOME/<osrelease> tree")
+	cat.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+	                 help="entries that make any subtree a nested catalog (default: %(default)s)")
+	cat.add_argument("--min-entries", type=int, default=DEFAULT_MIN_ENTRIES,
+	                 help="smallest install prefix or dataset given its own catalog (default: %(default)s)")
+	cat.add_argument("--clean", action="store_true", help="remove markers that are no longer planned")
+	cat.add_argument("--dry-run", action="store_true", help="only print the planned catalogs")
+
+	trc = sub.add_parser("trace", help="run a command under strace")
+	trc.add_argument("-o", "--output", required=True, help="strace log")
+	trc.add_argument("cmd", nargs=argparse.REMAINDER, help="command (after --)")
+
+	pre = sub.add_parser("prefetch", help="prefetch list from strace logs")
+	pre.add_argument("--root", required=True, help="keep only files under this tree")
+	pre.add_argument("logs", nargs="+", help="strace -f logs")
+
+	wrm = sub.add_parser("warm", help="read the files of a prefetch list")
+	wrm.add_argument("list", help="prefetch list")
+	wrm.add_argument("-j", "--jobs", type=int, default=16, help="parallel readers (default: %(default)s)")
+
+	pck = sub.add_parser("pack-data", help="one tar per Geant4 dataset")
+	pck.add_argument("root", help="tree containing share/Geant4*/data")
+	pck.add_argument("--output", required=True, help="directory for the packs")
+	pck.add_argument("--data-dir", help="dataset directory, if not under share/Geant4*/data")
+
+	args = parser.parse_args()
+	try:
+		if args.command == "catalogs":
+			catalogs = plan_catalogs(os.path.abspath(args.root), args.threshold, args.min_entries)
+			if not args.dry_run:
+				write_catalogs(os.path.abspath(args.root), catalogs, args.clean)
+			for path in catalogs:
+				print(path)
+		elif args.command == "trace":
+			command = args.cmd[1:] if args.cmd[:1] == ["--"] else args.cmd
+			if not command:
+				parser.error("no command given")
+			sys.exit(trace(command, args.output))
+		elif args.command == "prefetch":
+			lines = []
+			for log in args.logs:
+				with open(log, encoding="utf-8", errors="replace") as f:
+					lines += f.readlines()
+			for path in parse_strace(lines, os.path.abspath(args.root)):
+				print(path)
+		elif args.command == "warm":
+			with open(args.list, encoding="utf-8") as f:
+				paths = [line.strip() for line in f if line.strip()]
+			size = warm(paths, args.jobs)
+			print(f"read {len(paths)} files, {size} bytes")
+		else:
+			index = pack_data(os.path.abspath(args.root), args.output, args.data_dir)
+			for name, entry in index.items():
+				print(f"{entry['tar']} {entry['size']}")
+	except (PublishError, OSError) as e:
+		print(f"Error: {e}", file=sys.stderr)
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env bash
+
+# Distribute the compilation of source installs on a pool of distcc helpers.
+#
+#   eval "$(distcc_pool.sh [local jobs])"
+#
+# G4_DISTCC_HOSTS lists the helpers in the DISTCC_HOSTS syntax, for example
+#
+#   G4_DISTCC_HOSTS="node01/16 node02/16 10.0.0.7:3700/8,lzo"
+#
+# Each helper runs distccd, listening on port 3632 unless given, and takes
+# /limit jobs (distcc's default: 4). Helpers that do not accept a connection
+# within G4_DISTCC_TIMEOUT seconds (default 2) are dropped; ssh helpers
+# (user@host) are used as listed. This prints the exports for
+#
+#   DISTCC_HOSTS                  the reachable helpers, plus localhost/<local jobs>
+#   CMAKE_<LANG>_COMPILER_LAUNCHER  distcc, read by cmake >= 3.17 on configure
+#   G4_BUILD_JOBS                 make -j: the helpers' jobs plus the local jobs
+#
+# G4_DISTCC_JOBS replaces the computed G4_BUILD_JOBS. Without G4_DISTCC_HOSTS,
+# without distcc, or when no helper is reachable, the build stays local:
+# G4_BUILD_JOBS is the local jobs, and launchers set to distcc (by an earlier
+# eval) are unset; other launchers, such as ccache, are kept. The reasoning
+# goes to stderr, for the build logs.
+
+local_jobs="${1:-$(nproc 2>/dev/null || getconf _NPROCESSORS_ONLN 2>/dev/null || echo 1)}"
+timeout_s="${G4_DISTCC_TIMEOUT:-2}"
+
+say() {
+	echo " > distcc: $*" >&2
+}
+
+# whether a TCP connection to host $1, port $2 succeeds within timeout_s
+reachable() {
+	if command -v timeout >/dev/null 2>&1; then
+		timeout "$timeout_s" bash -c 'exec 3<>"/dev/tcp/$0/$1"' "$1" "$2" 2>/dev/null
+	else
+		bash -c 'exec 3<>"/dev/tcp/$0/$1"' "$1" "$2" 2>/dev/null
+	fi
+}
+
+local_build() {
+	say "$1, compiling locally with $local_jobs jobs"
+	[ "${CMAKE_C_COMPILER_LAUNCHER:-}" = "distcc" ] && echo "unset CMAKE_C_COMPILER_LAUNCHER"
+	[ "${CMAKE_CXX_COMPILER_LAUNCHER:-}" = "distcc" ] && echo "unset CMAKE_CXX_COMPILER_LAUNCHER"
+	echo "export G4_BUILD_JOBS=${G4_DISTCC_JOBS:-$local_jobs}"
+	exit 0
+}
+
+[ -n "${G4_DISTCC_HOSTS:-}" ] || local_build "no G4_DISTCC_HOSTS"
+command -v distcc >/dev/null 2>&1 || local_build "distcc not installed"
+
+live=()
+remote_jobs=0
+has_localhost=0
+for entry in $G4_DISTCC_HOSTS; do
+	spec="${entry%%,*}"
+	limit=4
+	case "$spec" in
+		*/*) limit="${spec##*/}"; spec="${spec%%/*}" ;;
+	esac
+	case "$spec" in
+		localhost)
+			has_localhost=1
+			live+=("$entry")
+			continue
+			;;
+		*@*)
+			say "$spec: ssh helper, $limit jobs (not probed)"
+			;;
+		*)
+			host="${spec%%:*}"
+			port=3632
+			[ "$host" != "$spec" ] && port="${spec##*:}"
+			if ! reachable "$host" "$port"; then
+				say "$host:$port unreachable, skipped"
+				continue
+			fi
+			say "$host:$port up, $limit jobs"
+			;;
+	esac
+	live+=("$entry")
+	remote_jobs=$((remote_jobs + limit))
+done
+
+[ "$remote_jobs" -gt 0 ] || local_build "no helper reachable"
+
+# localhost compiles too (and preprocesses and links for everyone)
+[ "$has_localhost" = "1" ] || live+=("localhost/$local_jobs")
+jobs="${G4_DISTCC_JOBS:-$((remote_jobs + local_jobs))}"
+say "${#live[@]} hosts, $jobs jobs"
+
+printf 'export DISTCC_HOSTS=%q\n' "${live[*]}"
+echo "export CMAKE_C_COMPILER_LAUNCHER=distcc"
+echo "export CMAKE_CXX_COMPILER_LAUNCHER=distcc"
+echo "export G4_BUILD_JOBS=$jobs"
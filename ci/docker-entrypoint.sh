@@ -1,5 +1,34 @@
 #!/usr/bin/env bash
 
+# The image build records the environment produced below (modules init,
+# additional-entrycommands.sh) with create-env-snapshot. Apply it directly,
+# unless a file it was computed from changed since, or G4_ENV_SNAPSHOT=0.
+env_snapshot_is_current() {
+	snapshot_dir="${G4_ENV_SNAPSHOT_DIR:-/usr/local/share/gemc}"
+	snapshot="$snapshot_dir/env-snapshot.sh"
+	[ "${G4_ENV_SNAPSHOT:-1}" != "0" ] || return 1
+	[ -r "$snapshot" ] && [ -r "$snapshot_dir/env-snapshot.sources" ] || return 1
+	mapfile -t snapshot_sources <"$snapshot_dir/env-snapshot.sources"
+	newer=$(find "${snapshot_sources[@]}" -newer "$snapshot" -print -quit 2>/dev/null) || return 1
+	[ -z "$newer" ]
+}
+
+# Size Geant4 threads to the container's CPU quota, cpuset and memory limit
+# (g4-cpu-limits --explain). Only when starting the command: these limits are
+# those of the running container, not of the image build.
+apply_cpu_limits() {
+	cpu_limits="$(dirname "${BASH_SOURCE[0]}")/g4-cpu-limits"
+	# shellcheck disable=SC1090
+	[ -r "$cpu_limits" ] && . "$cpu_limits"
+}
+
+if [ "${DOCKER_ENTRYPOINT_SOURCE_ONLY:-}" != "1" ] && env_snapshot_is_current; then
+	# shellcheck disable=SC1090
+	. "$snapshot"
+	apply_cpu_limits
+	exec "$@"
+fi
+
 ensure_modules() {
 	die() {
 		printf     '%s\n' "ERROR: $*" >&2
@@ -83,5 +112,6 @@ export TERM=xterm-256color
 source additional-entrycommands.sh
 
 if [ "${DOCKER_ENTRYPOINT_SOURCE_ONLY:-}" != "1" ]; then
+	apply_cpu_limits
 	exec "$@"
 fi
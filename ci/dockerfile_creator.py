@@ -1,9 +1,5 @@
 #!/usr/bin/env python3
-from functions import map_family, is_valid_image, \
-	local_entrypoint, remote_entrypoint, \
-	local_entrypoint_addon, remote_entrypoint_addon, \
-	remote_novnc_startup_script, local_novnc_startup_script, remote_startup_dir, \
-	local_bashrc, remote_bashrc, local_inputrc, remote_inputrc, sim_home
+from functions import RenderConfig, InvalidImageError, render_config, local_geant4_data_fetch_script
 from packages import packages_install_command
 from additional_libraries import install_additional_libraries
 
@@ -27,29 +23,32 @@ cleanup_string_by_family = {
 }
 
 
-def copy_setup_file(image: str) -> str:
+def copy_setup_file(cfg: RenderConfig) -> str:
 	commands = "\n"
 	commands += "# Copy remote startup files\n"
-	commands += f"COPY {local_entrypoint()} {remote_entrypoint()} \n"
-	commands += f"COPY {local_entrypoint_addon()} {remote_entrypoint_addon()}\n"
-	commands += f"COPY {local_novnc_startup_script()} {remote_novnc_startup_script()}\n"
+	commands += f"COPY {cfg.local_entrypoint} {cfg.entrypoint} \n"
+	commands += f"COPY {cfg.local_entrypoint_addon} {cfg.entrypoint_addon}\n"
+	commands += f"COPY {cfg.local_novnc_startup_script} {cfg.novnc_startup_script}\n"
+	commands += f"COPY {cfg.local_env_snapshot_script} {cfg.env_snapshot_script}\n"
+	commands += f"COPY {cfg.local_g4bench_script} {cfg.g4bench_script}\n"
+	commands += f"COPY {cfg.local_cpu_limits_script} {cfg.cpu_limits_script}\n"
+	commands += f"COPY {cfg.local_distcc_pool_script} {cfg.distcc_pool_script}\n"
 	commands += "# Shell UX snippets (readline + aliases)\n"
-	commands += f"COPY {local_bashrc()} {remote_bashrc()} \n"
-	commands += f"COPY {local_inputrc()} {remote_inputrc()} \n"
+	commands += f"COPY {cfg.local_bashrc} {cfg.bashrc} \n"
+	commands += f"COPY {cfg.local_inputrc} {cfg.inputrc} \n"
 	commands += "\n# Create start-novnc.d directory and install functions\n"
-	commands += f'RUN install -d -m 0755 {remote_startup_dir()}/start-novnc.d \n'
+	commands += f'RUN install -d -m 0755 {cfg.startup_dir}/start-novnc.d \n'
 
-	family = map_family(image)
-	if family == "fedora":
-		commands += f"COPY ci/novnc/fedora.sh {remote_startup_dir()}/start-novnc.d/fedora.sh\n"
-	elif family == "debian":
-		commands += f"COPY ci/novnc/debian.sh {remote_startup_dir()}/start-novnc.d/debian.sh\n"
-	elif family == "archlinux":
-		commands += f"COPY ci/novnc/arch.sh {remote_startup_dir()}/start-novnc.d/arch.sh\n\n"
+	if cfg.family == "fedora":
+		commands += f"COPY ci/novnc/fedora.sh {cfg.startup_dir}/start-novnc.d/fedora.sh\n"
+	elif cfg.family == "debian":
+		commands += f"COPY ci/novnc/debian.sh {cfg.startup_dir}/start-novnc.d/debian.sh\n"
+	elif cfg.family == "archlinux":
+		commands += f"COPY ci/novnc/arch.sh {cfg.startup_dir}/start-novnc.d/arch.sh\n\n"
 
 	commands += "RUN /bin/bash -lc 'set -euo pipefail; \\\n"
-	commands += f"  br={remote_bashrc()}; \\\n"
-	commands += f"  in={remote_inputrc()}; \\\n"
+	commands += f"  br={cfg.bashrc}; \\\n"
+	commands += f"  in={cfg.inputrc}; \\\n"
 
 	# /etc/inputrc: append non-comment, non-empty lines only if file exists
 	commands += "  if [[ -f /etc/inputrc ]]; then \\\n"
@@ -77,53 +76,48 @@ def copy_setup_file(image: str) -> str:
 	return commands
 
 
-def docker_header(image: str, tag: str) -> str:
-	commands = f"FROM {image}:{tag} AS final\n"
+def docker_header(cfg: RenderConfig) -> str:
+	commands = f"FROM {cfg.image}:{cfg.tag} AS final\n"
 	commands += f"LABEL maintainer=\"Maurizio Ungaro <ungaro@jlab.org>\"\n\n"
 	commands += f"# run bash instead of sh\n"
 	commands += f"SHELL [\"/bin/bash\", \"-c\"]\n\n"
 	commands += f"# Make browser UI the default; users can override with \"docker run ... bash -il\"\n"
 	commands += f"# - Entrypoint is always executed\"\n"
 	commands += f"# - CMD provides the default arguments\"\n"
-	commands += f"ENTRYPOINT [\"{remote_entrypoint()}\"]\n\n"
-	commands += f"CMD [\"{remote_novnc_startup_script()}\"]\n\n"
+	commands += f"ENTRYPOINT [\"{cfg.entrypoint}\"]\n\n"
+	commands += f"CMD [\"{cfg.novnc_startup_script}\"]\n\n"
 	commands += f"ENV AUTOBUILD=1\n"
 	return commands
 
 
-def install_jlab_ca(image: str) -> str:
-	family = map_family(image)
-
+def install_jlab_ca(cfg: RenderConfig) -> str:
 	commands = "\n# Install JLab CA\n"
 	# notice: refresh the JLab CA certs in ci/assets/JLabCA.crt
 	# from https://pki.jlab.org/JLabCA.crt in case of expiration
-	if family == "fedora":
-		commands += "COPY ci/assets/JLabCA.crt /etc/pki/ca-trust/source/anchors/JLabCA.crt\n"
+	if cfg.family == "fedora":
+		commands += f"COPY ci/assets/JLabCA.crt {cfg.ca_certificate}\n"
 		commands += "RUN update-ca-trust\n\n"
-	elif family == "debian":
-		commands += "COPY ci/assets/JLabCA.crt /usr/local/share/ca-certificates/JLabCA.crt\n"
+	elif cfg.family == "debian":
+		commands += f"COPY ci/assets/JLabCA.crt {cfg.ca_certificate}\n"
 		commands += "RUN apt-get update && apt-get install -y --no-install-recommends ca-certificates && update-ca-certificates\n\n"
-	elif family == "archlinux":
-		commands += "COPY ci/assets/JLabCA.crt /etc/ca-certificates/trust-source/anchors/JLabCA.crt\n"
+	elif cfg.family == "archlinux":
+		commands += f"COPY ci/assets/JLabCA.crt {cfg.ca_certificate}\n"
 		commands += "RUN trust extract-compat\n\n"
 
 	return commands
 
 
-def additional_preamble(image: str, tag: str = "") -> str:
-	family = map_family(image)
-	is_alma = "almalinux" in image.lower()
-	is_alma9 = is_alma and tag.startswith("9")
+def additional_preamble(cfg: RenderConfig) -> str:
 	commands = "\n"
-	if family == "fedora":
-		if is_alma:
+	if cfg.family == "fedora":
+		if cfg.is_alma:
 			commands += (
 				"# AlmaLinux: enable CRB and synergy repos\n"
 				"RUN dnf install -y 'dnf-command(config-manager)' \\\n"
 				"    && dnf config-manager --set-enabled crb \\\n"
 				"    && dnf install -y almalinux-release-synergy \n\n"
 			)
-		if is_alma9:
+		if cfg.is_alma9:
 			commands += (
 				"# AlmaLinux 9 ships Python 3.9; pygemc and other tools require >=3.10.\n"
 				"# Install 3.11 from AppStream. The python3 symlink is set in\n"
@@ -132,21 +126,20 @@ def additional_preamble(image: str, tag: str = "") -> str:
 				"RUN dnf install -y python3.11 python3.11-devel \n\n"
 			)
 
-	elif family == "debian":
+	elif cfg.family == "debian":
 		commands += ""
 
-	elif family == "archlinux":
+	elif cfg.family == "archlinux":
 		commands += "RUN pacman-key --init && pacman-key --populate\\\n"
 		commands += "    && pacman -Sy --noconfirm archlinux-keyring\n\n"
 
 	return commands
 
 
-def post_package_setup(image: str, tag: str = "") -> str:
+def post_package_setup(cfg: RenderConfig) -> str:
 	"""Steps that must run after package installation.
 	Symlinks set here cannot be clobbered by dnf alternatives."""
-	is_alma9 = "almalinux" in image.lower() and tag.startswith("9")
-	if is_alma9:
+	if cfg.is_alma9:
 		return (
 			"# Pin python3 → 3.11 after all packages are installed so dnf\n"
 			"# alternatives cannot reset the symlink to 3.9.\n"
@@ -155,18 +148,29 @@ def post_package_setup(image: str, tag: str = "") -> str:
 	return ""
 
 
-def package_build_stage(image: str, tag: str, geant4_version: str, package_arch: str) -> str:
+def env_snapshot_step(cfg: RenderConfig) -> str:
+	"""Record the environment the entrypoint sets up, so that containers start
+	without running the modules machinery. Must be the last step touching the
+	entrypoint scripts or the modulefiles: the snapshot is ignored when any of
+	them is newer."""
+	commands = "\n# Environment snapshot for fast container startup\n"
+	commands += f"RUN {cfg.env_snapshot_script}\n"
+	return commands
+
+
+def package_build_stage(cfg: RenderConfig, geant4_version: str, package_arch: str) -> str:
 	"""Stage that turns the installed Geant4/CLHEP/Xerces-C trees into a
-	relocatable binary tarball under /dist."""
-	g4install = sim_home(True)
-	package_name = f'geant4-{geant4_version}-{image}-{tag}-{package_arch}'
+	relocatable binary tarball under /dist. Debug symbols go to a separate
+	-debug tarball; static archives stay in the runtime one because the Geant4
+	CMake configuration references them."""
+	package_name = f'geant4-{geant4_version}-{cfg.image}-{cfg.tag}-{package_arch}'
 	commands = "\n# Geant4 binary tarball build\n"
 	commands += "FROM final AS package-build\n"
-	commands += f"RUN DOCKER_ENTRYPOINT_SOURCE_ONLY=1 . {remote_entrypoint()} \\\n"
+	commands += f"RUN DOCKER_ENTRYPOINT_SOURCE_ONLY=1 . {cfg.entrypoint} \\\n"
 	commands += f"    && module load geant4/{geant4_version} \\\n"
 	commands += '    && eval "$(geant4-config --sh)" \\\n'
 	commands += f"    && GEANT4_VERSION={geant4_version} \\\n"
-	commands += f'       {g4install}/ci/package_install.sh /dist "{package_name}"\n'
+	commands += f'       {cfg.sim_home}/ci/package_install.sh --strip-debug --dedupe /dist "{package_name}"\n'
 	return commands
 
 
@@ -178,32 +182,85 @@ def package_export_stage() -> str:
 	return commands
 
 
-def create_dockerfile(image: str, tag: str, geant4_version: str, root_version: str,
+# data_mode of the application images built with a data image
+data_modes = ["copy", "mount"]
+
+
+def data_image_dockerfile(geant4_version: str) -> str:
+	"""Data-only image with the Geant4 datasets of geant4_version in /geant4-data.
+	The datasets depend neither on the OS nor on the architecture, so a single
+	image (one layer) serves every application image of that Geant4 version.
+	Build it for all platforms: the download stage runs once, natively."""
+	fetch_script = "/usr/local/bin/g4-data-fetch"
+	commands = f"# Geant4 {geant4_version} datasets\n"
+	commands += "FROM --platform=$BUILDPLATFORM debian:13-slim AS geant4-data-download\n"
+	commands += "RUN apt-get update \\\n"
+	commands += "    && apt-get install -y --no-install-recommends ca-certificates curl \\\n"
+	commands += "    && rm -rf /var/lib/apt/lists/*\n"
+	commands += f"COPY {local_geant4_data_fetch_script()} {fetch_script}\n"
+	commands += f"RUN bash {fetch_script} {geant4_version} /geant4-data\n"
+	commands += "\n# data-only image: COPY --from it, or mount it (docker run --mount type=image)\n"
+	commands += "FROM scratch AS geant4-data\n"
+	commands += f"LABEL org.opencontainers.image.description=\"Geant4 {geant4_version} datasets\"\n"
+	commands += "COPY --from=geant4-data-download /geant4-data /geant4-data\n"
+	return commands
+
+
+def geant4_data_step(cfg: RenderConfig, data_image: str, data_mode: str) -> str:
+	"""Datasets of an application image built with a data image. After the
+	Geant4 install, which only records their location, so that a new data image
+	does not rebuild Geant4."""
+	if data_mode == "copy":
+		commands = "\n# Geant4 datasets, from the data image\n"
+		commands += f"COPY --from={data_image} /geant4-data {cfg.geant4_data_dir}\n"
+	else:
+		commands = "\n# Geant4 datasets: not in this image, mount the data image at run time:\n"
+		commands += f"#   docker run --mount type=image,source={data_image},target={cfg.geant4_data_dir} ...\n"
+	return commands
+
+
+def create_dockerfile(cfg: RenderConfig, geant4_version: str, root_version: str,
                       meson_version: str,
                       novnc_version: str,
                       with_package: bool = False,
-                      package_arch: str = "amd64") -> str:
+                      package_arch: str = "amd64",
+                      data_image: str = "",
+                      data_mode: str = "copy") -> str:
+	"""With data_image (see data_image_dockerfile), Geant4 is built without its
+	datasets, and the image copies them from data_image (data_mode "copy") or
+	expects it mounted at run time ("mount")."""
+	if data_mode not in data_modes:
+		raise ValueError(f"invalid data mode '{data_mode}'. Valid modes: {', '.join(data_modes)}")
 	commands = ""
-	commands += docker_header(image, tag)
-	commands += copy_setup_file(image)
-	commands += install_jlab_ca(image)
-	commands += additional_preamble(image, tag)
-	commands += packages_install_command(image, tag)
-	commands += cleanup_string_by_family[map_family(image)]
-	commands += post_package_setup(image, tag)
-	commands += install_additional_libraries(image,
+	commands += docker_header(cfg)
+	commands += copy_setup_file(cfg)
+	commands += install_jlab_ca(cfg)
+	commands += additional_preamble(cfg)
+	commands += "# System packages\n"
+	commands += packages_install_command(cfg)
+	commands += cleanup_string_by_family[cfg.family]
+	commands += post_package_setup(cfg)
+	commands += install_additional_libraries(cfg,
 	                                         geant4_version,
 	                                         root_version,
 	                                         meson_version,
-	                                         novnc_version)
+	                                         novnc_version,
+	                                         cfg.geant4_data_dir if data_image else "")
+	if data_image:
+		commands += geant4_data_step(cfg, data_image, data_mode)
 
 	commands += "\n# Set permissions to remote startup files\n"
-	commands += f'RUN chmod 0755 {remote_entrypoint()} \n'
-	commands += f'RUN chmod 0755 {remote_entrypoint_addon()} \n'
-	commands += f'RUN chmod 0755 {remote_novnc_startup_script()} \n'
+	commands += f'RUN chmod 0755 {cfg.entrypoint} \n'
+	commands += f'RUN chmod 0755 {cfg.entrypoint_addon} \n'
+	commands += f'RUN chmod 0755 {cfg.novnc_startup_script} \n'
+	commands += f'RUN chmod 0755 {cfg.env_snapshot_script} \n'
+	commands += f'RUN chmod 0755 {cfg.g4bench_script} \n'
+	commands += f'RUN chmod 0755 {cfg.cpu_limits_script} \n'
+	commands += f'RUN chmod 0755 {cfg.distcc_pool_script} \n'
+	commands += env_snapshot_step(cfg)
 
 	if with_package:
-		commands += package_build_stage(image, tag, geant4_version, package_arch)
+		commands += package_build_stage(cfg, geant4_version, package_arch)
 		commands += package_export_stage()
 
 	return commands
@@ -257,24 +314,46 @@ def main():
 		help="Architecture suffix used in the tarball name (default: %(default)s)"
 	)
 
+	parser.add_argument(
+		"--data-only", action="store_true",
+		help="Print the data-only image of the Geant4 datasets of --geant4-version instead (no -i/-t)"
+	)
+	parser.add_argument(
+		"--data-image",
+		help="Build Geant4 without its datasets and take them from this data image (e.g. ghcr.io/gemc/g4install-data:11.4.2)"
+	)
+	parser.add_argument(
+		"--data-mode", choices=data_modes, default="copy",
+		help="With --data-image: copy the datasets into the image, or mount the data image at run time (default: %(default)s)"
+	)
+
 	args = parser.parse_args()
 
+	if args.data_only:
+		print(data_image_dockerfile(args.geant4_version))
+		return
+
 	# 1) If -i/--image or -t/--tag are not given, print usage and exit
 	if not args.image or not args.tag:
 		parser.print_usage(sys.stderr)
 		sys.exit(2)
 
-	is_valid_image(args.image)
+	try:
+		cfg = render_config(args.image, args.tag)
+	except InvalidImageError as e:
+		print(f"Error: {e}", file=sys.stderr)
+		sys.exit(1)
 
 	dockerfile = create_dockerfile(
-		args.image,
-		args.tag,
+		cfg,
 		args.geant4_version,
 		args.root_version,
 		args.meson_version,
 		args.novnc_version,
 		args.with_package,
 		args.package_arch,
+		args.data_image or "",
+		args.data_mode,
 	)
 	print(dockerfile)
 
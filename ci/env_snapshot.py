@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# Static snapshot of the environment set up by ci/docker-entrypoint.sh.
+#
+# At image build time the entrypoint is sourced once (module init, thisroot.sh,
+# `module use`, `module load geant4/<ver>`) and the variables it changed are
+# written as plain sh, zsh and csh files. At container start the entrypoint
+# sources env-snapshot.sh instead of running the modules machinery, unless a
+# file listed in env-snapshot.sources is newer than the snapshot.
+#
+# Path variables (PATH, LD_LIBRARY_PATH, ...) are written as the entries the
+# modules added, prepended or appended to the value the variable has when the
+# snapshot is sourced, so that `docker run -e LD_LIBRARY_PATH=...` still counts.
+#
+# The shell function `module` is not part of the environment: the snapshots
+# define a stand-in that sources the Environment Modules init file on first use
+# (exported in bash, so that the shells started by the entrypoint have it too).
+#
+#   create-env-snapshot [--entrypoint FILE] [--output DIR]
+import argparse
+import os
+import subprocess
+import sys
+from typing import Optional
+
+DEFAULT_ENTRYPOINT = "/usr/local/bin/docker-entrypoint.sh"
+DEFAULT_OUTPUT = "/usr/local/share/gemc"
+SNAPSHOT_NAME = "env-snapshot"
+
+SEPARATOR = "--g4install-env-snapshot--"
+
+# per-shell or per-process variables that must not be frozen
+VOLATILE = {"PWD", "OLDPWD", "SHLVL", "_", "DOCKER_ENTRYPOINT_SOURCE_ONLY", "G4_ENV_SNAPSHOT_DIR"}
+
+
+class SnapshotError(Exception):
+	pass
+
+
+def parse_env(block: str) -> dict:
+	env = {}
+	for item in block.split("\0"):
+		key, sep, value = item.partition("=")
+		if sep and key:
+			env[key] = value
+	return env
+
+
+def capture(entrypoint: str) -> tuple:
+	"""Environment before and after sourcing the entrypoint, and its modules init file."""
+	script = (
+		'env -0; printf "%s\\0" "$G4_SNAPSHOT_SEPARATOR"; '
+		'DOCKER_ENTRYPOINT_SOURCE_ONLY=1 . "$G4_SNAPSHOT_ENTRYPOINT" >/dev/null || exit 1; '
+		'unset DOCKER_ENTRYPOINT_SOURCE_ONLY; '
+		'env -0; printf "%s\\0%s" "$G4_SNAPSHOT_SEPARATOR" "${found:-${brew_init:-}}"'
+	)
+	environ = dict(os.environ, G4_SNAPSHOT_SEPARATOR=SEPARATOR, G4_SNAPSHOT_ENTRYPOINT=entrypoint)
+	result = subprocess.run(["bash", "-c", script], env=environ, capture_output=True, text=True)
+	if result.returncode != 0:
+		raise SnapshotError(f"sourcing {entrypoint} failed:\n{result.stderr}")
+	before, after, init_file = result.stdout.split(f"\0{SEPARATOR}\0")
+	before, after = parse_env(before), parse_env(after)
+	for env in (before, after):
+		env.pop("G4_SNAPSHOT_SEPARATOR", None)
+		env.pop("G4_SNAPSHOT_ENTRYPOINT", None)
+	return before, after, init_file
+
+
+def diff_env(before: dict, after: dict) -> tuple:
+	"""(variables to set, variables to unset), sorted and without volatile ones."""
+	changed = {key: value for key, value in sorted(after.items())
+	           if before.get(key) != value and key not in VOLATILE and not key.startswith("BASH_FUNC_")}
+	removed = sorted(key for key in before if key not in after and key not in VOLATILE)
+	return changed, removed
+
+
+def is_path_variable(key: str) -> bool:
+	return key.endswith("PATH")
+
+
+def path_change(before: str, after: str) -> tuple:
+	"""(entries prepended, entries appended) turning before into after. Entries
+	moved or removed by the modules are ignored: they are prepended if new."""
+	old = [entry for entry in before.split(":") if entry]
+	new = [entry for entry in after.split(":") if entry]
+	if not old:
+		return new, []
+	for start in range(len(new) - len(old) + 1):
+		if new[start:start + len(old)] == old:
+			return new[:start], new[start + len(old):]
+	return [entry for entry in new if entry not in old], []
+
+
+def split_paths(before: dict, changed: dict) -> tuple:
+	"""(changed without the path variables, {path variable: (prepended, appended)})."""
+	values = {key: value for key, value in changed.items() if not is_path_variable(key)}
+	paths = {}
+	for key, value in changed.items():
+		if is_path_variable(key):
+			prepend, append = path_change(before.get(key, ""), value)
+			if prepend or append:
+				paths[key] = (prepend, append)
+	return values, paths
+
+
+def sh_quote(value: str) -> str:
+	return "'" + value.replace("'", "'\\''") + "'"
+
+
+def csh_quote(value: str) -> str:
+	return "'" + value.replace("'", "'\\''").replace("!", "\\!") + "'"
+
+
+def init_file_for(shell: str, after: dict, found: str) -> str:
+	"""The Environment Modules init file for shell, preferring $MODULESHOME/init."""
+	home = after.get("MODULESHOME", "")
+	if home and os.path.isfile(os.path.join(home, "init", shell)):
+		return os.path.join(home, "init", shell)
+	if found and os.path.basename(os.path.dirname(found)) == "init":
+		candidate = os.path.join(os.path.dirname(found), shell)
+		if os.path.isfile(candidate):
+			return candidate
+	return found if shell != "csh" else ""
+
+
+def render_sh(changed: dict, removed: list, init_file: str, shell: str, bash_init_file: str = "",
+              paths: Optional[dict] = None) -> str:
+	lines = [f"# Environment snapshot for {shell}, written by create-env-snapshot"]
+	lines += [f"unset {key}" for key in removed]
+	lines += [f"export {key}={sh_quote(value)}" for key, value in changed.items()]
+	for key, (prepend, append) in (paths or {}).items():
+		if prepend:
+			lines.append(f'export {key}={sh_quote(":".join(prepend))}"${{{key}:+:${key}}}"')
+		if append:
+			lines.append(f'export {key}="${{{key}:+${key}:}}"{sh_quote(":".join(append))}')
+	if bash_init_file and bash_init_file != init_file:
+		source = (f'if [ -n "${{BASH_VERSION-}}" ]; then . {sh_quote(bash_init_file)}; '
+		          f'else . {sh_quote(init_file)}; fi' if init_file else f". {sh_quote(bash_init_file)}")
+	else:
+		source = f". {sh_quote(init_file)}" if init_file else ""
+	if source:
+		lines += [
+			"module() {",
+			"\tunset -f module",
+			f"\t{source}",
+			'\tmodule "$@"',
+			"}",
+			'if [ -n "${BASH_VERSION-}" ]; then export -f module; fi',
+		]
+	return "\n".join(lines) + "\n"
+
+
+def render_csh(changed: dict, removed: list, init_file: str, paths: Optional[dict] = None) -> str:
+	lines = ["# Environment snapshot for csh, written by create-env-snapshot"]
+	lines += [f"unsetenv {key}" for key in removed]
+	for key, value in changed.items():
+		if "\n" in value:
+			lines.append(f"# {key}: multi-line value, not representable in csh")
+			continue
+		lines.append(f"setenv {key} {csh_quote(value)}")
+	for key, (prepend, append) in (paths or {}).items():
+		for entries, joined in ((prepend, f'{csh_quote(":".join(prepend))}:"${{{key}}}"'),
+		                        (append, f'"${{{key}}}":{csh_quote(":".join(append))}')):
+			if entries:
+				lines += [
+					f"if ( $?{key} ) then",
+					f"\tsetenv {key} {joined}",
+					"else",
+					f"\tsetenv {key} {csh_quote(':'.join(entries))}",
+					"endif",
+				]
+	if init_file:
+		lines.append(f"alias module 'unalias module; source {init_file}; module \\!*'")
+	return "\n".join(lines) + "\n"
+
+
+def sources(entrypoint: str, after: dict) -> list:
+	"""Files and directories whose modification invalidates the snapshot."""
+	paths = [entrypoint]
+	addon = os.path.join(os.path.dirname(entrypoint), "additional-entrycommands.sh")
+	if os.path.exists(addon):
+		paths.append(addon)
+	for path in after.get("MODULEPATH", "").split(":"):
+		if path and os.path.isdir(path) and path not in paths:
+			paths.append(path)
+	return paths
+
+
+def write(path: str, content: str) -> None:
+	tmp = f"{path}.tmp"
+	with open(tmp, "w", encoding="utf-8") as f:
+		f.write(content)
+	os.replace(tmp, path)
+
+
+def create_snapshot(entrypoint: str, output_dir: str) -> dict:
+	"""Write the sh, zsh and csh snapshots and their sources list; returns the paths."""
+	before, after, found = capture(entrypoint)
+	changed, removed = diff_env(before, after)
+	changed, paths = split_paths(before, changed)
+	os.makedirs(output_dir, exist_ok=True)
+	base = os.path.join(output_dir, SNAPSHOT_NAME)
+	files = {
+		"sources": f"{base}.sources",
+		"sh": f"{base}.sh",
+		"zsh": f"{base}.zsh",
+		"csh": f"{base}.csh",
+	}
+	# the sources list first: the snapshots must never be older than it
+	write(files["sources"], "\n".join(sources(entrypoint, after)) + "\n")
+	write(files["sh"], render_sh(changed, removed, init_file_for("sh", after, found), "sh",
+	                             init_file_for("bash", after, found), paths))
+	write(files["zsh"], render_sh(changed, removed, init_file_for("zsh", after, found), "zsh", paths=paths))
+	write(files["csh"], render_csh(changed, removed, init_file_for("csh", after, found), paths))
+	return files
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Snapshot the environment set up by the container entrypoint")
+	parser.add_argument("--entrypoint", default=DEFAULT_ENTRYPOINT, help="entrypoint to source (default: %(default)s)")
+	parser.add_argument("--output", default=DEFAULT_OUTPUT, help="output directory (default: %(default)s)")
+	args = parser.parse_args()
+
+	try:
+		files = create_snapshot(args.entrypoint, args.output)
+	except (SnapshotError, OSError) as e:
+		print(f"Error: {e}", file=sys.stderr)
+		sys.exit(1)
+	for path in files.values():
+		print(path)
+
+
+if __name__ == "__main__":
+	main()
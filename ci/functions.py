@@ -1,17 +1,20 @@
 #!/usr/bin/env python3
 
+from dataclasses import dataclass
+from functools import lru_cache
 from urllib.parse import urlparse
 
 valid_images = ["fedora", "ubuntu", "archlinux", "almalinux", "debian"]
 
 
+class InvalidImageError(ValueError):
+	pass
+
+
 def is_valid_image(image: str) -> bool:
 	if image in valid_images:
 		return True
-	else:
-		print(f"Error: invalid image '{image}'")
-		print(f"Valid images: {available_images()}")
-		exit(1)
+	raise InvalidImageError(f"invalid image '{image}'. Valid images: {available_images()}")
 
 
 def available_images() -> str:
@@ -80,10 +83,60 @@ def remote_novnc_startup_script() -> str:
 	return f'{remote_startup_dir()}/start-novnc.sh'
 
 
+def local_env_snapshot_script() -> str:
+	return 'ci/env_snapshot.py'
+
+
+def remote_env_snapshot_script() -> str:
+	return f'{remote_startup_dir()}/create-env-snapshot'
+
+
+def local_g4bench_script() -> str:
+	return 'ci/g4bench.py'
+
+
+def remote_g4bench_script() -> str:
+	return f'{remote_startup_dir()}/g4bench'
+
+
+def local_cpu_limits_script() -> str:
+	return 'ci/cpu_limits.sh'
+
+
+def remote_cpu_limits_script() -> str:
+	# sourced by the entrypoint from its own directory
+	return f'{remote_startup_dir()}/g4-cpu-limits'
+
+
+def local_distcc_pool_script() -> str:
+	return 'ci/distcc_pool.sh'
+
+
+def remote_distcc_pool_script() -> str:
+	return f'{remote_startup_dir()}/g4-distcc-pool'
+
+
+def local_geant4_data_fetch_script() -> str:
+	return 'ci/geant4_data_fetch.sh'
+
+
+def remote_geant4_data_dir() -> str:
+	# where application images built with a data image find the Geant4 datasets
+	return '/usr/local/share/geant4-data'
+
+
 def jlab_certificate() -> str:
 	return "/etc/pki/ca-trust/source/anchors/JLabCA.crt"
 
 
+# where install_jlab_ca() puts the JLab CA, per image family
+jlab_certificate_by_family = {
+	"fedora":    "/etc/pki/ca-trust/source/anchors/JLabCA.crt",
+	"debian":    "/usr/local/share/ca-certificates/JLabCA.crt",
+	"archlinux": "/etc/ca-certificates/trust-source/anchors/JLabCA.crt",
+}
+
+
 def sim_home(is_cvfms: bool) -> str:
 	if is_cvfms:
 		return "/cvmfs/oasis.opensciencegrid.org/geant4/g4install"
@@ -91,14 +144,83 @@ def sim_home(is_cvfms: bool) -> str:
 		return "/opt/software/"
 
 
-def curl_command(url: str) -> str:
+def curl_command(url: str, ca_certificate: str = "") -> str:
 	"""
 	Build a curl command string.
 	Use the JLab CA override only for JLab-hosted URLs; otherwise trust system CAs.
 	"""
 	host = (urlparse(url).hostname or "").lower()
 	use_site_ca = host.endswith(".jlab.org") or host.endswith(".jlab.gov")
-	extra = f"--cacert {jlab_certificate()}" if use_site_ca else ""
+	extra = f"--cacert {ca_certificate or jlab_certificate()}" if use_site_ca else ""
 	# no -k; we want proper verification
 	# no --location-trusted; plain --location is enough
 	return f"curl -S --fail-with-body --location --progress-bar --retry 4 {extra} -O {url}"
+
+
+@dataclass(frozen=True)
+class RenderConfig:
+	"""Everything the generators need to know about one base image, resolved
+	once: image family, local and remote paths, and the CA used by curl.
+	Immutable and picklable, so it can be shared by thread or process pools."""
+	image: str
+	tag: str
+	family: str
+	sim_home: str
+	startup_dir: str
+	entrypoint: str
+	entrypoint_addon: str
+	novnc_startup_script: str
+	bashrc: str
+	inputrc: str
+	ca_certificate: str
+	env_snapshot_script: str
+	g4bench_script: str
+	cpu_limits_script: str
+	distcc_pool_script: str
+	geant4_data_dir: str
+	local_entrypoint: str = local_entrypoint()
+	local_entrypoint_addon: str = local_entrypoint_addon()
+	local_novnc_startup_script: str = local_novnc_startup_script()
+	local_bashrc: str = local_bashrc()
+	local_inputrc: str = local_inputrc()
+	local_env_snapshot_script: str = local_env_snapshot_script()
+	local_g4bench_script: str = local_g4bench_script()
+	local_cpu_limits_script: str = local_cpu_limits_script()
+	local_distcc_pool_script: str = local_distcc_pool_script()
+
+	@property
+	def is_alma(self) -> bool:
+		return "almalinux" in self.image.lower()
+
+	@property
+	def is_alma9(self) -> bool:
+		return self.is_alma and self.tag.startswith("9")
+
+	def curl_command(self, url: str) -> str:
+		return curl_command(url, self.ca_certificate)
+
+
+@lru_cache(maxsize=None)
+def render_config(image: str, tag: str = "", is_cvmfs: bool = True) -> RenderConfig:
+	"""Build (and memoize) the RenderConfig of image:tag.
+	Raises InvalidImageError for unsupported images."""
+	is_valid_image(image)
+	family = map_family(image)
+	return RenderConfig(
+		image=image,
+		tag=tag,
+		family=family,
+		sim_home=sim_home(is_cvmfs),
+		startup_dir=remote_startup_dir(),
+		entrypoint=remote_entrypoint(),
+		entrypoint_addon=remote_entrypoint_addon(),
+		novnc_startup_script=remote_novnc_startup_script(),
+		bashrc=remote_bashrc(),
+		inputrc=remote_inputrc(),
+		ca_certificate=jlab_certificate_by_family[family],
+		env_snapshot_script=remote_env_snapshot_script(),
+		g4bench_script=remote_g4bench_script(),
+		cpu_limits_script=remote_cpu_limits_script(),
+		distcc_pool_script=remote_distcc_pool_script(),
+		geant4_data_dir=remote_geant4_data_dir(),
+	)
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# Geant4 throughput benchmark: builds Geant4 examples against the loaded Geant4
+# (module load geant4/<version>, or source geant4.env of a binary tarball), runs
+# fixed-seed workloads over a range of thread counts and reports, per run,
+# initialization time, events/s and peak RSS as JSON tagged with the osrelease
+# string, the Geant4 version and the build variant.
+#
+#   g4bench run -o results.json                      # all workloads, 1..nproc threads
+#   g4bench run -w b4a-em -t 1,4 --events-per-thread 500
+#   g4bench compare baseline.json results.json        # exit 1 on a regression
+#
+# Run manager backends (G4RUN_MANAGER_TYPE) are compared within one report:
+#
+#   module load geant4/11.4.2-tbb
+#   g4bench run --backends MT,Tasking,TBB -o backends.json
+#   g4bench backends backends.json                   # speedup over MT and scaling
+#
+# geom-nav tracks geantinos through polycones, tessellated solids and tubes
+# (a GDML file written by g4bench): compare geant4/<version> with
+# geant4/<version>-vecgeom to see what the VecGeom solids gain.
+#
+# The time spent in /run/initialize and in /run/beamOn is taken from the mtime
+# of marker files the macro touches between the two (/control/shell), so the
+# examples run unmodified.
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# name: example (relative to the examples directory), executable, arguments
+# before the macro ({gdml}: the navigation geometry), environment and the
+# macro commands between /run/initialize and /run/beamOn
+WORKLOADS = {
+	"b4a-em": {
+		"description": "1 GeV electron showers in the B4 sampling calorimeter",
+		"example": "basic/B4/B4a",
+		"executable": "exampleB4a",
+		"args": ["-m"],
+		"env": {},
+		"commands": ["/gun/particle e-", "/gun/energy 1 GeV"],
+		"events_per_thread": 2000,
+	},
+	"hadr01-hp": {
+		"description": "14 MeV neutrons with QGSP_BIC_HP (neutron HP data)",
+		"example": "extended/hadronic/Hadr01",
+		"executable": "Hadr01",
+		"args": [],
+		"env": {"PHYSLIST": "QGSP_BIC_HP"},
+		"commands": ["/gun/particle neutron", "/gun/energy 14 MeV"],
+		"events_per_thread": 5000,
+	},
+	"geom-nav": {
+		"description": "geantinos through polycones, tessellated solids and tubes (navigation only)",
+		"example": "extended/persistency/gdml/G04",
+		"executable": "gdml_det",
+		"args": ["{gdml}"],
+		"env": {},
+		"commands": ["/gun/particle geantino", "/gun/energy 1 GeV",
+		             "/gun/position 3 7 -1900 mm", "/gun/direction 0.002 0.001 1"],
+		"events_per_thread": 50000,
+	},
+}
+
+SEEDS = "12345 67890"
+DEFAULT_REGRESSION = 5.0
+# the pthreads run manager, reference of the backend comparison
+REFERENCE_BACKEND = "MT"
+
+
+class BenchError(Exception):
+	pass
+
+
+def osrelease() -> str:
+	"""$OSRELEASE (set by sim_system), else osrelease.py next to this script or on PATH."""
+	if os.environ.get("OSRELEASE"):
+		return os.environ["OSRELEASE"]
+	for candidate in (os.path.join(SCRIPT_DIR, "osrelease.py"),
+	                  os.path.join(SCRIPT_DIR, "..", "modules", "util", "osrelease.py"),
+	                  shutil.which("osrelease.py")):
+		if candidate and os.path.isfile(candidate):
+			result = subprocess.run([sys.executable, candidate], capture_output=True, text=True)
+			if result.returncode == 0:
+				return result.stdout.strip()
+	return "unknown"
+
+
+def cpu_model() -> str:
+	try:
+		with open("/proc/cpuinfo", encoding="utf-8") as f:
+			for line in f:
+				if line.startswith("model name"):
+					return line.split(":", 1)[1].strip()
+	except OSError:
+		pass
+	return platform.processor() or platform.machine()
+
+
+def default_threads() -> List[int]:
+	"""1, 2, 4, ... up to the number of CPUs, which is always included."""
+	ncpu = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+	threads = []
+	n = 1
+	while n < ncpu:
+		threads.append(n)
+		n *= 2
+	return threads + [ncpu]
+
+
+def examples_dir(g4install: str) -> str:
+	for candidate in sorted(glob.glob(os.path.join(g4install, "share", "Geant4*", "examples"))):
+		return candidate
+	raise BenchError(f"no Geant4 examples under {g4install}/share: was Geant4 installed with GEANT4_INSTALL_EXAMPLES?")
+
+
+def build_example(source: str, build_dir: str, g4install: str, executable: str) -> str:
+	"""Configure and build an example once; returns the executable."""
+	binary = os.path.join(build_dir, executable)
+	if os.path.exists(binary):
+		return binary
+	os.makedirs(build_dir, exist_ok=True)
+	log = os.path.join(build_dir, "build_log.txt")
+	with open(log, "w", encoding="utf-8") as out:
+		for cmd in (["cmake", "-S", source, "-B", build_dir, "-DCMAKE_BUILD_TYPE=Release", f"-DCMAKE_PREFIX_PATH={g4install}"],
+		            ["cmake", "--build", build_dir, "-j", str(os.cpu_count() or 1)]):
+			if subprocess.run(cmd, stdout=out, stderr=subprocess.STDOUT).returncode != 0:
+				raise BenchError(f"building {source} failed, see {log}")
+	return binary
+
+
+def write_navigation_gdml(path: str, columns: int = 40):
+	"""A column of alternating polycones, tessellated octahedra and tubes along
+	z, around the geantino beam of geom-nav, in a vacuum world."""
+	a = 40
+	vertices = {"px": (a, 0, 0), "nx": (-a, 0, 0), "py": (0, a, 0), "ny": (0, -a, 0), "pz": (0, 0, a), "nz": (0, 0, -a)}
+	# anticlockwise seen from outside
+	faces = [("px", "py", "pz"), ("py", "nx", "pz"), ("nx", "ny", "pz"), ("ny", "px", "pz"),
+	         ("py", "px", "nz"), ("nx", "py", "nz"), ("ny", "nx", "nz"), ("px", "ny", "nz")]
+	lines = [
+		'<?xml version="1.0" encoding="UTF-8"?>',
+		'<gdml xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+		'xsi:noNamespaceSchemaLocation="http://service-spi.web.cern.ch/service-spi/app/releases/GDML/schema/gdml.xsd">',
+		"<define>",
+		*[f'  <position name="{name}" x="{x}" y="{y}" z="{z}" unit="mm"/>' for name, (x, y, z) in vertices.items()],
+		"</define>",
+		"<solids>",
+		'  <box name="world_box" x="1000" y="1000" z="4000" lunit="mm"/>',
+		'  <polycone name="pcon" startphi="0" deltaphi="360" aunit="deg" lunit="mm">',
+		*[f'    <zplane z="{z}" rmin="{2 + (i % 3)}" rmax="{20 + 10 * (i % 4)}"/>' for i, z in enumerate(range(-40, 41, 5))],
+		"  </polycone>",
+		'  <tessellated name="tess" aunit="deg" lunit="mm">',
+		*[f'    <triangular vertex1="{v1}" vertex2="{v2}" vertex3="{v3}" type="ABSOLUTE"/>' for v1, v2, v3 in faces],
+		"  </tessellated>",
+		'  <tube name="tube" rmin="5" rmax="45" z="80" startphi="0" deltaphi="360" aunit="deg" lunit="mm"/>',
+		"</solids>",
+		"<structure>",
+		*[f'  <volume name="{solid}_lv"><materialref ref="G4_Fe"/><solidref ref="{solid}"/></volume>'
+		  for solid in ("pcon", "tess", "tube")],
+		'  <volume name="world">',
+		'    <materialref ref="G4_Galactic"/>',
+		'    <solidref ref="world_box"/>',
+	]
+	for i in range(columns):
+		solid = ("pcon", "tess", "tube")[i % 3]
+		lines += [f'    <physvol name="{solid}_{i}">',
+		          f'      <volumeref ref="{solid}_lv"/>',
+		          f'      <position name="{solid}_{i}_pos" x="0" y="0" z="{-1800 + 90 * i}" unit="mm"/>',
+		          "    </physvol>"]
+	lines += ["  </volume>", "</structure>", '<setup name="Default" version="1.0"><world ref="world"/></setup>', "</gdml>"]
+	with open(path, "w", encoding="utf-8") as f:
+		f.write("\n".join(lines) + "\n")
+
+
+def write_macro(path: str, marks: str, threads: int, events: int, commands: List[str]):
+	lines = [
+		"/control/verbose 0",
+		"/run/verbose 0",
+		"/event/verbose 0",
+		"/tracking/verbose 0",
+		f"/run/numberOfThreads {threads}",
+		"/run/initialize",
+		f"/control/shell touch {marks}/initialized",
+		f"/random/setSeeds {SEEDS}",
+		*commands,
+		f"/run/beamOn {events}",
+		f"/control/shell touch {marks}/finished",
+	]
+	with open(path, "w", encoding="utf-8") as f:
+		f.write("\n".join(lines) + "\n")
+
+
+def measure(command: List[str], marks: str, env: Optional[Dict[str, str]] = None, cwd: Optional[str] = None) -> dict:
+	"""Run command (whose macro touches marks/initialized and marks/finished);
+	returns the initialization and event-loop times and the peak RSS."""
+	start = time.time()
+	with open(os.path.join(marks, "log.txt"), "w", encoding="utf-8") as log:
+		proc = subprocess.Popen(command, env=env, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+		_, status, usage = os.wait4(proc.pid, 0)
+		proc.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, "waitstatus_to_exitcode") else status >> 8
+	result = {
+		"returncode": proc.returncode,
+		# KiB on Linux, bytes on macOS
+		"peak_rss_kb": usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss,
+	}
+	initialized = os.path.join(marks, "initialized")
+	finished = os.path.join(marks, "finished")
+	if proc.returncode == 0 and os.path.exists(initialized) and os.path.exists(finished):
+		t_init = os.stat(initialized).st_mtime_ns / 1e9
+		t_end = os.stat(finished).st_mtime_ns / 1e9
+		result["init_s"] = round(t_init - start, 3)
+		result["event_loop_s"] = round(t_end - t_init, 3)
+	return result
+
+
+def run_workload(name: str, threads: int, events: int, binary: str, work_dir: str,
+                 backend: Optional[str] = None) -> dict:
+	"""One run; backend sets G4RUN_MANAGER_TYPE (MT, Tasking, TBB)."""
+	workload = WORKLOADS[name]
+	marks = tempfile.mkdtemp(prefix=f"{name}-{threads}t-", dir=work_dir)
+	macro = os.path.join(marks, "bench.mac")
+	write_macro(macro, marks, threads, events, workload["commands"])
+	env = dict(os.environ, **workload["env"])
+	# would override /run/numberOfThreads
+	env.pop("G4FORCENUMBEROFTHREADS", None)
+	if backend:
+		env["G4RUN_MANAGER_TYPE"] = backend
+	args = [arg.format(gdml=os.path.join(work_dir, "navigation.gdml")) for arg in workload["args"]]
+	result = measure([binary, *args, macro], marks, env=env, cwd=os.path.dirname(binary))
+	result.update(workload=name, threads=threads, events=events, backend=env.get("G4RUN_MANAGER_TYPE", "default"))
+	if "event_loop_s" in result and result["event_loop_s"] > 0:
+		result["events_per_s"] = round(events / result["event_loop_s"], 2)
+	else:
+		result["log"] = os.path.join(marks, "log.txt")
+		return result
+	shutil.rmtree(marks)
+	return result
+
+
+def run(workloads: List[str], threads: List[int], events_per_thread: Optional[int], work_dir: Optional[str],
+        backends: Optional[List[str]] = None) -> dict:
+	g4install = os.environ.get("G4INSTALL")
+	if not g4install:
+		raise BenchError("G4INSTALL not set: module load geant4/<version> or source geant4.env first")
+	version = os.environ.get("G4_VERSION") or os.path.basename(g4install)
+	variant = os.environ.get("G4_VARIANT", "generic")
+	tag = osrelease()
+	if work_dir is None:
+		cache = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+		work_dir = os.path.join(cache, "g4bench", tag, f"{version}-{variant}")
+	os.makedirs(work_dir, exist_ok=True)
+
+	examples = examples_dir(g4install)
+	write_navigation_gdml(os.path.join(work_dir, "navigation.gdml"))
+	report = {
+		"osrelease": tag,
+		"geant4_version": version,
+		"variant": variant,
+		"g4install": g4install,
+		"hostname": platform.node(),
+		"cpu": cpu_model(),
+		"date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+		"results": [],
+	}
+	for name in workloads:
+		workload = WORKLOADS[name]
+		binary = build_example(os.path.join(examples, workload["example"]), os.path.join(work_dir, name),
+		                       g4install, workload["executable"])
+		for backend in backends or [None]:
+			for n in threads:
+				events = (events_per_thread or workload["events_per_thread"]) * n
+				print(f"{name}: {n} threads, {events} events{f', {backend}' if backend else ''}", file=sys.stderr)
+				report["results"].append(run_workload(name, n, events, binary, work_dir, backend))
+	return report
+
+
+def run_key(result: dict) -> tuple:
+	return result["workload"], result["threads"], result.get("backend", "default")
+
+
+def compare(baseline: dict, current: dict, threshold: float = DEFAULT_REGRESSION) -> List[dict]:
+	"""Per (workload, threads, backend): the events/s change in percent;
+	regression when the throughput dropped by more than threshold percent."""
+	before = {run_key(r): r for r in baseline["results"] if "events_per_s" in r}
+	rows = []
+	for r in current["results"]:
+		key = run_key(r)
+		if key not in before or "events_per_s" not in r:
+			continue
+		old, new = before[key]["events_per_s"], r["events_per_s"]
+		change = 100.0 * (new - old) / old
+		rows.append({"workload": key[0], "threads": key[1], "backend": key[2], "baseline": old, "current": new,
+		             "change_percent": round(change, 1), "regression": change < -threshold})
+	return rows
+
+
+def compare_backends(report: dict, reference: str = REFERENCE_BACKEND) -> List[dict]:
+	"""Per run of one report: the speedup over the reference backend at the same
+	thread count, and the scaling efficiency, events/s over threads times the
+	single-thread events/s of the same backend."""
+	rates = {run_key(r): r["events_per_s"] for r in report["results"] if "events_per_s" in r}
+	rows = []
+	for (workload, threads, backend), rate in sorted(rates.items()):
+		row = {"workload": workload, "threads": threads, "backend": backend, "events_per_s": rate}
+		ref = rates.get((workload, threads, reference))
+		if ref:
+			row["speedup"] = round(rate / ref, 3)
+		single = rates.get((workload, 1, backend))
+		if single:
+			row["efficiency"] = round(rate / (threads * single), 3)
+		rows.append(row)
+	return rows
+
+
+def load(path: str) -> dict:
+	with open(path, encoding="utf-8") as f:
+		return json.load(f)
+
+
+def thread_list(text: str) -> List[int]:
+	return [int(t) for t in text.split(",") if t]
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Geant4 throughput benchmark")
+	sub = parser.add_subparsers(dest="command", required=True)
+
+	run_parser = sub.add_parser("run", help="run the workloads")
+	run_parser.add_argument("-w", "--workloads", default=",".join(WORKLOADS),
+	                        help="comma-separated workloads (default: %(default)s)")
+	run_parser.add_argument("-t", "--threads", type=thread_list, default=None,
+	                        help="comma-separated thread counts (default: 1, 2, 4, ... number of CPUs)")
+	run_parser.add_argument("--backends", type=lambda text: [b for b in text.split(",") if b],
+	                        help="comma-separated G4RUN_MANAGER_TYPE values to run, e.g. MT,Tasking,TBB "
+	                             "(default: the environment's)")
+	run_parser.add_argument("--events-per-thread", type=int, help="override the events per thread of every workload")
+	run_parser.add_argument("--work-dir", help="example builds and run logs (default: ~/.cache/g4bench/...)")
+	run_parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+
+	cmp_parser = sub.add_parser("compare", help="compare two reports")
+	cmp_parser.add_argument("baseline")
+	cmp_parser.add_argument("current")
+	cmp_parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION,
+	                        help="events/s drop, in percent, reported as a regression (default: %(default)s)")
+
+	backends_parser = sub.add_parser("backends", help="compare the run manager backends of a report")
+	backends_parser.add_argument("report")
+	backends_parser.add_argument("--reference", default=REFERENCE_BACKEND,
+	                             help="backend the speedups are relative to (default: %(default)s)")
+
+	sub.add_parser("list", help="list the workloads")
+
+	args = parser.parse_args()
+	try:
+		if args.command == "list":
+			for name, workload in WORKLOADS.items():
+				print(f"{name:12} {workload['description']}")
+		elif args.command == "run":
+			workloads = [w for w in args.workloads.split(",") if w]
+			unknown = [w for w in workloads if w not in WORKLOADS]
+			if unknown:
+				parser.error(f"unknown workloads: {', '.join(unknown)}. Known: {', '.join(WORKLOADS)}")
+			report = run(workloads, args.threads or default_threads(), args.events_per_thread, args.work_dir,
+			             args.backends)
+			text = json.dumps(report, indent=1, sort_keys=True) + "\n"
+			if args.output:
+				with open(args.output, "w", encoding="utf-8") as f:
+					f.write(text)
+			else:
+				sys.stdout.write(text)
+			if any(r["returncode"] != 0 or "events_per_s" not in r for r in report["results"]):
+				sys.exit(1)
+		elif args.command == "backends":
+			for row in compare_backends(load(args.report), args.reference):
+				speedup = f"{row['speedup']:6.2f}x" if "speedup" in row else "      -"
+				efficiency = f"{100 * row['efficiency']:5.0f}%" if "efficiency" in row else "     -"
+				print(f"{row['workload']:12} {row['backend']:8} {row['threads']:4}t {row['events_per_s']:10.1f} ev/s "
+				      f"speedup {speedup} efficiency {efficiency}")
+		else:
+			baseline, current = load(args.baseline), load(args.current)
+			print(f"baseline: {baseline['osrelease']} geant4 {baseline['geant4_version']}-{baseline['variant']}")
+			print(f"current:  {current['osrelease']} geant4 {current['geant4_version']}-{current['variant']}")
+			rows = compare(baseline, current, args.threshold)
+			for row in rows:
+				flag = "  REGRESSION" if row["regression"] else ""
+				print(f"{row['workload']:12} {row['backend']:8} {row['threads']:4}t {row['baseline']:10.1f} -> {row['current']:10.1f} ev/s "
+				      f"{row['change_percent']:+6.1f}%{flag}")
+			if any(row["regression"] for row in rows):
+				sys.exit(1)
+	except (BenchError, OSError, KeyError, ValueError) as e:
+		print(f"Error: {e}", file=sys.stderr)
+		sys.exit(2)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env bash
+
+# Download the datasets of a Geant4 version into a directory, as
+#   <directory>/<NAME><VERSION>/...   e.g. geant4-data/G4EMLOW8.6.1
+# which is the layout of GEANT4_INSTALL_DATADIR. Used to build the data-only
+# image (ci/dockerfile_creator.py --data-only).
+#
+#   geant4_data_fetch.sh <geant4 version> <directory>
+#
+# The dataset list is Geant4's own cmake/Modules/G4DatasetDefinitions.cmake at
+# the v<version> tag; every archive is checked against its MD5 sum there.
+# Datasets already in <directory> are skipped.
+#   GEANT4_DATASETS_DEFINITIONS_URL  replaces the G4DatasetDefinitions.cmake URL
+#   GEANT4_DATA_BASE_URL             replaces https://cern.ch/geant4-data/datasets
+
+set -euo pipefail
+
+if [[ $# -ne 2 ]]; then
+	echo "Usage: ${0##*/} <geant4 version> <directory>" >&2
+	exit 2
+fi
+
+version="$1"
+data_dir="$2"
+definitions_url="${GEANT4_DATASETS_DEFINITIONS_URL:-https://raw.githubusercontent.com/Geant4/geant4/v${version}/cmake/Modules/G4DatasetDefinitions.cmake}"
+base_url="${GEANT4_DATA_BASE_URL:-https://cern.ch/geant4-data/datasets}"
+
+mkdir -p "$data_dir"
+work="$(mktemp -d "${data_dir}/.fetch.XXXXXX")"
+trap 'rm -rf "$work"' EXIT
+
+curl -fsSL --retry 3 -o "$work/definitions.cmake" "$definitions_url"
+
+# one "NAME VERSION FILENAME EXTENSION MD5SUM" line per geant4_add_dataset()
+awk '
+	/geant4_add_dataset[ \t]*\(/ { name = version = filename = extension = md5 = "" ; inside = 1; next }
+	inside && $1 == "NAME"      { name = $2 }
+	inside && $1 == "VERSION"   { version = $2 }
+	inside && $1 == "FILENAME"  { filename = $2 }
+	inside && $1 == "EXTENSION" { extension = $2 }
+	inside && $1 == "MD5SUM"    { md5 = $2 }
+	inside && /\)/ { print name, version, filename, extension, md5; inside = 0 }
+' "$work/definitions.cmake" >"$work/datasets"
+
+if [[ ! -s "$work/datasets" ]]; then
+	echo "No datasets found in $definitions_url" >&2
+	exit 1
+fi
+
+while read -r name dataset_version filename extension md5; do
+	directory="${name}${dataset_version}"
+	if [[ -d "$data_dir/$directory" ]]; then
+		echo " > $directory: already present"
+		continue
+	fi
+	archive="${filename}.${dataset_version}.${extension}"
+	echo " > $directory: downloading $archive"
+	curl -fsSL --retry 3 -o "$work/$archive" "$base_url/$archive"
+	if [[ -n "$md5" ]] && ! echo "$md5  $work/$archive" | md5sum -c --status; then
+		echo "MD5 mismatch for $archive" >&2
+		exit 1
+	fi
+	# unpack next to the final directory, then rename: never a partial dataset
+	mkdir "$work/$directory.unpack"
+	tar -xf "$work/$archive" -C "$work/$directory.unpack"
+	mv "$work/$directory.unpack/$directory" "$data_dir/$directory"
+	rm -rf "$work/$archive" "$work/$directory.unpack"
+done <"$work/datasets"
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Count the dynamic-loader lookups of a command: every "trying file=" line of
+# LD_DEBUG=libs is one probe of a candidate path, i.e. one open() that goes to
+# NFS or CVMFS when the directory lives there. The count covers the command and
+# all its subprocesses.
+#
+# Compare an install that relies on LD_LIBRARY_PATH with one relinked by
+# install/set_runpath (or ci/package_install.sh --runpath):
+#
+#   ci/loader_lookups.py -- exampleB1 -m run1.mac
+#   ci/loader_lookups.py --compare-without-ld-library-path -- exampleB1 -m run1.mac
+#
+# glibc only: other loaders ignore LD_DEBUG.
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+TRYING = re.compile(r"^\s*\d+:\s+trying file=")
+FIND = re.compile(r"^\s*\d+:\s+find library=")
+
+
+def parse_ld_debug(text: str) -> dict:
+	"""Lookup statistics of LD_DEBUG=libs output. Every library is found by
+	its last probe, so the other probes are the failed ones."""
+	libraries = sum(1 for line in text.splitlines() if FIND.match(line))
+	lookups = sum(1 for line in text.splitlines() if TRYING.match(line))
+	return {"libraries": libraries, "lookups": lookups, "failed_lookups": max(0, lookups - libraries)}
+
+
+def count_lookups(command: list, env: dict) -> dict:
+	"""Run command with LD_DEBUG=libs and parse the log of every process."""
+	with tempfile.TemporaryDirectory(prefix="ld-debug-") as tmp:
+		run_env = dict(env, LD_DEBUG="libs", LD_DEBUG_OUTPUT=os.path.join(tmp, "ld"))
+		returncode = subprocess.run(command, env=run_env, stdout=subprocess.DEVNULL).returncode
+		logs = sorted(os.listdir(tmp))
+		text = ""
+		for name in logs:
+			with open(os.path.join(tmp, name), encoding="utf-8", errors="replace") as f:
+				text += f.read()
+	stats = parse_ld_debug(text)
+	stats["processes"] = len(logs)
+	stats["returncode"] = returncode
+	return stats
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Count the dynamic-loader lookups of a command")
+	parser.add_argument("--compare-without-ld-library-path", action="store_true",
+	                    help="also run the command without LD_LIBRARY_PATH and compare")
+	parser.add_argument("--json", action="store_true", help="print JSON")
+	parser.add_argument("command", nargs=argparse.REMAINDER, help="command to run (after --)")
+	args = parser.parse_args()
+
+	command = args.command[1:] if args.command[:1] == ["--"] else args.command
+	if not command:
+		parser.error("no command given")
+
+	results = {"current": count_lookups(command, dict(os.environ))}
+	if args.compare_without_ld_library_path:
+		env = {k: v for k, v in os.environ.items() if k != "LD_LIBRARY_PATH"}
+		results["without_ld_library_path"] = count_lookups(command, env)
+
+	if args.json:
+		print(json.dumps(results, indent=1, sort_keys=True))
+	else:
+		for label, stats in results.items():
+			print(f"{label}: {stats['lookups']} lookups ({stats['failed_lookups']} failed) "
+			      f"for {stats['libraries']} libraries, exit code {stats['returncode']}")
+		if len(results) == 2:
+			before, after = results["current"]["lookups"], results["without_ld_library_path"]["lookups"]
+			print(f"difference: {before - after} lookups")
+
+	if any(stats["returncode"] != 0 for stats in results.values()):
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
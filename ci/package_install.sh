@@ -4,13 +4,35 @@ set -euo pipefail
 # Build a relocatable Geant4 binary tarball from the module-installed trees.
 #
 # Usage:
-#   ci/package_install.sh [OUTPUT_DIR] [PACKAGE_NAME]
+#   ci/package_install.sh [OPTIONS] [OUTPUT_DIR] [PACKAGE_NAME]
+#
+# Options:
+#   --strip-debug   move the debug symbols of shared libraries and executables
+#                   into a separate PACKAGE_NAME-debug.tar.gz
+#   --split-static  move the static (.a) archives into a separate
+#                   PACKAGE_NAME-static.tar.gz
+#   --dedupe        hard-link files with identical content inside the package
+#   --runpath       rewrite the RUNPATH of the packaged ELF files to
+#                   $ORIGIN-relative paths (install/set_runpath, needs zsh and
+#                   patchelf); geant4.env then does not set LD_LIBRARY_PATH
+#   --chunk-store DIR
+#                   also write the package chunks to the content-addressed
+#                   store DIR, for incremental updates (see tarball_update.py)
 #
 # The archive bundles the Geant4, CLHEP and Xerces-C install trees so that
 # Geant4 is usable without recompiling. The Geant4 physics data is deliberately
 # excluded (it is multi-GB); a generated install_geant4_data.sh downloads it at
 # install time, mirroring what ../src does for the GEMC tarball.
 #
+# The optional -debug and -static archives have the same top-level directory as
+# the runtime archive: unpacking them over it restores the complete install.
+#
+# A per-file content-hash manifest is written inside the package
+# (geant4-manifest.json) and next to the tarball (PACKAGE_NAME.manifest.json).
+# The bundled update_geant4.py uses it to update an unpacked install in place,
+# rewriting only the files that changed (read from the published tarball, or
+# from a --chunk-store: then only the changed chunks are downloaded).
+#
 # The following environment variables are expected (set by `module load geant4`):
 #   G4INSTALL       Geant4 install prefix  (.../geant4/<g4_version>)
 #   CLHEP_BASE_DIR  CLHEP install prefix   (.../clhep/<clhep_version>)
@@ -18,13 +40,39 @@ set -euo pipefail
 # The G4*DATA variables (set by `eval "$(geant4-config --sh)"`) describe the
 # Geant4 datasets to download.
 
+strip_debug=0
+split_static=0
+dedupe=0
+runpath=0
+chunk_store=""
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --strip-debug)  strip_debug=1;  shift ;;
+    --split-static) split_static=1; shift ;;
+    --dedupe)       dedupe=1;       shift ;;
+    --runpath)      runpath=1;      shift ;;
+    --chunk-store)  chunk_store="${2:?--chunk-store needs a directory}"; shift 2 ;;
+    --)             shift; break ;;
+    -*)
+      echo "Unknown option: $1" >&2
+      exit 2
+      ;;
+    *) break ;;
+  esac
+done
+
 output_dir="${1:-dist}"
+script_dir="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
 g4install="${G4INSTALL:?G4INSTALL not set; run 'module load geant4/<version>' first}"
 clhep_dir="${CLHEP_BASE_DIR:?CLHEP_BASE_DIR not set; run 'module load geant4/<version>' first}"
 xercesc_dir="${XERCESCROOT:?XERCESCROOT not set; run 'module load geant4/<version>' first}"
 
 geant4_version="${GEANT4_VERSION:-${G4_VERSION:-$(basename "${g4install}")}}"
+# optimized builds (geant4/<version>-<variant>) keep their variant in the name
+if [[ -z "${GEANT4_VERSION:-}" && -n "${G4_VARIANT:-}" && "${G4_VARIANT}" != "generic" ]]; then
+  geant4_version+="-${G4_VARIANT}"
+fi
 clhep_version="$(basename "${clhep_dir}")"
 xercesc_version="$(basename "${xercesc_dir}")"
 
@@ -48,7 +96,11 @@ output_dir="$(cd "${output_dir}" && pwd)"
 stage="$(mktemp -d)"
 trap 'rm -rf "${stage}"' EXIT
 
-package_root="${stage}/${package_name}"
+# The runtime, debug and static trees share the package name so that the
+# optional archives unpack on top of the runtime one.
+package_root="${stage}/runtime/${package_name}"
+debug_root="${stage}/debug/${package_name}"
+static_root="${stage}/static/${package_name}"
 mkdir -p "${package_root}"
 
 # Relative layout inside the package (keeps the module-style geant4/<ver> tree).
@@ -56,15 +108,173 @@ geant4_rel="geant4/${geant4_version}"
 clhep_rel="clhep/${clhep_version}"
 xercesc_rel="xercesc/${xercesc_version}"
 
+# Populate the stage as cheaply as possible: hard links when nothing is going
+# to be modified in place (i.e. without --strip-debug or --runpath), then copy-on-write
+# reflinks (GNU cp, or clonefile with cp -c on macOS), then a plain copy.
+stage_tree() {
+  local src="$1"
+  local dst="$2"
+  if (( ! strip_debug && ! runpath )) && cp -al "${src}" "${dst}" 2>/dev/null; then
+    return 0
+  fi
+  rm -rf "${dst}"
+  if cp -a --reflink=auto "${src}" "${dst}" 2>/dev/null; then
+    return 0
+  fi
+  rm -rf "${dst}"
+  if cp -ac "${src}" "${dst}" 2>/dev/null; then
+    return 0
+  fi
+  rm -rf "${dst}"
+  cp -a "${src}" "${dst}"
+}
+
+# Stage the Geant4 tree without the bundled physics data, which is downloaded at
+# install time. Geant4 keeps it under share/Geant4*/data (and an optional
+# package cache); skipping it here avoids copying GBs only to delete them.
+stage_tree_without_data() {
+  local src="$1"
+  local dst="$2"
+  local entry share_entry name
+  mkdir -p "${dst}"
+  for entry in "${src}"/* "${src}"/.[!.]*; do
+    [[ -e "${entry}" || -L "${entry}" ]] || continue
+    name="$(basename "${entry}")"
+    if [[ "${name}" != share || ! -d "${entry}" ]]; then
+      stage_tree "${entry}" "${dst}/${name}"
+      continue
+    fi
+    mkdir -p "${dst}/share"
+    for share_entry in "${entry}"/*; do
+      [[ -e "${share_entry}" ]] || continue
+      if [[ -d "${share_entry}" && -d "${share_entry}/data" ]]; then
+        stage_tree_excluding "${share_entry}" "${dst}/share/$(basename "${share_entry}")" data
+      else
+        stage_tree "${share_entry}" "${dst}/share/$(basename "${share_entry}")"
+      fi
+    done
+  done
+}
+
+stage_tree_excluding() {
+  local src="$1"
+  local dst="$2"
+  local skip="$3"
+  local entry
+  mkdir -p "${dst}"
+  for entry in "${src}"/* "${src}"/.[!.]*; do
+    [[ -e "${entry}" || -L "${entry}" ]] || continue
+    [[ "$(basename "${entry}")" == "${skip}" ]] && continue
+    stage_tree "${entry}" "${dst}/$(basename "${entry}")"
+  done
+}
+
 mkdir -p "${package_root}/geant4" "${package_root}/clhep" "${package_root}/xercesc"
-cp -a "${g4install}"    "${package_root}/${geant4_rel}"
-cp -a "${clhep_dir}"    "${package_root}/${clhep_rel}"
-cp -a "${xercesc_dir}"  "${package_root}/${xercesc_rel}"
+stage_tree_without_data "${g4install}" "${package_root}/${geant4_rel}"
+stage_tree "${clhep_dir}"   "${package_root}/${clhep_rel}"
+stage_tree "${xercesc_dir}" "${package_root}/${xercesc_rel}"
+
+# ---------------------------------------------------------------------------
+# Optional size reductions: split the static archives and the debug symbols
+# into their own trees, hard-link duplicate files.
+# ---------------------------------------------------------------------------
+is_elf() {
+  [[ "$(LC_ALL=C head -c 4 "$1" 2>/dev/null)" == $'\x7fELF' ]]
+}
+
+split_static_archives() {
+  local root="$1"
+  local target="$2"
+  local file rel count=0
+  while IFS= read -r -d '' file; do
+    rel="${file#"${root}"/}"
+    mkdir -p "$(dirname "${target}/${rel}")"
+    mv "${file}" "${target}/${rel}"
+    count=$((count + 1))
+  done < <(find "${root}" -type f -name '*.a' -print0)
+  echo "Moved ${count} static archives to the -static package"
+}
+
+split_debug_symbols() {
+  local root="$1"
+  local target="$2"
+  local file rel debug_file count=0
+  if ! command -v objcopy >/dev/null 2>&1; then
+    echo "objcopy not found: debug symbols are left in place" >&2
+    return 0
+  fi
+  while IFS= read -r -d '' file; do
+    is_elf "${file}" || continue
+    rel="${file#"${root}"/}"
+    debug_file="${target}/${rel}.debug"
+    mkdir -p "$(dirname "${debug_file}")"
+    objcopy --only-keep-debug "${file}" "${debug_file}"
+    # the debuglink lets gdb find <file>.debug next to <file> once the -debug
+    # archive is unpacked over the runtime one
+    (cd "$(dirname "${debug_file}")" \
+      && objcopy --strip-debug --add-gnu-debuglink="$(basename "${debug_file}")" "${file}")
+    count=$((count + 1))
+  done < <(find "${root}" -type f \( -name '*.so' -o -name '*.so.*' -o -perm -u+x \) -print0)
+  echo "Moved debug symbols of ${count} ELF files to the -debug package"
+}
 
-# Drop the bundled Geant4 physics data: it is downloaded at install time.
-# Geant4 keeps it under share/Geant4*/data (and an optional package cache).
-find "${package_root}/${geant4_rel}/share" -maxdepth 2 -type d -name data -prune \
-  -exec rm -rf {} + 2>/dev/null || true
+dedupe_tree() {
+  local root="$1"
+  local -a hash_cmd
+  if command -v sha256sum >/dev/null 2>&1; then
+    hash_cmd=(sha256sum)
+  else
+    hash_cmd=(shasum -a 256)
+  fi
+
+  # "<hash> <path>" records, NUL-terminated: file names may hold newlines and
+  # backslashes (which the hash tools' text output escapes). Hashing stdin
+  # keeps the names out of that output.
+  dedupe_hash_files() {
+    local file sum
+    while IFS= read -r -d '' file; do
+      sum="$("${hash_cmd[@]}" <"${file}")"
+      printf '%s %s\0' "${sum%% *}" "${file}"
+    done < <(find "${root}" -type f -size +0 -print0)
+  }
+
+  local line hash file mode prev_mode prev_hash="" prev_file="" count=0
+  while IFS= read -r -d '' line; do
+    hash="${line%% *}"
+    file="${line#* }"
+    if [[ "${hash}" != "${prev_hash}" ]]; then
+      prev_hash="${hash}"
+      prev_file="${file}"
+      continue
+    fi
+    # already the same inode (hard-link staging), or a different exec bit
+    [[ "${file}" -ef "${prev_file}" ]] && continue
+    if [[ -x "${file}" ]]; then mode="x"; else mode="-"; fi
+    if [[ -x "${prev_file}" ]]; then prev_mode="x"; else prev_mode="-"; fi
+    [[ "${mode}" == "${prev_mode}" ]] || continue
+    if cmp -s "${prev_file}" "${file}"; then
+      ln -f "${prev_file}" "${file}"
+      count=$((count + 1))
+    fi
+  done < <(dedupe_hash_files | LC_ALL=C sort -z)
+  echo "Hard-linked ${count} duplicate files"
+}
+
+if (( runpath )); then
+  "${script_dir}/../install/set_runpath" "${package_root}/${clhep_rel}"
+  "${script_dir}/../install/set_runpath" "${package_root}/${xercesc_rel}"
+  "${script_dir}/../install/set_runpath" "${package_root}/${geant4_rel}" \
+    "${package_root}/${clhep_rel}" "${package_root}/${xercesc_rel}"
+fi
+if (( split_static )); then
+  split_static_archives "${package_root}" "${static_root}"
+fi
+if (( strip_debug )); then
+  split_debug_symbols "${package_root}" "${debug_root}"
+fi
+if (( dedupe )); then
+  dedupe_tree "${package_root}"
+fi
 
 # lib vs lib64 differs per distro; pick whichever each tree actually has.
 choose_libdir() {
@@ -79,6 +289,12 @@ geant4_lib="$(choose_libdir "${package_root}/${geant4_rel}")"
 clhep_lib="$(choose_libdir "${package_root}/${clhep_rel}")"
 xercesc_lib="$(choose_libdir "${package_root}/${xercesc_rel}")"
 
+if (( runpath )); then
+  ld_library_path_line="# the libraries find each other through their \$ORIGIN-relative RUNPATH: no LD_LIBRARY_PATH"
+else
+  ld_library_path_line='export LD_LIBRARY_PATH="${G4INSTALL}/'"${geant4_lib}"':${CLHEP_BASE_DIR}/'"${clhep_lib}"':${XERCESCROOT}/'"${xercesc_lib}"':${LD_LIBRARY_PATH:-}"'
+fi
+
 # ---------------------------------------------------------------------------
 # Collect the Geant4 dataset descriptors from the environment.
 # Each record is "ENV_NAME|ARCHIVE_NAME|DATA_DIR_NAME".
@@ -120,6 +336,60 @@ if (( ${#geant4_dataset_records[@]} == 0 )); then
   exit 1
 fi
 
+# ---------------------------------------------------------------------------
+# geant4-datasets.manifest: the datasets each reference physics list needs, so
+# that the lazy data mode only fetches those. Format: "PHYSICS_LIST|ENV ENV ...",
+# restricted to the datasets of this Geant4 version. EM option suffixes
+# (_EMZ, _LIV, ...) are stripped at lookup time. Optional datasets (optical
+# surfaces, PIXE, channeling, radioactive decay in non-shielding lists) are
+# fetched explicitly by name.
+# ---------------------------------------------------------------------------
+em_data="G4LEDATA G4ENSDFSTATEDATA"
+hadronic_data="${em_data} G4LEVELGAMMADATA G4PARTICLEXSDATA G4SAIDXSDATA"
+incl_data="G4INCLDATA G4ABLADATA"
+hp_data="G4NEUTRONHPDATA G4NUDEXLIBDATA G4URRPTDATA"
+
+physics_list_datasets=(
+  "EM|${em_data}"
+  "FTFP_BERT|${hadronic_data}"
+  "FTFP_BERT_ATL|${hadronic_data}"
+  "FTFP_BERT_TRV|${hadronic_data}"
+  "FTFQGSP_BERT|${hadronic_data}"
+  "FTF_BIC|${hadronic_data}"
+  "QBBC|${hadronic_data}"
+  "QGSP_BERT|${hadronic_data}"
+  "QGSP_BIC|${hadronic_data}"
+  "QGSP_FTFP_BERT|${hadronic_data}"
+  "QGS_BIC|${hadronic_data}"
+  "NuBeam|${hadronic_data}"
+  "FTFP_INCLXX|${hadronic_data} ${incl_data}"
+  "QGSP_INCLXX|${hadronic_data} ${incl_data}"
+  "FTFP_BERT_HP|${hadronic_data} ${hp_data}"
+  "QGSP_BERT_HP|${hadronic_data} ${hp_data}"
+  "QGSP_BIC_HP|${hadronic_data} ${hp_data}"
+  "QGSP_BIC_HPT|${hadronic_data} ${hp_data}"
+  "FTFP_INCLXX_HP|${hadronic_data} ${incl_data} ${hp_data}"
+  "QGSP_INCLXX_HP|${hadronic_data} ${incl_data} ${hp_data}"
+  "QGSP_BIC_AllHP|${hadronic_data} ${hp_data} G4PARTICLEHPDATA"
+  "LBE|${hadronic_data} ${hp_data} G4RADIOACTIVEDATA"
+  "Shielding|${hadronic_data} ${hp_data} G4RADIOACTIVEDATA"
+  "ShieldingM|${hadronic_data} ${hp_data} G4RADIOACTIVEDATA"
+)
+
+packaged_data_envs=" "
+for record in "${geant4_dataset_records[@]}"; do
+  packaged_data_envs+="${record%%|*} "
+done
+
+for entry in "${physics_list_datasets[@]}"; do
+  physics_list="${entry%%|*}"
+  envs=""
+  for env_name in ${entry#*|}; do
+    [[ "${packaged_data_envs}" == *" ${env_name} "* ]] && envs+="${envs:+ }${env_name}"
+  done
+  printf '%s|%s\n' "${physics_list}" "${envs}"
+done > "${package_root}/geant4-datasets.manifest"
+
 # ---------------------------------------------------------------------------
 # geant4.env: source after unpacking to use the relocated Geant4 install.
 # ---------------------------------------------------------------------------
@@ -128,6 +398,11 @@ cat > "${package_root}/geant4.env" <<EOF
 #
 # Geant4 data directories live under \${GEANT4_HOME}/geant4-data.
 # Run \${GEANT4_HOME}/install_geant4_data.sh once to download them.
+#
+# Lazy data mode: with GEANT4_DATA_LAZY=1 only the variables are set and
+# missing datasets are not an error. If GEANT4_PHYSICS_LIST (or Geant4's own
+# PHYSLIST) names a reference physics list, the datasets it needs are fetched
+# the first time this file is sourced.
 
 if [ -n "\${BASH_SOURCE[0]:-}" ]; then
   G4ENV_DIR="\$(cd "\$(dirname "\${BASH_SOURCE[0]}")" && pwd)"
@@ -143,7 +418,11 @@ export CLHEP_BASE_DIR="\${GEANT4_HOME}/${clhep_rel}"
 export XERCESCROOT="\${GEANT4_HOME}/${xercesc_rel}"
 
 export PATH="\${G4INSTALL}/bin:\${PATH}"
-export LD_LIBRARY_PATH="\${G4INSTALL}/${geant4_lib}:\${CLHEP_BASE_DIR}/${clhep_lib}:\${XERCESCROOT}/${xercesc_lib}:\${LD_LIBRARY_PATH:-}"
+${ld_library_path_line}
+
+# G4FORCENUMBEROFTHREADS etc. from the cgroup CPU and memory limits, if any, unless
+# already set (cpu_limits.sh --explain; G4_CPU_AUTOTUNE=0 turns it off)
+. "\${GEANT4_HOME}/cpu_limits.sh"
 
 export GEANT4_DATA_DIR="\${GEANT4_HOME}/geant4-data"
 
@@ -166,6 +445,16 @@ for g4_dataset in "${g4_datasets[@]}"; do
   export "${g4_env_name}=${GEANT4_DATA_DIR}/${g4_data_dir}"
 done
 
+if [ "${GEANT4_DATA_LAZY:-0}" = "1" ]; then
+  g4_physics_list="${GEANT4_PHYSICS_LIST:-${PHYSLIST:-}}"
+  if [ -n "${g4_physics_list}" ]; then
+    "${GEANT4_HOME}/install_geant4_data.sh" --quiet --physics-list "${g4_physics_list}" >&2 \
+      || { unset g4_physics_list; return 1 2>/dev/null || exit 1; }
+  fi
+  unset g4_data_dir g4_dataset g4_env_name g4_datasets g4_physics_list
+  return 0 2>/dev/null || exit 0
+fi
+
 g4_missing_data=()
 for g4_dataset in "${g4_datasets[@]}"; do
   g4_env_name="${g4_dataset%%|*}"
@@ -179,6 +468,7 @@ if [ "${#g4_missing_data[@]}" -gt 0 ]; then
   echo "Geant4 data check failed. Missing required data directories:" >&2
   printf '  %s\n' "${g4_missing_data[@]}" >&2
   echo "Run: ${GEANT4_HOME}/install_geant4_data.sh" >&2
+  echo "or set GEANT4_DATA_LAZY=1 to fetch datasets on demand." >&2
   return 1 2>/dev/null || exit 1
 fi
 
@@ -192,9 +482,23 @@ cat > "${package_root}/install_geant4_data.sh" <<'EOF'
 #!/usr/bin/env bash
 set -euo pipefail
 
+# Download Geant4 datasets into geant4-data/.
+#
+# Usage:
+#   install_geant4_data.sh [--quiet] [--physics-list NAME] [--list] [ENV_NAME ...]
+#
+# Without arguments every dataset is installed. ENV_NAME selects datasets by
+# their environment variable (e.g. G4LEDATA G4NEUTRONHPDATA); --physics-list
+# selects those a reference physics list needs, per geant4-datasets.manifest.
+# Datasets already present are skipped, so this is cheap to call repeatedly.
+# With GEANT4_DATA_PACK_DIR (e.g. on CVMFS, see ci/cvmfs_publish.py pack-data),
+# <directory>.tar packs found there are unpacked instead of downloaded.
+
 script_dir="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 data_dir="${script_dir}/geant4-data"
+manifest="${script_dir}/geant4-datasets.manifest"
 base_url="${GEANT4_DATA_BASE_URL:-https://cern.ch/geant4-data/datasets}"
+pack_dir="${GEANT4_DATA_PACK_DIR:-}"
 
 datasets=(
 EOF
@@ -210,6 +514,60 @@ done
 cat >> "${package_root}/install_geant4_data.sh" <<'EOF'
 )
 
+quiet=0
+list_only=0
+selected=" "
+select_physics_list() {
+  local name="$1"
+  local candidate="${name}"
+  local line
+  # FTFP_BERT_EMZ -> FTFP_BERT, FTFP_BERT__GS -> FTFP_BERT: EM option suffixes
+  # do not change the hadronic data
+  while :; do
+    while IFS= read -r line; do
+      if [[ "${line%%|*}" == "${candidate}" ]]; then
+        selected+="${line#*|} "
+        return 0
+      fi
+    done < "${manifest}"
+    [[ "${candidate}" == *_* ]] || break
+    case "${candidate##*_}" in
+      EM*|LIV|PEN|GS|SS|WVI|LE)
+        candidate="${candidate%_*}"
+        # the double underscore of FTFP_BERT__GS
+        while [[ "${candidate}" == *_ ]]; do candidate="${candidate%_}"; done
+        ;;
+      *) break ;;
+    esac
+  done
+  echo "Unknown physics list '${name}'. Known physics lists:" >&2
+  cut -d'|' -f1 "${manifest}" | sed 's/^/  /' >&2
+  return 1
+}
+
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --quiet)        quiet=1; shift ;;
+    --list)         list_only=1; shift ;;
+    --physics-list) select_physics_list "${2:?missing physics list name}"; shift 2 ;;
+    -*)
+      echo "Unknown option: $1" >&2
+      exit 2
+      ;;
+    *)              selected+="$1 "; shift ;;
+  esac
+done
+
+if (( list_only )); then
+  for item in "${datasets[@]}"; do
+    env_name="${item%%|*}"
+    directory="${item##*|}"
+    if [[ -d "${data_dir}/${directory}" ]]; then state="installed"; else state="missing"; fi
+    printf '%-22s %-28s %s\n' "${env_name}" "${directory}" "${state}"
+  done
+  exit 0
+fi
+
 download() {
   local url="$1"
   local output="$2"
@@ -225,6 +583,9 @@ download() {
 
 mkdir -p "${data_dir}"
 
+tmp=""
+trap '[[ -z "${tmp}" ]] || rm -rf "${tmp}"' EXIT
+
 for item in "${datasets[@]}"; do
   env_name="${item%%|*}"
   rest="${item#*|}"
@@ -232,28 +593,47 @@ for item in "${datasets[@]}"; do
   directory="${rest#*|}"
   target="${data_dir}/${directory}"
 
+  if [[ "${selected}" != " " && "${selected}" != *" ${env_name} "* ]]; then
+    continue
+  fi
+
   if [[ -d "${target}" ]]; then
-    echo "Found ${env_name}: ${directory}"
+    (( quiet )) || echo "Found ${env_name}: ${directory}"
     continue
   fi
 
-  tmp="$(mktemp -d)"
-  trap 'rm -rf "${tmp}"' EXIT
-  echo "Downloading ${env_name}: ${directory}"
-  download "${base_url}/${archive}" "${tmp}/${archive}"
-  tar -xzf "${tmp}/${archive}" -C "${data_dir}"
-  rm -rf "${tmp}"
-  trap - EXIT
+  # Unpack next to the target and rename it into place, so concurrent jobs
+  # fetching the same dataset never see a half-extracted directory.
+  tmp="$(mktemp -d "${data_dir}/.fetch.XXXXXX")"
+  if [[ -n "${pack_dir}" && -f "${pack_dir}/${directory}.tar" ]]; then
+    (( quiet )) || echo "Unpacking ${env_name}: ${directory}"
+    tar -xf "${pack_dir}/${directory}.tar" -C "${tmp}"
+  else
+    echo "Downloading ${env_name}: ${directory}"
+    download "${base_url}/${archive}" "${tmp}/${archive}"
+    tar -xzf "${tmp}/${archive}" -C "${tmp}"
+  fi
 
-  if [[ ! -d "${target}" ]]; then
+  if [[ ! -d "${tmp}/${directory}" ]]; then
     echo "Expected directory was not created: ${target}" >&2
     exit 1
   fi
+  # Another job may have installed the same dataset meanwhile: keep its copy.
+  # mv -T never moves into an existing target; without it (BSD mv), undo a
+  # move into a target created since the check.
+  if ! mv -T "${tmp}/${directory}" "${target}" 2>/dev/null && [[ ! -d "${target}" ]]; then
+    mv "${tmp}/${directory}" "${target}"
+    [[ ! -d "${target}/${directory}" ]] || rm -rf "${target:?}/${directory}"
+  fi
+  rm -rf "${tmp}"
+  tmp=""
 done
 
-echo "Geant4 data installed in ${data_dir}"
+(( quiet )) || echo "Geant4 data installed in ${data_dir}"
 EOF
 chmod +x "${package_root}/install_geant4_data.sh"
+cp "${script_dir}/cpu_limits.sh" "${package_root}/cpu_limits.sh"
+chmod +x "${package_root}/cpu_limits.sh"
 
 cat > "${package_root}/INSTALL_TARBALL.md" <<EOF
 # Geant4 binary tarball
@@ -273,10 +653,99 @@ source ./geant4.env
 geant4-config --version
 \`\`\`
 
+To fetch only what a job needs, use the lazy data mode instead: nothing is
+downloaded up front, and the datasets of the physics list are fetched the first
+time the environment is sourced (\`FTFP_BERT_EMZ\` never downloads the neutron
+HP data, \`EM\` fetches only the electromagnetic data):
+
+\`\`\`bash
+export GEANT4_DATA_LAZY=1 GEANT4_PHYSICS_LIST=FTFP_BERT_EMZ
+source ./geant4.env
+./install_geant4_data.sh G4REALSURFACEDATA   # extra datasets, by name
+./install_geant4_data.sh --list              # what is installed
+\`\`\`
+
 The archive is relocatable: \`geant4.env\` derives all paths from its own
 location, so it works wherever you unpack it.
+
+## Updating
+
+\`geant4-manifest.json\` lists the content hash of every file. To move this
+install to a newer build, point \`update_geant4.py\` to the new manifest:
+only the files that changed are rewritten, and files you added are kept. The
+new files are read from the tarball published next to the manifest:
+
+\`\`\`bash
+./update_geant4.py update . --manifest <URL>/<package>.manifest.json
+\`\`\`
+
+With the chunk store the build was published with, only the chunks that
+changed are downloaded instead of the whole tarball:
+
+\`\`\`bash
+./update_geant4.py update . --manifest <URL>/<package>.manifest.json --chunks <URL>/chunks
+\`\`\`
+EOF
+
+if (( runpath )); then
+  cat >> "${package_root}/INSTALL_TARBALL.md" <<'EOF'
+
+## Library lookup
+
+The Geant4, CLHEP and Xerces-C libraries carry an `$ORIGIN`-relative RUNPATH,
+so `geant4.env` does not set `LD_LIBRARY_PATH`. Applications you build against
+this install get the Geant4 library directory in their RUNPATH from CMake; if
+you strip it at install time, add it back or set `LD_LIBRARY_PATH` yourself.
 EOF
+fi
+if [[ -d "${static_root}" ]]; then
+  cat >> "${package_root}/INSTALL_TARBALL.md" <<EOF
+
+## Static libraries
+
+The static libraries are shipped separately in \`${package_name}-static.tar.gz\`.
+Unpack it over this directory before building applications with
+\`find_package(Geant4)\`: the Geant4 CMake configuration references them.
+EOF
+fi
+if [[ -d "${debug_root}" ]]; then
+  cat >> "${package_root}/INSTALL_TARBALL.md" <<EOF
+
+## Debug symbols
+
+The debug symbols are shipped separately in \`${package_name}-debug.tar.gz\`.
+Unpack it over this directory and gdb picks up the \`.debug\` files.
+EOF
+fi
+
+# ---------------------------------------------------------------------------
+# Content-hash manifest (inside the package and as a sidecar) plus the update
+# tool that consumes it.
+# ---------------------------------------------------------------------------
+if command -v python3 >/dev/null 2>&1; then
+  cp "${script_dir}/tarball_update.py" "${package_root}/update_geant4.py"
+  cp "${script_dir}/g4bench.py" "${package_root}/g4bench"
+  cp "${script_dir}/../modules/util/osrelease.py" "${package_root}/osrelease.py"
+  chmod +x "${package_root}/update_geant4.py" "${package_root}/g4bench" "${package_root}/osrelease.py"
+  manifest_args=(create "${package_root}" --package "${package_name}")
+  if [[ -n "${chunk_store}" ]]; then
+    mkdir -p "${chunk_store}"
+    manifest_args+=(--chunk-store "$(cd "${chunk_store}" && pwd)")
+  fi
+  python3 "${script_dir}/tarball_update.py" "${manifest_args[@]}"
+  cp "${package_root}/geant4-manifest.json" "${output_dir}/${package_name}.manifest.json"
+else
+  echo "python3 not found: no content-hash manifest is written" >&2
+fi
 
 tarball="${output_dir}/${package_name}.tar.gz"
-tar -C "${stage}" -czf "${tarball}" "${package_name}"
+tar -C "${stage}/runtime" -czf "${tarball}" "${package_name}"
 echo "${tarball}"
+
+for flavor in debug static; do
+  if [[ -d "${stage}/${flavor}/${package_name}" ]]; then
+    tarball="${output_dir}/${package_name}-${flavor}.tar.gz"
+    tar -C "${stage}/${flavor}" -czf "${tarball}" "${package_name}"
+    echo "${tarball}"
+  fi
+done
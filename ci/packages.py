@@ -1,14 +1,15 @@
 #!/usr/bin/env python3
 import argparse
+import sys
 
-from functions import map_family, is_valid_image, unique_preserve_order
+from functions import RenderConfig, InvalidImageError, render_config, unique_preserve_order
 
 # Small debian adjustments are done in code below
 pkg_sections = {
 	"cxx_essentials": {
-		"fedora":    ["git", "make", "cmake", "gcc-c++", "gdb", "valgrind", "libxcrypt-devel"],
-		"debian":    ["git", "make", "cmake", "g++", "gdb", "valgrind", "libcrypt-dev"],
-		"archlinux": ["git", "make", "cmake", "gcc", "gdb", "valgrind"],
+		"fedora":    ["git", "make", "cmake", "gcc-c++", "gdb", "valgrind", "libxcrypt-devel", "patchelf"],
+		"debian":    ["git", "make", "cmake", "g++", "gdb", "valgrind", "libcrypt-dev", "patchelf"],
+		"archlinux": ["git", "make", "cmake", "gcc", "gdb", "valgrind", "patchelf"],
 	},
 	"expat":          {
 		"fedora":    ["expat-devel"],
@@ -77,10 +78,22 @@ pkg_sections = {
 		"debian":    ["liblz4-dev", "liblzma-dev", "libzstd-dev"],
 		"archlinux": ["root"],
 	},
+	# oneTBB: headers and CMake config for geant4/<version>-tbb (GEANT4_USE_TBB)
+	"tbb":            {
+		"fedora":    ["tbb", "tbb-devel"],
+		"debian":    ["libtbb12", "libtbb-dev"],
+		"archlinux": ["tbb"],
+	},
+	# distributed compilation of the source installs (ci/distcc_pool.sh)
+	"distcc":         {
+		"fedora":    ["distcc"],
+		"debian":    ["distcc"],
+		"archlinux": ["distcc"],
+	},
 	"sanitizers":     {
-		"fedora":    ["liblsan", "libasan", "libubsan", "libtsan", "tbb"],
-		"debian":    ["liblsan0", "libasan8", "libubsan1", "libtsan2", "libtbb12"],
-		"archlinux": ["gcc-libs", "tbb"],
+		"fedora":    ["liblsan", "libasan", "libubsan", "libtsan"],
+		"debian":    ["liblsan0", "libasan8", "libubsan1", "libtsan2"],
+		"archlinux": ["gcc-libs"],
 	},
 }
 
@@ -109,6 +122,12 @@ def fedora_adjustments(pkgs: list[str]) -> list[str]:
 	return out
 
 
+def almalinux_adjustments(pkgs: list[str]) -> list[str]:
+	# distcc is only in EPEL, which is not enabled: the builds stay local
+	remove = {"distcc"}
+	return [p for p in pkgs if p not in remove]
+
+
 def almalinux10_adjustments(pkgs: list[str]) -> list[str]:
 	# AlmaLinux 10 (RHEL 10): no VNC/desktop stack available.
 	# tigervnc-server, openbox, x11vnc, xorg-x11-server-Xvfb are absent from
@@ -117,21 +136,22 @@ def almalinux10_adjustments(pkgs: list[str]) -> list[str]:
 	return [p for p in pkgs if p not in remove]
 
 
-def packages_to_be_installed(image: str, tag: str = "") -> str:
-	family = map_family(image)  # e.g., 'debian' (for ubuntu), 'fedora', 'arch'
-
+def packages_to_be_installed(cfg: RenderConfig) -> str:
 	pkgs = []
 	for section in pkg_sections.values():
-		pkgs.extend(section.get(family, []))
+		pkgs.extend(section.get(cfg.family, []))
 
 	# Debian needs Qt6 name tweaks (only when the actual base is debian)
-	if image == "debian":
+	if cfg.image == "debian":
 		pkgs = debian_adjustments(pkgs)
 
-	if image == "fedora":
+	if cfg.image == "fedora":
 		pkgs = fedora_adjustments(pkgs)
 
-	if image == "almalinux" and tag.startswith("10"):
+	if cfg.image == "almalinux":
+		pkgs = almalinux_adjustments(pkgs)
+
+	if cfg.image == "almalinux" and cfg.tag.startswith("10"):
 		pkgs = almalinux10_adjustments(pkgs)
 
 	# De-dupe but KEEP section order
@@ -139,9 +159,9 @@ def packages_to_be_installed(image: str, tag: str = "") -> str:
 	return ' '.join(pkgs)
 
 
-def packages_install_command(image: str, tag: str = "") -> str:
-	family = map_family(image)
-	packages = packages_to_be_installed(image, tag)
+def packages_install_command(cfg: RenderConfig) -> str:
+	family = cfg.family
+	packages = packages_to_be_installed(cfg)
 
 	# Single place for the log file; put it somewhere writable during build.
 	log = "/tmp/packages-install.log"
@@ -191,9 +211,13 @@ def main():
 	)
 
 	args = parser.parse_args()
-	is_valid_image(args.image)
+	try:
+		cfg = render_config(args.image)
+	except InvalidImageError as e:
+		print(f"Error: {e}", file=sys.stderr)
+		sys.exit(1)
 
-	print(packages_install_command(args.image))
+	print(packages_install_command(cfg))
 
 
 if __name__ == "__main__":
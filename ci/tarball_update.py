@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# Content-hash manifest of a Geant4 binary tarball, and incremental updates of
+# an unpacked install from a newer manifest.
+#
+# ci/package_install.sh runs `create` on the package tree: the manifest lists
+# every file with its sha256 and the sha256 of its fixed-size chunks. With
+# --chunk-store the chunks are also written to a content-addressed layout
+# (<store>/<first two hex digits>/<sha256>) that can be served over HTTP and
+# shared by every nightly: unchanged chunks are stored once.
+#
+# `update` brings an unpacked install to a new manifest, reusing the chunks it
+# already has locally and downloading only the missing ones:
+#
+#   ./update_geant4.py update . \
+#       --manifest https://example.org/geant4-dev-ubuntu-24.04-amd64.manifest.json \
+#       --chunks   https://example.org/chunks
+#
+# Without --chunks the missing chunks are read from the tarball published next
+# to the manifest (<package>.tar.gz, or --tarball), streamed: this is what the
+# CI releases ship (release assets are a flat list, they hold no chunk store).
+# Only the changed files are rewritten, but the whole tarball is downloaded.
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import stat
+import sys
+import tarfile
+import tempfile
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+MANIFEST_NAME = "geant4-manifest.json"
+MANIFEST_FORMAT = 1
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Never part of the manifest: the manifest itself and the downloaded Geant4 data.
+EXCLUDED = (MANIFEST_NAME, "geant4-data")
+
+
+class UpdateError(Exception):
+	pass
+
+
+DIGEST = re.compile(r"[0-9a-f]{64}")
+
+
+def sha256(data: bytes) -> str:
+	return hashlib.sha256(data).hexdigest()
+
+
+def chunk_path(store: str, digest: str) -> str:
+	return f"{store}/{digest[:2]}/{digest}"
+
+
+def iter_chunks(path: str, chunk_size: int):
+	with open(path, "rb") as f:
+		while True:
+			data = f.read(chunk_size)
+			if not data:
+				return
+			yield data
+
+
+def walk_tree(root: str):
+	"""Yield (relative path, os.stat_result) for every file and symlink, sorted."""
+	for dirpath, dirnames, filenames in os.walk(root):
+		rel_dir = os.path.relpath(dirpath, root)
+		if rel_dir == ".":
+			dirnames[:] = [d for d in dirnames if d not in EXCLUDED]
+			filenames = [f for f in filenames if f not in EXCLUDED]
+		dirnames.sort()
+		# symlinks to directories are listed in dirnames but not walked
+		for name in sorted(filenames + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]):
+			path = os.path.join(dirpath, name)
+			yield os.path.normpath(os.path.join(rel_dir, name)), os.lstat(path)
+
+
+def create_manifest(root: str, package: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    chunk_store: Optional[str] = None) -> dict:
+	files = {}
+	symlinks = {}
+	for rel, st in walk_tree(root):
+		path = os.path.join(root, rel)
+		if stat.S_ISLNK(st.st_mode):
+			symlinks[rel] = os.readlink(path)
+			continue
+		whole = hashlib.sha256()
+		chunks = []
+		for data in iter_chunks(path, chunk_size):
+			whole.update(data)
+			digest = sha256(data)
+			chunks.append(digest)
+			if chunk_store:
+				write_chunk(chunk_store, digest, data)
+		files[rel] = {
+			"size": st.st_size,
+			"mode": f"{stat.S_IMODE(st.st_mode):o}",
+			"sha256": whole.hexdigest(),
+			"chunks": chunks,
+		}
+	return {
+		"format": MANIFEST_FORMAT,
+		"package": package,
+		"chunk_size": chunk_size,
+		"files": files,
+		"symlinks": symlinks,
+	}
+
+
+def write_chunk(store: str, digest: str, data: bytes) -> None:
+	target = chunk_path(store, digest)
+	if os.path.exists(target):
+		return
+	os.makedirs(os.path.dirname(target), exist_ok=True)
+	fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target))
+	with os.fdopen(fd, "wb") as f:
+		f.write(data)
+	os.replace(tmp, target)
+
+
+def read_url(location: str) -> bytes:
+	"""Read an http(s)/file URL or a plain path."""
+	if "://" not in location:
+		with open(location, "rb") as f:
+			return f.read()
+	with urllib.request.urlopen(location, timeout=60) as response:
+		return response.read()
+
+
+def open_url(location: str):
+	"""A binary stream of an http(s)/file URL or a plain path."""
+	if "://" not in location:
+		return open(location, "rb")
+	return urllib.request.urlopen(location, timeout=60)
+
+
+def tarball_location(manifest_location: str) -> Optional[str]:
+	"""The tarball published next to a <package>.manifest.json."""
+	suffix = ".manifest.json"
+	if manifest_location.endswith(suffix):
+		return manifest_location[:-len(suffix)] + ".tar.gz"
+	return None
+
+
+class CountingReader:
+	"""Counts the bytes read from a stream."""
+
+	def __init__(self, stream):
+		self.stream = stream
+		self.count = 0
+
+	def read(self, size: int = -1) -> bytes:
+		data = self.stream.read(size)
+		self.count += len(data)
+		return data
+
+
+def chunks_from_tarball(location: str, manifest: dict, missing: set, cache: str) -> int:
+	"""Write the missing chunks found in the files of a tarball to cache and
+	remove them from missing; returns the bytes downloaded. The tarball is
+	streamed and nothing is extracted: every chunk is checked by its digest.
+	Hard links (package_install.sh --dedupe) need no data: their target has
+	the same chunks."""
+	chunk_size = manifest["chunk_size"]
+	wanted = {rel for rel, entry in manifest["files"].items() if missing.intersection(entry["chunks"])}
+	with open_url(location) as stream:
+		reader = CountingReader(stream)
+		with tarfile.open(fileobj=reader, mode="r|gz") as tar:
+			for member in tar:
+				# <package>/<rel>
+				rel = member.name.split("/", 1)[1] if "/" in member.name else ""
+				if not member.isreg() or rel not in wanted:
+					continue
+				f = tar.extractfile(member)
+				for data in iter(lambda: f.read(chunk_size), b""):
+					digest = sha256(data)
+					if digest in missing:
+						write_chunk(cache, digest, data)
+						missing.discard(digest)
+				if not missing:
+					break
+	return reader.count
+
+
+def load_manifest(location: str) -> dict:
+	manifest = json.loads(read_url(location))
+	if manifest.get("format") != MANIFEST_FORMAT:
+		raise UpdateError(f"{location}: unsupported manifest format {manifest.get('format')}")
+	return manifest
+
+
+def install_path(install_dir: str, rel: str) -> str:
+	"""install_dir/rel, refusing manifest entries that resolve outside install_dir."""
+	if not rel or os.path.isabs(rel) or ".." in rel.split("/") or os.path.normpath(rel) != rel:
+		raise UpdateError(f"manifest entry '{rel}': not a relative path inside the install")
+	root = os.path.realpath(install_dir)
+	path = os.path.join(install_dir, rel)
+	# the parent only: the entry itself may be a symlink (replaced, not followed)
+	parent = os.path.realpath(os.path.dirname(path))
+	if os.path.commonpath([root, parent]) != root:
+		raise UpdateError(f"manifest entry '{rel}': resolves outside of {install_dir}")
+	return path
+
+
+def check_manifest(install_dir: str, manifest: dict) -> None:
+	"""Refuse a manifest writing or deleting outside install_dir, or with bad chunk names."""
+	for rel, entry in manifest["files"].items():
+		install_path(install_dir, rel)
+		for digest in entry["chunks"]:
+			if not DIGEST.fullmatch(digest):
+				raise UpdateError(f"manifest entry '{rel}': invalid chunk '{digest}'")
+		if not re.fullmatch(r"[0-7]{1,4}", entry["mode"]):
+			raise UpdateError(f"manifest entry '{rel}': invalid mode '{entry['mode']}'")
+	root = os.path.realpath(install_dir)
+	for rel, target in manifest["symlinks"].items():
+		path = install_path(install_dir, rel)
+		resolved = os.path.normpath(os.path.join(os.path.realpath(os.path.dirname(path)), target))
+		if os.path.isabs(target) or os.path.commonpath([root, resolved]) != root:
+			raise UpdateError(f"manifest symlink '{rel}' -> '{target}': points outside of {install_dir}")
+
+
+def file_sha256(path: str) -> str:
+	digest = hashlib.sha256()
+	with open(path, "rb") as f:
+		for data in iter(lambda: f.read(1024 * 1024), b""):
+			digest.update(data)
+	return digest.hexdigest()
+
+
+def is_current(install_dir: str, rel: str, entry: dict, old: Optional[dict], verify: bool) -> bool:
+	path = os.path.join(install_dir, rel)
+	if os.path.islink(path) or not os.path.isfile(path) or os.path.getsize(path) != entry["size"]:
+		return False
+	if stat.S_IMODE(os.stat(path).st_mode) != int(entry["mode"], 8):
+		return False
+	old_entry = (old or {}).get("files", {}).get(rel)
+	if old_entry and not verify:
+		return old_entry["sha256"] == entry["sha256"]
+	return file_sha256(path) == entry["sha256"]
+
+
+def local_chunk_index(install_dir: str, manifest: Optional[dict]) -> dict:
+	"""sha256 -> (path, offset, size) of the chunks the old manifest describes.
+	Locations are trusted here and verified when the chunk is read."""
+	index = {}
+	if manifest:
+		chunk_size = manifest["chunk_size"]
+		for rel, entry in manifest["files"].items():
+			path = os.path.join(install_dir, rel)
+			for i, digest in enumerate(entry["chunks"]):
+				size = min(chunk_size, entry["size"] - i * chunk_size)
+				index.setdefault(digest, (path, i * chunk_size, size))
+	return index
+
+
+def index_local_files(install_dir: str, paths, chunk_size: int, index: dict) -> None:
+	"""Chunk existing files that no (compatible) old manifest describes."""
+	for rel in paths:
+		path = os.path.join(install_dir, rel)
+		if os.path.islink(path) or not os.path.isfile(path):
+			continue
+		offset = 0
+		for data in iter_chunks(path, chunk_size):
+			index.setdefault(sha256(data), (path, offset, len(data)))
+			offset += len(data)
+
+
+def read_local_chunk(location: tuple, digest: str) -> Optional[bytes]:
+	path, offset, size = location
+	try:
+		with open(path, "rb") as f:
+			f.seek(offset)
+			data = f.read(size)
+	except OSError:
+		return None
+	return data if sha256(data) == digest else None
+
+
+def update(install_dir: str, manifest_location: str, chunks_url: Optional[str] = None, verify: bool = False,
+           jobs: int = 8, log=print, tarball: Optional[str] = None) -> dict:
+	"""Update install_dir to the manifest, with the missing chunks from the
+	chunk store chunks_url or else from the tarball; returns transfer statistics."""
+	if not chunks_url:
+		tarball = tarball or tarball_location(manifest_location)
+		if not tarball:
+			raise UpdateError("no chunk store (--chunks) and no tarball (--tarball) to download from")
+	new = load_manifest(manifest_location)
+	old_path = os.path.join(install_dir, MANIFEST_NAME)
+	old = load_manifest(old_path) if os.path.exists(old_path) else None
+	# before anything is downloaded, written or removed
+	check_manifest(install_dir, new)
+	if old:
+		check_manifest(install_dir, old)
+	chunk_size = new["chunk_size"]
+
+	changed = [rel for rel, entry in new["files"].items()
+	           if not is_current(install_dir, rel, entry, old, verify)]
+
+	index = local_chunk_index(install_dir, old)
+	if old is None or old.get("chunk_size") != chunk_size:
+		index_local_files(install_dir, changed, chunk_size, index)
+
+	needed = list(dict.fromkeys(digest for rel in changed for digest in new["files"][rel]["chunks"]))
+
+	stats = {"files_changed": len(changed), "chunks_reused": 0, "chunks_downloaded": 0,
+	         "bytes_downloaded": 0, "files_removed": 0}
+
+	cache = tempfile.mkdtemp(prefix=".update-", dir=install_dir)
+	try:
+		missing = []
+		for digest in needed:
+			data = read_local_chunk(index[digest], digest) if digest in index else None
+			if data is None:
+				missing.append(digest)
+				continue
+			write_chunk(cache, digest, data)
+			stats["chunks_reused"] += 1
+
+		def download(digest: str) -> int:
+			data = read_url(chunk_path(chunks_url.rstrip("/"), digest))
+			if sha256(data) != digest:
+				raise UpdateError(f"chunk {digest}: checksum mismatch")
+			write_chunk(cache, digest, data)
+			return len(data)
+
+		if chunks_url:
+			with ThreadPoolExecutor(max_workers=jobs) as pool:
+				for size in pool.map(download, missing):
+					stats["chunks_downloaded"] += 1
+					stats["bytes_downloaded"] += size
+		elif missing:
+			remaining = set(missing)
+			log(f"{new['package']}: reading {len(remaining)} chunks from {tarball}")
+			stats["bytes_downloaded"] += chunks_from_tarball(tarball, new, remaining, cache)
+			if remaining:
+				raise UpdateError(f"{tarball}: {len(remaining)} chunks of the manifest not found in the tarball")
+			stats["chunks_downloaded"] += len(missing)
+
+		# every chunk is in the cache: assemble and atomically replace each file
+		for rel in changed:
+			entry = new["files"][rel]
+			path = os.path.join(install_dir, rel)
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+			with os.fdopen(fd, "wb") as f:
+				for digest in entry["chunks"]:
+					with open(chunk_path(cache, digest), "rb") as chunk:
+						shutil.copyfileobj(chunk, f)
+			os.chmod(tmp, int(entry["mode"], 8))
+			if os.path.isdir(path) and not os.path.islink(path):
+				shutil.rmtree(path)
+			os.replace(tmp, path)
+	finally:
+		shutil.rmtree(cache, ignore_errors=True)
+
+	for rel, target in new["symlinks"].items():
+		path = os.path.join(install_dir, rel)
+		if os.path.islink(path) and os.readlink(path) == target:
+			continue
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		tmp = f"{path}.update-link"
+		os.symlink(target, tmp)
+		os.replace(tmp, path)
+
+	# only remove what the previous manifest installed: never touch user files
+	if old:
+		for rel in list(old["files"]) + list(old["symlinks"]):
+			if rel in new["files"] or rel in new["symlinks"]:
+				continue
+			path = os.path.join(install_dir, rel)
+			if os.path.islink(path) or os.path.isfile(path):
+				os.remove(path)
+				stats["files_removed"] += 1
+
+	with open(old_path, "w", encoding="utf-8") as f:
+		json.dump(new, f, indent=1, sort_keys=True)
+		f.write("\n")
+
+	log(f"{new['package']}: {stats['files_changed']} files changed, "
+	    f"{stats['chunks_reused']} chunks reused, {stats['chunks_downloaded']} chunks downloaded "
+	    f"({stats['bytes_downloaded']} bytes), {stats['files_removed']} files removed")
+	return stats
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Geant4 tarball manifests and incremental updates")
+	sub = parser.add_subparsers(dest="command", required=True)
+
+	create = sub.add_parser("create", help="write the manifest of a package tree")
+	create.add_argument("root", help="package directory")
+	create.add_argument("--package", help="package name (default: basename of root)")
+	create.add_argument("--output", help=f"manifest path (default: ROOT/{MANIFEST_NAME})")
+	create.add_argument("--chunk-store", help="also write the chunks to this content-addressed directory")
+	create.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+	                    help="chunk size in bytes (default: %(default)s)")
+
+	upd = sub.add_parser("update", help="update an unpacked install to a new manifest")
+	upd.add_argument("install_dir", help="unpacked install (the directory containing geant4.env)")
+	upd.add_argument("--manifest", required=True, help="URL or path of the new manifest")
+	upd.add_argument("--chunks", help="URL or path of the chunk store (default: read the tarball)")
+	upd.add_argument("--tarball", help="URL or path of the tarball (default: the manifest URL with .tar.gz)")
+	upd.add_argument("--verify", action="store_true", help="hash local files instead of trusting the old manifest")
+	upd.add_argument("-j", "--jobs", type=int, default=8, help="parallel downloads (default: %(default)s)")
+
+	args = parser.parse_args()
+
+	try:
+		if args.command == "create":
+			root = os.path.abspath(args.root)
+			manifest = create_manifest(root, args.package or os.path.basename(root), args.chunk_size,
+			                           args.chunk_store)
+			with open(args.output or os.path.join(root, MANIFEST_NAME), "w", encoding="utf-8") as f:
+				json.dump(manifest, f, indent=1, sort_keys=True)
+				f.write("\n")
+		else:
+			update(os.path.abspath(args.install_dir), args.manifest, args.chunks, args.verify, args.jobs,
+			       tarball=args.tarball)
+	except (UpdateError, OSError) as e:
+		print(f"Error: {e}", file=sys.stderr)
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -1,18 +1,159 @@
-# get the full, normlized path to the directory containing this tcl script:
+# get the full, normlized path to the g4install directory, two levels above this
+# tcl script. Computed once, when the script is sourced: no subprocess.
+set ::g4install_home [ file normalize [file dirname [info script]]/../../ ]
+
 proc home {} {
-    set x [ dict get [info frame 0] file ]
-    return [ file normalize [exec dirname $x]/../../ ]
+    return $::g4install_home
 }
 
-# get the $OSRELEASE environment variable if it exists, else
-# run our script to get what it will become upon loading modules:
+# get the $OSRELEASE environment variable if it exists (sim_system exports it),
+# else compute what it will become upon loading modules. The value is memoized
+# for the rest of the modulecmd run.
 # (Note, we don't use our getenv here for performance reasons.)
 proc osrelease {} {
     global env
     if { [ info exists env(OSRELEASE) ] } {
         return $env(OSRELEASE)
     }
-    return [ exec [home]/modules/util/osrelease.py ]
+    if { ![ info exists ::g4install_osrelease ] } {
+        set ::g4install_osrelease [ compute_osrelease ]
+    }
+    return $::g4install_osrelease
+}
+
+# <os><major>-<compiler><major>-<arch>, the same string as osrelease.py,
+# computed in Tcl from files only. osrelease.py is run only if a part cannot
+# be determined that way (no os-release, no or ambiguous compiler).
+proc compute_osrelease {} {
+    global tcl_platform
+    if { $tcl_platform(os) eq "Darwin" } {
+        set os [ macos_version ]
+        set compiler [ apple_clang_version ]
+    } else {
+        set os [ linux_os_version ]
+        set compiler [ gcc_version ]
+    }
+    if { $os eq "" || $compiler eq "" } {
+        return [ exec [home]/modules/util/osrelease.py ]
+    }
+    return $os-$compiler-[ arch_tag ]
+}
+
+# leading integer of a version string
+proc version_major {version} {
+    if { [ regexp {\d+} $version major ] } {
+        return $major
+    }
+    return ""
+}
+
+# /etc/os-release normalized as in osrelease.py, e.g. ubuntu24, fedora44, arch
+proc linux_os_version {} {
+    if { [ catch { open /etc/os-release r } f ] } {
+        return ""
+    }
+    set osr [ dict create ID "" VERSION_ID "" ]
+    foreach line [ split [ read $f ] "\n" ] {
+        set line [ string trim $line ]
+        if { $line eq "" || [ string index $line 0 ] eq "#" } {
+            continue
+        }
+        set eq [ string first "=" $line ]
+        if { $eq < 0 } {
+            continue
+        }
+        set value [ string trim [ string trim [ string range $line [expr {$eq + 1}] end ] ] "\"'" ]
+        dict set osr [ string range $line 0 [expr {$eq - 1}] ] $value
+    }
+    close $f
+
+    set id [ string tolower [ dict get $osr ID ] ]
+    set major [ version_major [ dict get $osr VERSION_ID ] ]
+    if { $id eq "arch" } {
+        return arch
+    }
+    if { $major eq "" && $id eq "" } {
+        return linux
+    }
+    return $id$major
+}
+
+# gcc<major> of the first gcc in PATH: from a gcc-<major> symlink target, else
+# from the single <prefix>/lib/gcc/<triple>/<version> directory of its prefix.
+proc gcc_version {} {
+    global env
+    set gcc ""
+    foreach dir [ split [ expr {[ info exists env(PATH) ] ? $env(PATH) : ""} ] ":" ] {
+        if { $dir ne "" && [ file executable $dir/gcc ] && ![ file isdirectory $dir/gcc ] } {
+            set gcc $dir/gcc
+            break
+        }
+    }
+    if { $gcc eq "" } {
+        return ""
+    }
+    for { set i 0 } { $i < 16 && [ file type $gcc ] eq "link" } { incr i } {
+        set target [ file readlink $gcc ]
+        if { [ regexp {^gcc-(\d+)$} [ file tail $target ] -> major ] } {
+            return gcc$major
+        }
+        set gcc [ file join [ file dirname $gcc ] $target ]
+    }
+    set prefix [ file dirname [ file dirname $gcc ] ]
+    set majors {}
+    foreach libdir [ glob -nocomplain -type d $prefix/lib/gcc/*/* $prefix/lib64/gcc/*/* ] {
+        set major [ version_major [ file tail $libdir ] ]
+        if { $major ne "" && $major ni $majors } {
+            lappend majors $major
+        }
+    }
+    if { [ llength $majors ] == 1 } {
+        return gcc[ lindex $majors 0 ]
+    }
+    return ""
+}
+
+# macosx<major> from SystemVersion.plist
+proc macos_version {} {
+    if { [ catch { open /System/Library/CoreServices/SystemVersion.plist r } f ] } {
+        return ""
+    }
+    set plist [ read $f ]
+    close $f
+    if { [ regexp {<key>ProductVersion</key>\s*<string>(\d+)} $plist -> major ] } {
+        return macosx$major
+    }
+    return ""
+}
+
+# clang<major> from the resource directory of the Command Line Tools or Xcode
+proc apple_clang_version {} {
+    set majors {}
+    foreach toolchain {
+        /Library/Developer/CommandLineTools/usr/lib/clang
+        /Applications/Xcode.app/Contents/Developer/Toolchains/XcodeDefault.xctoolchain/usr/lib/clang
+    } {
+        foreach dir [ glob -nocomplain -type d $toolchain/* ] {
+            set major [ version_major [ file tail $dir ] ]
+            if { $major ne "" && $major ni $majors } {
+                lappend majors $major
+            }
+        }
+    }
+    if { [ llength $majors ] == 1 } {
+        return clang[ lindex $majors 0 ]
+    }
+    return ""
+}
+
+# x86_64 or arm64, as in osrelease.py
+proc arch_tag {} {
+    global tcl_platform
+    set machine [ string tolower $tcl_platform(machine) ]
+    if { $machine in {aarch64 arm64} || [ string match armv8* $machine ] } {
+        return arm64
+    }
+    return x86_64
 }
 
 # print a colored error message:
@@ -56,6 +197,11 @@ proc warnfile {path msg what} {
 
 proc prepend-ldpath {path} {
     global env
+    # installs relinked by install/set_runpath find their libraries through
+    # their $ORIGIN-relative RUNPATH
+    if { $path ne "" && [file exists [file dirname $path]/.g4install-runpath] } {
+        return
+    }
     prepend-path LD_LIBRARY_PATH $path
 
 	if { [uname sysname] == "Darwin" } {
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Export `module load <module>` as a flat environment file for batch jobs.
+
+The modules and their prereqs (sim_system, clhep, xercesc, ...) are evaluated
+once by module_export.tcl, a minimal modules interpreter, and the resulting
+setenv/prepend-path operations are written as plain sh or csh. Job scripts
+source the file without Environment Modules, Tcl or osrelease.py.
+
+The file carries a sha256 of its content: --check re-exports and tells
+whether a cached file is still current.
+
+    module_export.py geant4/11.4.2 -o geant4-11.4.2.sh
+    module_export.py geant4/11.4.2 --shell csh -o geant4-11.4.2.csh
+    module_export.py geant4/11.4.2 --check geant4-11.4.2.sh || regenerate
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+from typing import List, Optional, Tuple
+
+UTIL_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULES_DIR = os.path.dirname(UTIL_DIR)
+STUB = os.path.join(UTIL_DIR, "module_export.tcl")
+
+HASH_PREFIX = "# sha256: "
+
+
+class ExportError(Exception):
+    pass
+
+
+def resolve(modules: List[str], modulepath: str = MODULES_DIR) -> Tuple[List[Tuple[str, str, str]], List[str]]:
+    """Run the Tcl stub: returns the (op, name, value) operations and the loaded modules."""
+    tclsh = shutil.which("tclsh")
+    if tclsh is None:
+        raise ExportError("tclsh not found")
+    result = subprocess.run([tclsh, STUB, modulepath, *modules], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ExportError(result.stderr.strip() or f"exporting {' '.join(modules)} failed")
+    # modulefile warnings, e.g. a missing install directory
+    sys.stderr.write(result.stderr)
+    fields = result.stdout.split("\0")[:-1]
+    records = [tuple(fields[i:i + 3]) for i in range(0, len(fields), 3)]
+    ops = [r for r in records if r[0] != "loaded"]
+    loaded = [r[2] for r in records if r[0] == "loaded"][0].split()
+    return ops, loaded
+
+
+def sh_quote(value: str) -> str:
+    return "'" + value.replace("'", "'\\''") + "'"
+
+
+def csh_quote(value: str) -> str:
+    return "'" + value.replace("'", "'\\''").replace("!", "\\!") + "'"
+
+
+def render_sh(ops) -> List[str]:
+    lines = []
+    for op, name, value in ops:
+        if op == "setenv":
+            lines.append(f"export {name}={sh_quote(value)}")
+        elif op == "unsetenv":
+            lines.append(f"unset {name}")
+        elif op == "prepend-path":
+            lines.append(f'export {name}={sh_quote(value)}"${{{name}:+:${name}}}"')
+        elif op == "append-path":
+            lines.append(f'export {name}="${{{name}:+${name}:}}"{sh_quote(value)}')
+    return lines
+
+
+def render_csh(ops) -> List[str]:
+    lines = []
+    for op, name, value in ops:
+        if op == "setenv":
+            lines.append(f"setenv {name} {csh_quote(value)}")
+        elif op == "unsetenv":
+            lines.append(f"unsetenv {name}")
+        elif op in ("prepend-path", "append-path"):
+            joined = (f'{csh_quote(value)}:"${{{name}}}"' if op == "prepend-path"
+                      else f'"${{{name}}}":{csh_quote(value)}')
+            lines += [
+                f"if ( $?{name} ) then",
+                f"    setenv {name} {joined}",
+                "else",
+                f"    setenv {name} {csh_quote(value)}",
+                "endif",
+            ]
+    return lines
+
+
+def export(modules: List[str], shell: str = "sh", modulepath: str = MODULES_DIR) -> str:
+    ops, loaded = resolve(modules, modulepath)
+    body = "\n".join(render_csh(ops) if shell == "csh" else render_sh(ops)) + "\n"
+    digest = hashlib.sha256(body.encode()).hexdigest()
+    header = (
+        f"# module load {' '.join(modules)}, exported by module_export.py\n"
+        f"# modules: {' '.join(loaded)}\n"
+        f"{HASH_PREFIX}{digest}\n"
+    )
+    return header + body
+
+
+def file_hash(path: str) -> Optional[str]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith(HASH_PREFIX):
+                return line[len(HASH_PREFIX):].strip()
+    return None
+
+
+def file_hash_of(content: str) -> str:
+    return content.split(HASH_PREFIX, 1)[1].split("\n", 1)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export module loads as a static environment file")
+    parser.add_argument("modules", nargs="+", help="modules to load, e.g. geant4/11.4.2")
+    parser.add_argument("--shell", choices=("sh", "csh"), default="sh", help="output flavor (default: %(default)s)")
+    parser.add_argument("--modulepath", default=MODULES_DIR, help="colon-separated modulefile directories (default: %(default)s)")
+    parser.add_argument("-o", "--output", help="write to this file instead of stdout")
+    parser.add_argument("--check", metavar="FILE", help="exit 0 if FILE is current, 1 if it must be regenerated")
+    args = parser.parse_args()
+
+    try:
+        content = export(args.modules, args.shell, args.modulepath)
+    except ExportError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    if args.check:
+        current = os.path.exists(args.check) and file_hash(args.check) == file_hash_of(content)
+        sys.exit(0 if current else 1)
+
+    if args.output:
+        tmp = f"{args.output}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, args.output)
+    else:
+        sys.stdout.write(content)
+
+
+if __name__ == "__main__":
+    main()
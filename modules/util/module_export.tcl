@@ -0,0 +1,223 @@
+# Minimal Environment Modules interpreter used by module_export.py.
+#
+#   tclsh module_export.tcl MODULEPATH MODULE...
+#
+# Loads the modules (and their prereqs) like `module load` would, each
+# modulefile in its own child interpreter, and prints every environment
+# change as NUL-separated "op name value" records instead of applying it to
+# a shell. Only the modulefile commands used by g4install are supported.
+
+set modulepath [ split [ lindex $argv 0 ] ":" ]
+set loaded {}
+set loading {}
+
+proc emit {op name {value ""}} {
+    puts -nonewline "$op\0$name\0$value\0"
+}
+
+proc fail {msg} {
+    puts stderr "module_export: $msg"
+    exit 1
+}
+
+# the default version of a module directory: .version, else the highest one
+proc default_version {dir} {
+    if { [ file isfile $dir/.version ] } {
+        set version_interp [ interp create -safe ]
+        set f [ open $dir/.version r ]
+        set code [ read $f ]
+        close $f
+        $version_interp eval $code
+        if { [ $version_interp eval { info exists ModulesVersion } ] } {
+            set version [ $version_interp eval { set ModulesVersion } ]
+            interp delete $version_interp
+            return $version
+        }
+        interp delete $version_interp
+    }
+    set versions {}
+    foreach path [ glob -nocomplain -types f -directory $dir * ] {
+        lappend versions [ file tail $path ]
+    }
+    if { [ llength $versions ] == 0 } {
+        return ""
+    }
+    return [ lindex [ lsort -dictionary $versions ] end ]
+}
+
+# module name -> {full name, modulefile}
+proc resolve {name} {
+    global modulepath
+    foreach dir $modulepath {
+        if { [ file isfile $dir/$name ] } {
+            return [ list $name $dir/$name ]
+        }
+        if { [ file isdirectory $dir/$name ] } {
+            set version [ default_version $dir/$name ]
+            if { $version ne "" } {
+                return [ list $name/$version $dir/$name/$version ]
+            }
+        }
+    }
+    fail "unable to locate a modulefile for '$name'"
+}
+
+proc is-loaded {args} {
+    global loaded loading
+    foreach name $args {
+        foreach full [ concat $loaded $loading ] {
+            if { $full eq $name || [ string match $name/* $full ] } {
+                return 1
+            }
+        }
+    }
+    return 0
+}
+
+proc load {name} {
+    global loaded loading
+    if { [ is-loaded $name ] } {
+        return
+    }
+    lassign [ resolve $name ] full file
+    lappend loading $full
+
+    set child [ interp create ]
+    foreach cmd {setenv unsetenv prepend-path append-path getenv is-loaded uname} {
+        interp alias $child $cmd {} $cmd
+    }
+    foreach cmd {prereq conflict module-whatis set-alias} {
+        interp alias $child $cmd {} stub-$cmd
+    }
+    interp alias $child module-info {} module-info $full
+    interp alias $child module {} stub-module
+    $child eval [ list set ModulesCurrentModulefile $file ]
+
+    set code [ catch { $child eval [ list source $file ] } result ]
+    interp delete $child
+    if { $code == 1 } {
+        fail "$full: $result"
+    } elseif { $code == 3 } {
+        fail "$full: load aborted"
+    }
+    lappend loaded $full
+}
+
+proc setenv {name value} {
+    global env
+    set env($name) $value
+    emit setenv $name $value
+}
+
+proc unsetenv {name args} {
+    global env
+    unset -nocomplain env($name)
+    emit unsetenv $name
+}
+
+# prepend-path/append-path ?-d sep? VAR VALUE...
+proc path_args {argv} {
+    set separator ":"
+    if { [ lindex $argv 0 ] in {-d --delim} } {
+        set separator [ lindex $argv 1 ]
+        set argv [ lrange $argv 2 end ]
+    }
+    set name [ lindex $argv 0 ]
+    set values {}
+    foreach value [ lrange $argv 1 end ] {
+        foreach element [ split $value $separator ] {
+            if { $element ne "" } {
+                lappend values $element
+            }
+        }
+    }
+    return [ list $separator $name [ join $values $separator ] ]
+}
+
+proc prepend-path {args} {
+    global env
+    lassign [ path_args $args ] separator name value
+    if { $value eq "" } {
+        return
+    }
+    if { [ info exists env($name) ] && $env($name) ne "" } {
+        set env($name) $value$separator$env($name)
+    } else {
+        set env($name) $value
+    }
+    emit prepend-path $name $value
+}
+
+proc append-path {args} {
+    global env
+    lassign [ path_args $args ] separator name value
+    if { $value eq "" } {
+        return
+    }
+    if { [ info exists env($name) ] && $env($name) ne "" } {
+        set env($name) $env($name)$separator$value
+    } else {
+        set env($name) $value
+    }
+    emit append-path $name $value
+}
+
+proc getenv {name {default ""}} {
+    global env
+    if { [ info exists env($name) ] } {
+        return $env($name)
+    }
+    return $default
+}
+
+proc uname {what} {
+    global tcl_platform
+    switch -- $what {
+        sysname { return $tcl_platform(os) }
+        machine { return $tcl_platform(machine) }
+        release { return $tcl_platform(osVersion) }
+        nodename { return [ info hostname ] }
+        default { fail "unsupported: uname $what" }
+    }
+}
+
+proc module-info {full what args} {
+    switch -- $what {
+        name { return $full }
+        version { return [ lindex $args 0 ] }
+        mode {
+            if { [ llength $args ] == 0 } {
+                return load
+            }
+            return [ expr { [ lindex $args 0 ] eq "load" } ]
+        }
+        shell { return sh }
+        default { fail "unsupported: module-info $what" }
+    }
+}
+
+proc stub-prereq {args} {
+    foreach name $args {
+        load $name
+    }
+}
+
+proc stub-module {subcommand args} {
+    switch -- $subcommand {
+        load - add {
+            foreach name $args {
+                load $name
+            }
+        }
+        default { fail "unsupported: module $subcommand" }
+    }
+}
+
+proc stub-conflict {args} {}
+proc stub-module-whatis {args} {}
+proc stub-set-alias {args} {}
+
+foreach name [ lrange $argv 1 end ] {
+    load $name
+}
+emit loaded "" [ join $loaded " " ]
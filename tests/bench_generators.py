@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Micro-benchmarks of the CI generators' render time.
+#
+# Usage:
+#   python3 tests/bench_generators.py                       # print timings
+#   python3 tests/bench_generators.py --save base.json      # record a baseline
+#   python3 tests/bench_generators.py --compare base.json   # speedup vs baseline
+#
+# Pair it with tests/test_golden.py: the golden tests prove a refactor renders
+# byte-identical output, this script measures how much faster it got.
+import argparse
+import json
+import timeit
+
+import matrix
+
+from additional_libraries import install_meson, install_novnc, install_root_from_source
+from dockerfile_creator import copy_setup_file, docker_header, install_jlab_ca, additional_preamble
+from functions import curl_command
+
+
+def benchmarks() -> dict:
+	"""name -> zero-argument callable rendering every cell of the matrix once."""
+	cells = matrix.matrix_cells()
+	pairs = matrix.os_pairs()
+	return {
+		"create_dockerfile":            lambda: [matrix.render_dockerfile(c) for c in cells],
+		"install_additional_libraries": lambda: [matrix.render_additional_libraries(c) for c in cells],
+		"packages_install_command":     lambda: [matrix.render_packages(i, t) for i, t in pairs],
+		"binary_packages_install":      lambda: [matrix.render_binary_packages(i, t) for i, t in pairs],
+		"docker_header":                lambda: [docker_header(c.config) for c in cells],
+		"copy_setup_file":              lambda: [copy_setup_file(c.config) for c in cells],
+		"install_jlab_ca":              lambda: [install_jlab_ca(c.config) for c in cells],
+		"additional_preamble":          lambda: [additional_preamble(c.config) for c in cells],
+		"install_root_from_source":     lambda: [install_root_from_source(c.config, c.root_version) for c in cells],
+		"install_meson":                lambda: [install_meson(c.config, c.meson_version) for c in cells],
+		"install_novnc":                lambda: [install_novnc(c.config, c.novnc_version) for c in cells],
+		"curl_command":                 lambda: [curl_command(u) for u in ("https://github.com/x.tgz", "https://www.jlab.org/x.tgz")],
+	}
+
+
+def run(number: int, repeat: int, only: list[str]) -> dict:
+	"""Best-of-`repeat` time per call, in microseconds."""
+	results = {}
+	for name, fn in benchmarks().items():
+		if only and name not in only:
+			continue
+		best = min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+		results[name] = best * 1e6
+	return results
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark the CI generators' render time")
+	parser.add_argument("-n", "--number", type=int, default=50, help="calls per measurement (default: %(default)s)")
+	parser.add_argument("-r", "--repeat", type=int, default=5, help="measurements, best is kept (default: %(default)s)")
+	parser.add_argument("--save", metavar="JSON", help="write the timings to JSON")
+	parser.add_argument("--compare", metavar="JSON", help="compare against timings saved with --save")
+	parser.add_argument("only", nargs="*", help="benchmark names to run (default: all)")
+	args = parser.parse_args()
+
+	results = run(args.number, args.repeat, args.only)
+
+	baseline = {}
+	if args.compare:
+		with open(args.compare, encoding="utf-8") as f:
+			baseline = json.load(f)
+
+	for name, usec in results.items():
+		line = f"{name:30s} {usec:12.1f} us"
+		if name in baseline:
+			line += f"   baseline {baseline[name]:12.1f} us   speedup x{baseline[name] / usec:.2f}"
+		print(line)
+
+	if args.save:
+		with open(args.save, "w", encoding="utf-8") as f:
+			json.dump(results, f, indent=2, sort_keys=True)
+			f.write("\n")
+
+
+if __name__ == "__main__":
+	main()
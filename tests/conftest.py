@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The generators import each other as top-level modules (`from functions import ...`),
+# exactly as they do when run as `python3 ci/dockerfile_creator.py`.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "ci"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
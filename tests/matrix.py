@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# Matrix cells and renderers shared by the golden tests and the benchmarks.
+#
+# The matrix is read from ci/env.sh (the same single source of truth used by
+# ci/distros_tags.sh), so adding an OS, a Geant4 tag or an architecture there
+# automatically adds golden cells here.
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CI_DIR = os.path.join(REPO_ROOT, "ci")
+GOLDEN_DIR = os.path.join(REPO_ROOT, "tests", "golden")
+
+if CI_DIR not in sys.path:
+	sys.path.insert(0, CI_DIR)
+
+import additional_libraries
+import binary_packages
+import dockerfile_creator
+import packages
+from functions import RenderConfig, render_config
+
+
+@dataclass(frozen=True)
+class Cell:
+	image: str
+	tag: str
+	geant4_version: str
+	root_version: str
+	meson_version: str
+	novnc_version: str
+	arch: str
+
+	@property
+	def name(self) -> str:
+		return f"{self.geant4_version}-{self.image}-{self.tag}-{self.arch}"
+
+	@property
+	def config(self) -> RenderConfig:
+		return render_config(self.image, self.tag)
+
+
+def read_env_sh() -> dict:
+	"""Source ci/env.sh in bash and return the matrix definition it exports."""
+	script = (
+		'source ci/env.sh; '
+		'echo "g4=$(get_geant4_tags)"; '
+		'echo "arch=$(get_cpu_architectures)"; '
+		'echo "os=${OS_VERSIONS[*]}"; '
+		'for v in $(get_geant4_tags); do '
+		'echo "versions.$v=$(get_root_tag $v) $(get_meson_tag $v) $(get_novnc_tag $v)"; '
+		'done'
+	)
+	out = subprocess.check_output(["bash", "-c", script], cwd=REPO_ROOT, text=True)
+	env = {}
+	for line in out.splitlines():
+		key, _, value = line.partition("=")
+		env[key] = value
+	return env
+
+
+def matrix_cells() -> list[Cell]:
+	"""Every image x Geant4 x arch cell built by ci/distros_tags.sh."""
+	env = read_env_sh()
+	cells = []
+	for g4 in env["g4"].split():
+		root, meson, novnc = env[f"versions.{g4}"].split()
+		for arch in env["arch"].split():
+			for pair in env["os"].split():
+				image, tag = pair.split("=", 1)
+				# archlinux is amd64-only
+				if image == "archlinux" and arch == "arm64":
+					continue
+				cells.append(Cell(image, tag, g4, root, meson, novnc, arch))
+	return cells
+
+
+def os_pairs() -> list[tuple[str, str]]:
+	"""The (image, tag) pairs of ci/env.sh, in order."""
+	return [tuple(pair.split("=", 1)) for pair in read_env_sh()["os"].split()]
+
+
+def render_dockerfile(cell: Cell) -> str:
+	return dockerfile_creator.create_dockerfile(
+		cell.config,
+		cell.geant4_version,
+		cell.root_version,
+		cell.meson_version,
+		cell.novnc_version,
+		True,
+		cell.arch,
+	)
+
+
+def render_data_image(geant4_version: str) -> str:
+	return dockerfile_creator.data_image_dockerfile(geant4_version)
+
+
+def render_packages(image: str, tag: str) -> str:
+	return packages.packages_install_command(render_config(image, tag))
+
+
+def render_binary_packages(image: str, tag: str) -> str:
+	return binary_packages.packages_install_command(image, tag)
+
+
+def render_additional_libraries(cell: Cell) -> str:
+	return additional_libraries.install_additional_libraries(
+		cell.config,
+		cell.geant4_version,
+		cell.root_version,
+		cell.meson_version,
+		cell.novnc_version,
+	)
+
+
+def golden_files() -> dict[str, str]:
+	"""Map of golden file path (relative to GOLDEN_DIR) to its rendered content."""
+	files = {}
+	for cell in matrix_cells():
+		files[f"dockerfiles/{cell.name}.Dockerfile"] = render_dockerfile(cell)
+	for geant4_version in sorted({cell.geant4_version for cell in matrix_cells()}):
+		files[f"dockerfiles/data-{geant4_version}.Dockerfile"] = render_data_image(geant4_version)
+	for image, tag in os_pairs():
+		files[f"packages/{image}-{tag}.txt"] = render_packages(image, tag)
+		files[f"binary_packages/{image}-{tag}.txt"] = render_binary_packages(image, tag)
+	files["binary_packages/macos.txt"] = render_binary_packages("macos", "")
+	return files
+
+
+def write_golden_files() -> None:
+	for rel, content in golden_files().items():
+		path = os.path.join(GOLDEN_DIR, rel)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		with open(path, "w", encoding="utf-8") as f:
+			f.write(content)
+		print(path)
+
+
+if __name__ == "__main__":
+	# Regenerate the golden files after an *intended* output change:
+	#   python3 tests/matrix.py
+	write_golden_files()
@@ -0,0 +1,8 @@
+# Smoke test: every benchmark renders without error.
+import bench_generators
+
+
+def test_benchmarks_run():
+	results = bench_generators.run(number=1, repeat=1, only=[])
+	assert set(results) == set(bench_generators.benchmarks())
+	assert all(t > 0 for t in results.values())
@@ -0,0 +1,169 @@
+# ci/build_report.py: layer, step time, component and tarball metrics of a
+# matrix cell, and the regression check between records.
+import csv
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import build_report
+from matrix import CI_DIR
+
+SCRIPT = os.path.join(CI_DIR, "build_report.py")
+CELL = "11.4.2-ubuntu-24.04-amd64"
+
+DOCKERFILE = """FROM ubuntu:24.04
+LABEL maintainer="someone"
+
+# System packages
+ENV TZ=UTC
+RUN apt-get update && \\
+    apt-get install -y git
+
+# Install Geant4 11.4.2
+RUN cd /opt && make install
+
+FROM scratch AS other
+COPY --from=0 /opt /opt
+"""
+
+HISTORY = [
+	(2_500_000_000, "2.5GB", "RUN /bin/bash -lc cd /opt && make install # buildkit"),
+	(412_000_000, "412MB", "RUN |1 G4_DISTCC_HOSTS= /bin/sh -c apt-get update &&     apt-get install -y git # buildkit"),
+	(0, "0B", "ENV TZ=UTC"),
+	(0, "0B", "LABEL maintainer=someone"),
+	(78_100_000, "78.1MB", "/bin/sh -c #(nop) ADD file:abc in /"),
+]
+
+
+def history_table() -> list:
+	"""The default `docker history` table, CREATED BY truncated to 45 columns."""
+	lines = ["IMAGE          CREATED        CREATED BY" + " " * 38 + "SIZE      COMMENT"]
+	for _, size, created in HISTORY:
+		if len(created) > 45:
+			created = created[:44] + "…"
+		lines.append(f"<missing>      2 hours ago    {created:<48}{size:<10}buildkit.dockerfile.v0")
+	return lines
+
+
+@pytest.fixture
+def steps():
+	return build_report.dockerfile_steps(DOCKERFILE)
+
+
+def test_dockerfile_steps(steps):
+	assert [label for label, _ in steps] == [
+		'LABEL maintainer="someone"', "System packages", "System packages", "Install Geant4 11.4.2"]
+	assert steps[2][1] == "RUNapt-getupdate&&apt-getinstall-ygit"
+
+
+def test_rendered_cell_labels():
+	cell = build_report.find_cell(CELL)
+	labels = {label for label, _ in build_report.dockerfile_steps(build_report.render_dockerfile(cell))}
+	assert {"System packages", "Install Geant4 11.4.2", "ROOT installation from source"} <= labels
+	with pytest.raises(build_report.ReportError, match="unknown matrix cell"):
+		build_report.find_cell("11.4.2-plan9-4-amd64")
+
+
+def test_layer_sizes(steps):
+	formatted = [f"{size}\t{created}\n" for _, size, created in HISTORY]
+	for lines in (formatted, history_table()):
+		layers = build_report.parse_docker_history(lines)
+		assert [size for size, _ in layers] == [size for size, _, _ in HISTORY]
+		assert build_report.layer_sizes(layers, steps) == {
+			"(base image)": 78_100_000, 'LABEL maintainer="someone"': 0, "System packages": 412_000_000,
+			"Install Geant4 11.4.2": 2_500_000_000}
+	with pytest.raises(build_report.ReportError):
+		build_report.parse_size("lots")
+
+
+def test_parse_build_log(steps):
+	log = """#1 [internal] load build definition from Dockerfile
+#1 DONE 0.0s
+#5 [final 2/4] RUN apt-get update &&     apt-get install -y git
+#5 12.40 Reading package lists...
+#5 DONE 61.2s
+#6 [other 1/1] COPY --from=0 /opt /opt
+#6 DONE 3.0s
+#7 [final 4/4] RUN cd /opt && make install
+#7 CACHED
+#8 [final 3/4] ENV TZ=UTC
+#8 DONE 0.1s
+"""
+	assert build_report.parse_build_log(log.splitlines(), steps) == {"System packages": 61.3}
+
+
+def test_parse_install_log():
+	log = [" > timing: geant4 clone 40s\n", "noise\n", " > timing: geant4 build 1800s\n",
+	       " > timing: geant4 build 200s\n"]
+	assert build_report.parse_install_log(log) == {"geant4/clone": 40.0, "geant4/build": 2000.0}
+
+
+def test_component_sizes(tmp_path):
+	(tmp_path / "lib").mkdir()
+	(tmp_path / "lib" / "libG4run.so").write_bytes(b"x" * 100)
+	os.link(tmp_path / "lib" / "libG4run.so", tmp_path / "lib" / "libG4run.so.11")
+	(tmp_path / "share" / "Geant4").mkdir(parents=True)
+	(tmp_path / "share" / "Geant4" / "data.txt").write_bytes(b"y" * 30)
+	(tmp_path / "geant4.env").write_bytes(b"z" * 5)
+	assert build_report.component_sizes(str(tmp_path)) == {"lib": 100, "share": 30, "(files)": 5}
+	manifest = {"files": {"lib/libG4run.so": {"size": 100}, "geant4.env": {"size": 5}}}
+	assert build_report.manifest_component_sizes(manifest) == {"lib": 100, "(files)": 5}
+
+
+def test_regressions():
+	previous = {"metrics": {"layer/a": 100_000_000, "layer/b": 1_000, "step_time/a": 20.0, "phase/g/build": 600}}
+	current = {"metrics": {"layer/a": 120_000_000, "layer/b": 5_000, "step_time/a": 28.0, "phase/g/build": 700,
+	                       "layer/new": 1}}
+	found = build_report.regressions(previous, current)
+	# b grew 5x but by less than 1 MB, the step by 40% but by less than 10 s
+	assert [item["metric"] for item in found] == ["layer/a", "phase/g/build"]
+	assert found[0]["change"] == 20.0
+	assert build_report.regressions(previous, current, threshold=25.0) == []
+
+
+def run(*args):
+	return subprocess.run([sys.executable, SCRIPT, *args], capture_output=True, text=True)
+
+
+def test_add_cli(tmp_path):
+	history, table = tmp_path / "report.json", tmp_path / "report.csv"
+	for name in ("g4-11.4.2-ubuntu-24.04-x86_64.tar.gz", "g4-11.4.2-ubuntu-24.04-x86_64-debug.tar.gz"):
+		(tmp_path / name).write_bytes(b"0" * 2000)
+	(tmp_path / "install.log").write_text(" > timing: geant4 build 1000s\n")
+	common = ["add", CELL, "--history-file", str(history), "--csv", str(table),
+	          "--install-log", str(tmp_path / "install.log"),
+	          "--tarball", str(tmp_path / "g4-11.4.2-ubuntu-24.04-x86_64.tar.gz"),
+	          "--tarball", str(tmp_path / "g4-11.4.2-ubuntu-24.04-x86_64-debug.tar.gz")]
+	result = run(*common, "--commit", "aaa")
+	assert result.returncode == 0, result.stderr
+	assert "3 metrics added" in result.stdout
+
+	(tmp_path / "install.log").write_text(" > timing: geant4 build 1300s\n")
+	result = run(*common, "--commit", "bbb")
+	assert result.returncode == 1
+	assert "REGRESSION phase/geant4/build: 1000 s -> 1300 s (+30.0%)" in result.stdout
+
+	records = json.loads(history.read_text())["records"]
+	assert [record["commit"] for record in records] == ["aaa", "bbb"]
+	assert records[0]["metrics"] == {"phase/geant4/build": 1000.0, "tarball/runtime": 2000, "tarball/debug": 2000}
+	rows = list(csv.DictReader(table.open()))
+	assert len(rows) == 6
+	assert rows[0]["cell"] == CELL and rows[0]["arch"] == "amd64"
+
+	result = run("show", str(history))
+	assert "bbb" in result.stdout and "1300 s" in result.stdout
+	result = run("add", CELL, "--history-file", str(history))
+	assert result.returncode == 1
+	assert "nothing to report" in result.stderr
+
+
+def test_cells():
+	result = run("cells")
+	assert result.returncode == 0
+	cells = result.stdout.split()
+	assert CELL in cells
+	assert "11.4.2-archlinux-latest-amd64" in cells
+	assert "11.4.2-archlinux-latest-arm64" not in cells
@@ -0,0 +1,87 @@
+# ci/cpu_limits.sh against fake cgroup v1 and v2 trees (G4_CGROUP_ROOT).
+import os
+import subprocess
+
+import pytest
+
+from matrix import CI_DIR
+
+SCRIPT = os.path.join(CI_DIR, "cpu_limits.sh")
+VARIABLES = ["G4_CPU_LIMIT", "G4FORCENUMBEROFTHREADS", "PTL_NUM_THREADS", "OMP_NUM_THREADS"]
+
+
+def cgroup(root, files):
+	for name, content in files.items():
+		path = root / name
+		path.parent.mkdir(parents=True, exist_ok=True)
+		path.write_text(content + "\n")
+	return root
+
+
+def sourced(root, nproc=64, **env):
+	"""The variables after sourcing the script, as bash does from geant4.env."""
+	script = f'. "{SCRIPT}"; ' + "; ".join(f'echo "${{{v}:-}}"' for v in VARIABLES)
+	full_env = {"PATH": "/usr/bin:/bin", "G4_CGROUP_ROOT": str(root), "G4_CGROUP_NPROC": str(nproc), **env}
+	out = subprocess.run(["bash", "-c", script], env=full_env, capture_output=True, text=True, check=True).stdout
+	return dict(zip(VARIABLES, out.splitlines()))
+
+
+V2 = {"cgroup.controllers": "cpuset cpu memory", "cpu.max": "max 100000",
+      "cpuset.cpus.effective": "0-63", "memory.max": "max"}
+
+
+@pytest.mark.parametrize("files, expected", [
+	# no limit: the applications choose their thread count
+	({}, ""),
+	({"cpu.max": "250000 100000"}, "2"),
+	({"cpu.max": "50000 100000"}, "1"),
+	({"cpuset.cpus.effective": "0-3,8,10-11"}, "7"),
+	# (4096 - 600) / 400 MB
+	({"memory.max": str(4096 * 1048576)}, "8"),
+])
+def test_cgroup_v2(tmp_path, files, expected):
+	root = cgroup(tmp_path, dict(V2, **files))
+	env = sourced(root)
+	assert env["G4FORCENUMBEROFTHREADS"] == env["PTL_NUM_THREADS"] == env["OMP_NUM_THREADS"] == expected
+	assert env["G4_CPU_LIMIT"] == (expected or "64")
+
+
+def test_cgroup_v1(tmp_path):
+	root = cgroup(tmp_path, {
+		"cpu,cpuacct/cpu.cfs_quota_us": "400000",
+		"cpu,cpuacct/cpu.cfs_period_us": "100000",
+		"cpuset/cpuset.cpus": "0-5",
+		"memory/memory.limit_in_bytes": "9223372036854771712",
+	})
+	assert sourced(root) == dict.fromkeys(VARIABLES, "4")
+	unlimited = cgroup(tmp_path / "unlimited", {"cpu,cpuacct/cpu.cfs_quota_us": "-1",
+	                                            "cpu,cpuacct/cpu.cfs_period_us": "100000"})
+	assert sourced(unlimited, nproc=12) == dict(dict.fromkeys(VARIABLES, ""), G4_CPU_LIMIT="12")
+
+
+def test_overrides(tmp_path):
+	root = cgroup(tmp_path, dict(V2, **{"cpu.max": "200000 100000"}))
+	env = sourced(root, G4FORCENUMBEROFTHREADS="16")
+	assert env["G4FORCENUMBEROFTHREADS"] == "16"
+	assert env["OMP_NUM_THREADS"] == "2"
+	assert sourced(root, G4_THREADS="3")["PTL_NUM_THREADS"] == "3"
+	assert sourced(cgroup(tmp_path / "none", V2), G4_THREADS="3")["G4FORCENUMBEROFTHREADS"] == "3"
+	assert sourced(root, G4_CPU_AUTOTUNE="0") == dict.fromkeys(VARIABLES, "")
+
+
+def test_explain(tmp_path):
+	root = cgroup(tmp_path, dict(V2, **{"cpu.max": "300000 100000", "cpuset.cpus.effective": "0-1"}))
+	env = {"PATH": "/usr/bin:/bin", "G4_CGROUP_ROOT": str(root), "G4_CGROUP_NPROC": "64", "OMP_NUM_THREADS": "9"}
+	out = subprocess.run([SCRIPT, "--explain"], env=env, capture_output=True, text=True, check=True).stdout
+	assert "cgroup v2" in out
+	assert "CPU quota: 300000/100000 us = 300% of a CPU -> 3 threads" in out
+	assert "=> 2 threads (bound by cpuset)" in out
+	assert "OMP_NUM_THREADS=9 (already set, kept)" in out
+	exports = subprocess.run([SCRIPT], env=env, capture_output=True, text=True, check=True).stdout
+	assert "export G4FORCENUMBEROFTHREADS=2" in exports.splitlines()
+
+	env["G4_CGROUP_ROOT"] = str(cgroup(tmp_path / "none", V2))
+	out = subprocess.run([SCRIPT, "--explain"], env=env, capture_output=True, text=True, check=True).stdout
+	assert "G4FORCENUMBEROFTHREADS not set (no limit below nproc)" in out
+	exports = subprocess.run([SCRIPT], env=env, capture_output=True, text=True, check=True).stdout
+	assert exports.splitlines() == ["export G4_CPU_LIMIT=64", "export OMP_NUM_THREADS=9"]
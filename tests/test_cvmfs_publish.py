@@ -0,0 +1,84 @@
+# ci/cvmfs_publish.py: catalog placement, strace prefetch lists and dataset packs.
+import json
+import os
+import tarfile
+
+import cvmfs_publish
+
+
+def touch(path, content=""):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(path, "w", encoding="utf-8") as f:
+		f.write(content)
+
+
+def fake_tree(root, headers=30):
+	"""SIM_HOME/<osrelease> with a geant4 prefix, two datasets and a small clhep."""
+	for i in range(headers):
+		touch(f"{root}/geant4/11.4.2/include/Geant4/G4Header{i}.hh")
+	touch(f"{root}/geant4/11.4.2/lib/libG4run.so")
+	for i in range(12):
+		touch(f"{root}/geant4/11.4.2/share/Geant4/data/G4EMLOW8.8/f{i}")
+	for i in range(3):
+		touch(f"{root}/geant4/11.4.2/share/Geant4/data/G4ENSDFSTATE3.0/f{i}")
+	touch(f"{root}/clhep/2.4.7.2/lib/libCLHEP.so")
+
+
+def test_plan_catalogs(tmp_path):
+	root = str(tmp_path / "sim")
+	fake_tree(root)
+	catalogs = cvmfs_publish.plan_catalogs(root, threshold=25, min_entries=10)
+	rel = [os.path.relpath(c, root) for c in catalogs]
+	# the large dataset and the geant4 prefix are boundaries; the headers pass the threshold;
+	# clhep and the small dataset are too small to be worth a catalog
+	assert rel == ["geant4/11.4.2", "geant4/11.4.2/include/Geant4", "geant4/11.4.2/share/Geant4/data/G4EMLOW8.8"]
+
+
+def test_write_catalogs_clean(tmp_path):
+	root = str(tmp_path / "sim")
+	fake_tree(root)
+	touch(f"{root}/clhep/2.4.7.2/.cvmfscatalog")
+	catalogs = cvmfs_publish.plan_catalogs(root, threshold=25, min_entries=10)
+	cvmfs_publish.write_catalogs(root, catalogs, clean=True)
+	assert os.path.exists(f"{root}/geant4/11.4.2/.cvmfscatalog")
+	assert not os.path.exists(f"{root}/clhep/2.4.7.2/.cvmfscatalog")
+	# the markers themselves do not move the boundaries
+	assert cvmfs_publish.plan_catalogs(root, threshold=25, min_entries=10) == catalogs
+
+
+def test_parse_strace(tmp_path):
+	root = str(tmp_path / "sim")
+	fake_tree(root)
+	lib = f"{root}/geant4/11.4.2/lib/libG4run.so"
+	data = f"{root}/geant4/11.4.2/share/Geant4/data/G4EMLOW8.8/f0"
+	log = [
+		f'12 execve("{root}/geant4/11.4.2/bin", ["exampleB1"], 0x7ffc /* 30 vars */) = -1 ENOENT (No such file or directory)',
+		f'12 openat(AT_FDCWD, "{lib}", O_RDONLY|O_CLOEXEC) = 3',
+		f'13 newfstatat(AT_FDCWD, "{data}", {{st_mode=S_IFREG|0644, st_size=0, ...}}, 0) = 0',
+		f'13 openat(AT_FDCWD, "{root}/geant4/11.4.2/lib/libmissing.so", O_RDONLY|O_CLOEXEC) = -1 ENOENT (No such file or directory)',
+		'13 openat(AT_FDCWD, "/etc/ld.so.cache", O_RDONLY|O_CLOEXEC) = 3',
+		f'[pid    14] open("{lib}", O_RDONLY) = 4',
+		f'12 openat(AT_FDCWD, "{root}/geant4/11.4.2/lib", O_RDONLY|O_DIRECTORY) = 5',
+	]
+	assert cvmfs_publish.parse_strace(log, root) == [lib, data]
+
+
+def test_pack_data_is_reproducible(tmp_path):
+	root = str(tmp_path / "sim")
+	fake_tree(root)
+	index = cvmfs_publish.pack_data(root, str(tmp_path / "packs"))
+	assert sorted(index) == ["G4EMLOW8.8", "G4ENSDFSTATE3.0"]
+	with tarfile.open(tmp_path / "packs" / "G4ENSDFSTATE3.0.tar") as tar:
+		assert tar.getnames() == ["G4ENSDFSTATE3.0", "G4ENSDFSTATE3.0/f0", "G4ENSDFSTATE3.0/f1", "G4ENSDFSTATE3.0/f2"]
+		assert {m.uid for m in tar.getmembers()} == {0}
+	with open(tmp_path / "packs" / "index.json", encoding="utf-8") as f:
+		assert json.load(f) == index
+
+	again = cvmfs_publish.pack_data(root, str(tmp_path / "packs2"))
+	assert again == index
+
+
+def test_warm(tmp_path):
+	touch(str(tmp_path / "a"), "abc")
+	touch(str(tmp_path / "b"), "de")
+	assert cvmfs_publish.warm([str(tmp_path / "a"), str(tmp_path / "b"), str(tmp_path / "gone")], jobs=2) == 5
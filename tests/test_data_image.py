@@ -0,0 +1,106 @@
+# The Geant4 data-only image: ci/geant4_data_fetch.sh against a local dataset
+# mirror, and the application images built with --data-image.
+import hashlib
+import os
+import subprocess
+import tarfile
+
+import pytest
+
+import dockerfile_creator
+from matrix import CI_DIR, matrix_cells
+
+SCRIPT = os.path.join(CI_DIR, "geant4_data_fetch.sh")
+DATA_IMAGE = "ghcr.io/gemc/g4install-data:11.4.2"
+
+DEFINITIONS = """# Geant4 datasets
+geant4_add_dataset(
+  NAME      G4NDL
+  VERSION   4.7.1
+  FILENAME  G4NDL
+  EXTENSION tar.gz
+  ENVVAR    G4NEUTRONHPDATA
+  MD5SUM    {G4NDL}
+  )
+
+geant4_add_dataset(
+  NAME      PhotonEvaporation
+  VERSION   6.1
+  FILENAME  G4PhotonEvaporation
+  EXTENSION tar.gz
+  ENVVAR    G4LEVELGAMMADATA
+  MD5SUM    {PhotonEvaporation}
+  )
+"""
+
+
+@pytest.fixture
+def mirror(tmp_path):
+	"""G4DatasetDefinitions.cmake and dataset archives, served by file:// URLs."""
+	mirror = tmp_path / "mirror"
+	mirror.mkdir()
+	sums = {}
+	for name, version, filename in [("G4NDL", "4.7.1", "G4NDL"), ("PhotonEvaporation", "6.1", "G4PhotonEvaporation")]:
+		content = tmp_path / f"{name}{version}"
+		content.mkdir()
+		(content / "README").write_text(f"{name} {version}\n")
+		archive = mirror / f"{filename}.{version}.tar.gz"
+		with tarfile.open(archive, "w:gz") as tar:
+			tar.add(content, arcname=content.name)
+		sums[name] = hashlib.md5(archive.read_bytes()).hexdigest()
+	(mirror / "G4DatasetDefinitions.cmake").write_text(DEFINITIONS.format(**sums))
+	return mirror
+
+
+def fetch(mirror, data_dir, check=True) -> subprocess.CompletedProcess:
+	env = {"PATH": "/usr/bin:/bin",
+	       "GEANT4_DATASETS_DEFINITIONS_URL": f"file://{mirror}/G4DatasetDefinitions.cmake",
+	       "GEANT4_DATA_BASE_URL": f"file://{mirror}"}
+	return subprocess.run([SCRIPT, "11.4.2", str(data_dir)], env=env, capture_output=True, text=True, check=check)
+
+
+def test_fetch(mirror, tmp_path):
+	data_dir = tmp_path / "geant4-data"
+	fetch(mirror, data_dir)
+	assert sorted(os.listdir(data_dir)) == ["G4NDL4.7.1", "PhotonEvaporation6.1"]
+	assert (data_dir / "PhotonEvaporation6.1" / "README").read_text() == "PhotonEvaporation 6.1\n"
+	assert "G4NDL4.7.1: already present" in fetch(mirror, data_dir).stdout
+
+
+def test_fetch_rejects_a_corrupted_archive(mirror, tmp_path):
+	with open(mirror / "G4NDL.4.7.1.tar.gz", "ab") as f:
+		f.write(b"\0")
+	result = fetch(mirror, tmp_path / "geant4-data", check=False)
+	assert result.returncode == 1
+	assert "MD5 mismatch for G4NDL.4.7.1.tar.gz" in result.stderr
+	assert not (tmp_path / "geant4-data" / "G4NDL4.7.1").exists()
+
+
+def render(data_mode: str = "copy", data_image: str = DATA_IMAGE) -> str:
+	cell = matrix_cells()[0]
+	return dockerfile_creator.create_dockerfile(cell.config, cell.geant4_version, cell.root_version,
+	                                            cell.meson_version, cell.novnc_version,
+	                                            data_image=data_image, data_mode=data_mode)
+
+
+def test_application_image_copies_the_data_image():
+	dockerfile = render("copy")
+	data_dir = matrix_cells()[0].config.geant4_data_dir
+	assert f"G4INSTALL_DATADIR={data_dir} install_geant4" in dockerfile
+	copy = f"COPY --from={DATA_IMAGE} /geant4-data {data_dir}\n"
+	assert copy in dockerfile
+	# after the Geant4 install: a new data image does not rebuild Geant4
+	assert dockerfile.index(copy) > dockerfile.index("install_geant4")
+
+
+def test_application_image_mounts_the_data_image():
+	dockerfile = render("mount")
+	assert "G4INSTALL_DATADIR=" in dockerfile
+	assert "COPY --from=" + DATA_IMAGE not in dockerfile
+	assert f"--mount type=image,source={DATA_IMAGE}" in dockerfile
+
+
+def test_default_embeds_the_data():
+	assert "G4INSTALL_DATADIR" not in render(data_image="")
+	with pytest.raises(ValueError, match="invalid data mode 'volume'"):
+		render("volume")
@@ -0,0 +1,117 @@
+# ci/distcc_pool.sh: helper probing, job sizing, local fallback, and a real
+# distributed build with distccd helpers on localhost.
+import os
+import shutil
+import socket
+import subprocess
+import time
+
+import pytest
+
+from matrix import CI_DIR
+
+SCRIPT = os.path.join(CI_DIR, "distcc_pool.sh")
+
+
+def pool(hosts: str, path: str = "/usr/bin:/bin", local_jobs: int = 3, **env) -> dict:
+	"""The variables set by eval-ing the script's output."""
+	variables = ["DISTCC_HOSTS", "CMAKE_CXX_COMPILER_LAUNCHER", "G4_BUILD_JOBS"]
+	script = f'eval "$("{SCRIPT}" {local_jobs})"; ' + "; ".join(f'echo "${{{v}:-}}"' for v in variables)
+	full_env = {"PATH": path, "G4_DISTCC_HOSTS": hosts, "G4_DISTCC_TIMEOUT": "1",
+	            "CMAKE_CXX_COMPILER_LAUNCHER": "ccache", **env}
+	out = subprocess.run(["bash", "-c", script], env=full_env, capture_output=True, text=True, check=True).stdout
+	return dict(zip(variables, out.splitlines()))
+
+
+@pytest.fixture
+def listener():
+	"""A port on localhost accepting connections, standing in for distccd."""
+	with socket.socket() as sock:
+		sock.bind(("127.0.0.1", 0))
+		sock.listen()
+		yield sock.getsockname()[1]
+
+
+@pytest.fixture
+def fake_distcc(tmp_path):
+	(tmp_path / "distcc").write_text("#!/bin/sh\nexec \"$@\"\n")
+	(tmp_path / "distcc").chmod(0o755)
+	return f"{tmp_path}:/usr/bin:/bin"
+
+
+def closed_port() -> int:
+	with socket.socket() as sock:
+		sock.bind(("127.0.0.1", 0))
+		return sock.getsockname()[1]
+
+
+def test_local_without_hosts(fake_distcc):
+	# a launcher of the user is kept, distcc from an earlier eval is not
+	assert pool("", path=fake_distcc) == {"DISTCC_HOSTS": "", "CMAKE_CXX_COMPILER_LAUNCHER": "ccache",
+	                                      "G4_BUILD_JOBS": "3"}
+	assert pool("", path=fake_distcc, CMAKE_CXX_COMPILER_LAUNCHER="distcc")["CMAKE_CXX_COMPILER_LAUNCHER"] == ""
+
+
+def test_sized_to_reachable_helpers(fake_distcc, listener):
+	hosts = f"127.0.0.1:{listener}/6,lzo 127.0.0.1:{closed_port()}/8 user@node/2"
+	env = pool(hosts, path=fake_distcc)
+	assert env["DISTCC_HOSTS"] == f"127.0.0.1:{listener}/6,lzo user@node/2 localhost/3"
+	assert env["CMAKE_CXX_COMPILER_LAUNCHER"] == "distcc"
+	assert env["G4_BUILD_JOBS"] == "11"
+	assert pool(hosts, path=fake_distcc, G4_DISTCC_JOBS="40")["G4_BUILD_JOBS"] == "40"
+	# default limit and an explicit localhost entry
+	env = pool(f"127.0.0.1:{listener} localhost/1", path=fake_distcc)
+	assert env["DISTCC_HOSTS"] == f"127.0.0.1:{listener} localhost/1"
+	assert env["G4_BUILD_JOBS"] == "7"
+
+
+def test_fallback_when_unreachable(fake_distcc):
+	env = pool(f"127.0.0.1:{closed_port()}/8", path=fake_distcc)
+	assert env == {"DISTCC_HOSTS": "", "CMAKE_CXX_COMPILER_LAUNCHER": "ccache", "G4_BUILD_JOBS": "3"}
+	result = subprocess.run([SCRIPT, "3"], env={"PATH": fake_distcc, "G4_DISTCC_HOSTS": "127.0.0.1:1"},
+	                        capture_output=True, text=True)
+	assert "no helper reachable, compiling locally with 3 jobs" in result.stderr
+
+
+def test_fallback_without_distcc(listener, tmp_path):
+	bin_dir = tmp_path / "bin"
+	bin_dir.mkdir()
+	for tool in ("bash", "nproc", "timeout"):
+		if shutil.which(tool):
+			(bin_dir / tool).symlink_to(shutil.which(tool))
+	env = pool(f"127.0.0.1:{listener}/6", path=str(bin_dir))
+	assert env["G4_BUILD_JOBS"] == "3"
+	assert env["CMAKE_CXX_COMPILER_LAUNCHER"] == "ccache"
+
+
+@pytest.mark.skipif(not all(shutil.which(tool) for tool in ("distcc", "distccd", "cmake", "c++")),
+                    reason="distcc, distccd or cmake not available")
+def test_build_on_localhost_helpers(tmp_path):
+	ports = [closed_port(), closed_port()]
+	helpers = [subprocess.Popen(["distccd", "--daemon", "--no-detach", "--allow", "127.0.0.1",
+	                             "--listen", "127.0.0.1", "--port", str(port), "--log-stderr"],
+	                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+	           for port in ports]
+	try:
+		time.sleep(1)
+		source = tmp_path / "src"
+		source.mkdir()
+		(source / "CMakeLists.txt").write_text(
+			"cmake_minimum_required(VERSION 3.17)\nproject(pool CXX)\n"
+			+ "".join(f"add_library(unit{i} STATIC unit{i}.cc)\n" for i in range(8)))
+		for i in range(8):
+			(source / f"unit{i}.cc").write_text(f"int unit{i}() {{ return {i}; }}\n")
+		hosts = " ".join(f"127.0.0.1:{port}/2" for port in ports)
+		log = tmp_path / "distcc.log"
+		script = (f'eval "$("{SCRIPT}" 1)" && cmake -S "{source}" -B "{tmp_path}/build" >/dev/null '
+		          f'&& cmake --build "{tmp_path}/build" -j "$G4_BUILD_JOBS" && echo "$G4_BUILD_JOBS"')
+		env = dict(os.environ, G4_DISTCC_HOSTS=hosts, DISTCC_LOG=str(log), DISTCC_VERBOSE="1",
+		           DISTCC_SKIP_LOCAL_RETRY="1")
+		result = subprocess.run(["bash", "-c", script], env=env, capture_output=True, text=True)
+		assert result.returncode == 0, result.stderr
+		assert result.stdout.split()[-1] == "5"
+		assert "127.0.0.1" in log.read_text()
+	finally:
+		for helper in helpers:
+			helper.terminate()
+			helper.wait()
@@ -0,0 +1,137 @@
+# ci/env_snapshot.py (create-env-snapshot) and the snapshot fast path of
+# ci/docker-entrypoint.sh.
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+import env_snapshot
+from matrix import CI_DIR
+
+ENTRYPOINT = os.path.join(CI_DIR, "docker-entrypoint.sh")
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+	"""Snapshot of a fake entrypoint that loads a fake module."""
+	modules = tmp_path / "modules"
+	(modules / "geant4").mkdir(parents=True)
+	(modules / "geant4" / "11.4.2").write_text("#%Module\n")
+	init = tmp_path / "init"
+	init.mkdir()
+	for shell in ("sh", "bash", "zsh", "csh"):
+		(init / shell).write_text("")
+	entrypoint = tmp_path / "docker-entrypoint.sh"
+	entrypoint.write_text(
+		f'found={init}/bash\n'
+		f'export MODULEPATH={modules}\n'
+		'export G4INSTALL=/opt/geant4\n'
+		'export PATH="/opt/geant4/bin:$PATH"\n'
+		'export LD_LIBRARY_PATH="/opt/geant4/lib:$LD_LIBRARY_PATH"\n'
+		'export MANPATH="${MANPATH:+$MANPATH:}/opt/geant4/man"\n'
+		"export QUOTED=\"it's \\$HOME!\"\n"
+		'unset SNAPSHOT_REMOVED\n'
+		'module() { :; }\n'
+	)
+	monkeypatch.setenv("SNAPSHOT_REMOVED", "1")
+	monkeypatch.delenv("G4INSTALL", raising=False)
+	monkeypatch.delenv("LD_LIBRARY_PATH", raising=False)
+	monkeypatch.setenv("MANPATH", "/usr/share/man")
+	files = env_snapshot.create_snapshot(str(entrypoint), str(tmp_path / "out"))
+	return tmp_path, files
+
+
+def source_and_print(shell: str, snapshot_file: str, command: str) -> str:
+	return subprocess.check_output([shell, "-c", f". {snapshot_file}; {command}"], text=True,
+	                               env=dict(os.environ, SNAPSHOT_REMOVED="1"))
+
+
+@pytest.mark.parametrize("shell,flavor", [("sh", "sh"), ("bash", "sh"), ("zsh", "zsh")])
+def test_sh_flavors(snapshot, shell, flavor):
+	if shutil.which(shell) is None:
+		pytest.skip(f"{shell} not available")
+	tmp_path, files = snapshot
+	out = source_and_print(shell, files[flavor],
+	                       'echo "$G4INSTALL|$QUOTED|${SNAPSHOT_REMOVED-unset}|${PATH%%:*}"')
+	assert out.strip() == "/opt/geant4|it's $HOME!|unset|/opt/geant4/bin"
+
+
+@pytest.mark.parametrize("shell,flavor", [("sh", "sh"), ("bash", "sh"), ("zsh", "zsh")])
+def test_paths_keep_user_values(snapshot, shell, flavor):
+	if shutil.which(shell) is None:
+		pytest.skip(f"{shell} not available")
+	tmp_path, files = snapshot
+	env = dict(os.environ, PATH="/user/bin:/usr/bin:/bin", LD_LIBRARY_PATH="/user/lib", MANPATH="/user/man")
+	out = subprocess.check_output([shell, "-c", f'. {files[flavor]}; echo "$PATH|$LD_LIBRARY_PATH|$MANPATH"'],
+	                              text=True, env=env)
+	assert out.strip() == "/opt/geant4/bin:/user/bin:/usr/bin:/bin|/opt/geant4/lib:/user/lib|/user/man:/opt/geant4/man"
+	# unset at run time: only the module entries
+	env.pop("LD_LIBRARY_PATH")
+	out = subprocess.check_output([shell, "-c", f'. {files[flavor]}; echo "$LD_LIBRARY_PATH"'], text=True, env=env)
+	assert out.strip() == "/opt/geant4/lib"
+
+
+def test_path_change():
+	assert env_snapshot.path_change("/usr/bin:/bin", "/g4/bin:/usr/bin:/bin:/g4/extra") == (["/g4/bin"], ["/g4/extra"])
+	assert env_snapshot.path_change("", "/g4/lib:") == (["/g4/lib"], [])
+	# the modules moved /bin to the front: only new entries are kept
+	assert env_snapshot.path_change("/usr/bin:/bin", "/g4/bin:/bin:/usr/bin") == (["/g4/bin"], [])
+
+
+def test_csh_flavor(snapshot):
+	csh = shutil.which("tcsh") or shutil.which("csh")
+	if csh is None:
+		pytest.skip("csh not available")
+	tmp_path, files = snapshot
+	env = dict(os.environ, LD_LIBRARY_PATH="/user/lib")
+	out = subprocess.check_output([csh, "-f", "-c", f"source {files['csh']}; printenv G4INSTALL; printenv LD_LIBRARY_PATH"],
+	                              text=True, env=env)
+	assert out.split() == ["/opt/geant4", "/opt/geant4/lib:/user/lib"]
+
+
+def test_module_stand_in_and_sources(snapshot):
+	tmp_path, files = snapshot
+	with open(files["sh"]) as f:
+		content = f.read()
+	assert f". '{tmp_path}/init/bash'" in content and f". '{tmp_path}/init/sh'" in content
+	assert "PWD=" not in content and "SHLVL" not in content
+	with open(files["csh"]) as f:
+		assert f"source {tmp_path}/init/csh" in f.read()
+	with open(files["sources"]) as f:
+		assert f.read().split() == [str(tmp_path / "docker-entrypoint.sh"), str(tmp_path / "modules")]
+
+
+def run_entrypoint(tmp_path, files) -> subprocess.CompletedProcess:
+	env = dict(os.environ, G4_ENV_SNAPSHOT_DIR=os.path.dirname(files["sh"]))
+	return subprocess.run(["bash", ENTRYPOINT, "printenv", "G4INSTALL"], env=env, cwd=tmp_path,
+	                      capture_output=True, text=True)
+
+
+def test_entrypoint_uses_current_snapshot(snapshot):
+	tmp_path, files = snapshot
+	result = run_entrypoint(tmp_path, files)
+	assert result.returncode == 0, result.stderr
+	assert result.stdout.strip() == "/opt/geant4"
+	assert "Testing" not in result.stdout
+
+
+def test_entrypoint_snapshot_keeps_module_and_user_paths(snapshot):
+	tmp_path, files = snapshot
+	env = dict(os.environ, G4_ENV_SNAPSHOT_DIR=os.path.dirname(files["sh"]), LD_LIBRARY_PATH="/user/lib")
+	# a shell started by the entrypoint still has `module`
+	result = subprocess.run(["bash", ENTRYPOINT, "bash", "-c", 'declare -F module; echo "$LD_LIBRARY_PATH"'],
+	                        env=env, cwd=tmp_path, capture_output=True, text=True)
+	assert result.returncode == 0, result.stderr
+	assert result.stdout.split() == ["module", "/opt/geant4/lib:/user/lib"]
+
+
+def test_entrypoint_falls_back_when_modules_changed(snapshot):
+	tmp_path, files = snapshot
+	later = time.time() + 10
+	os.utime(tmp_path / "modules" / "geant4" / "11.4.2", (later, later))
+	result = run_entrypoint(tmp_path, files)
+	# the live path runs: it probes the modules init files
+	assert "Testing" in result.stdout
+	assert "/opt/geant4" not in result.stdout
@@ -0,0 +1,109 @@
+# ci/g4bench.py: timing from the macro markers, against a fake example, and
+# the regression comparison.
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+import g4bench
+
+# stands in for a Geant4 example: runs the /control/shell lines of the macro
+# (the last argument) and sleeps on /run/initialize and /run/beamOn
+FAKE_EXAMPLE = f"""#!{sys.executable}
+import os, sys, time
+for line in open(sys.argv[-1]):
+	if line.startswith("/control/shell "):
+		os.system(line[len("/control/shell "):])
+	elif line.startswith("/run/initialize"):
+		time.sleep(0.2)
+	elif line.startswith("/run/beamOn"):
+		time.sleep(0.3)
+print(os.environ.get("PHYSLIST", ""), os.environ.get("G4FORCENUMBEROFTHREADS", ""))
+"""
+
+
+def fake_example(tmp_path, name):
+	path = tmp_path / name
+	path.write_text(FAKE_EXAMPLE)
+	path.chmod(0o755)
+	return str(path)
+
+
+def test_macro(tmp_path):
+	g4bench.write_macro(str(tmp_path / "m.mac"), "/marks", 4, 800, ["/gun/particle e-"])
+	lines = (tmp_path / "m.mac").read_text().splitlines()
+	assert lines.index("/run/numberOfThreads 4") < lines.index("/run/initialize") < \
+	       lines.index("/control/shell touch /marks/initialized") < lines.index("/run/beamOn 800")
+	assert "/random/setSeeds 12345 67890" in lines
+	assert lines[-1] == "/control/shell touch /marks/finished"
+
+
+def test_run_workload_timings(tmp_path, monkeypatch):
+	monkeypatch.setenv("G4FORCENUMBEROFTHREADS", "64")
+	binary = fake_example(tmp_path, "Hadr01")
+	result = g4bench.run_workload("hadr01-hp", 2, 600, binary, str(tmp_path))
+	assert result["returncode"] == 0
+	assert result["workload"] == "hadr01-hp" and result["threads"] == 2 and result["events"] == 600
+	assert 0.15 < result["init_s"] < 2
+	assert 0.25 < result["event_loop_s"] < 2
+	assert result["events_per_s"] == round(600 / result["event_loop_s"], 2)
+	assert result["peak_rss_kb"] > 0
+	# the run directory is removed on success
+	assert os.listdir(tmp_path) == ["Hadr01"]
+
+
+def test_failed_run_keeps_log(tmp_path):
+	binary = tmp_path / "exampleB4a"
+	binary.write_text("#!/bin/sh\necho 'G4Exception: missing data' \nexit 3\n")
+	binary.chmod(0o755)
+	result = g4bench.run_workload("b4a-em", 1, 10, str(binary), str(tmp_path))
+	assert result["returncode"] == 3
+	assert "events_per_s" not in result
+	with open(result["log"], encoding="utf-8") as f:
+		assert "missing data" in f.read()
+
+
+def test_default_threads():
+	threads = g4bench.default_threads()
+	assert threads[0] == 1
+	assert threads == sorted(set(threads))
+
+
+def report(rates):
+	return {"osrelease": "x", "geant4_version": "11.4.2", "variant": "generic",
+	        "results": [{"workload": w, "threads": t, "events_per_s": r} for (w, t), r in rates.items()]}
+
+
+def test_compare():
+	baseline = report({("b4a-em", 1): 100.0, ("b4a-em", 4): 400.0, ("hadr01-hp", 1): 50.0})
+	current = report({("b4a-em", 1): 97.0, ("b4a-em", 4): 360.0, ("hadr01-hp", 2): 90.0})
+	rows = g4bench.compare(baseline, current, threshold=5)
+	assert [(r["workload"], r["threads"], r["change_percent"], r["regression"]) for r in rows] == [
+		("b4a-em", 1, -3.0, False),
+		("b4a-em", 4, -10.0, True),
+	]
+
+
+def test_backend_sets_run_manager_type(tmp_path, monkeypatch):
+	monkeypatch.setenv("G4RUN_MANAGER_TYPE", "Tasking")
+	binary = fake_example(tmp_path, "exampleB4a")
+	assert g4bench.run_workload("b4a-em", 1, 10, binary, str(tmp_path))["backend"] == "Tasking"
+	assert g4bench.run_workload("b4a-em", 1, 10, binary, str(tmp_path), backend="TBB")["backend"] == "TBB"
+
+
+def test_compare_backends():
+	results = [{"workload": "b4a-em", "threads": t, "backend": b, "events_per_s": r}
+	           for (b, t), r in {("MT", 1): 100.0, ("MT", 8): 640.0, ("TBB", 1): 95.0, ("TBB", 8): 720.0}.items()]
+	rows = {(r["backend"], r["threads"]): r for r in g4bench.compare_backends({"results": results})}
+	assert rows[("TBB", 8)]["speedup"] == 1.125
+	assert rows[("MT", 8)]["efficiency"] == 0.8
+	assert rows[("TBB", 1)]["speedup"] == 0.95
+
+
+def test_navigation_gdml(tmp_path):
+	g4bench.write_navigation_gdml(str(tmp_path / "nav.gdml"), columns=6)
+	root = ET.parse(tmp_path / "nav.gdml").getroot()
+	placements = [p.find("volumeref").get("ref") for p in root.iter("physvol")]
+	assert placements == ["pcon_lv", "tess_lv", "tube_lv"] * 2
+	assert len(root.find("solids/tessellated")) == 8
+	# the geom-nav workload passes the geometry before the macro
+	assert g4bench.WORKLOADS["geom-nav"]["args"] == ["{gdml}"]
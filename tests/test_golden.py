@@ -0,0 +1,47 @@
+# Golden-output regression tests for the CI generators in ci/.
+#
+# Every matrix cell's rendered Dockerfile (and the package install commands)
+# must be byte-identical to the snapshot in tests/golden/. After an intended
+# change, regenerate the snapshots with `python3 tests/matrix.py` and review
+# the diff with git.
+import os
+
+import pytest
+
+import matrix
+
+GOLDEN = matrix.golden_files()
+
+
+def read_golden(rel: str) -> str:
+	path = os.path.join(matrix.GOLDEN_DIR, rel)
+	if not os.path.exists(path):
+		pytest.fail(f"missing golden file {rel}; run: python3 tests/matrix.py")
+	with open(path, encoding="utf-8") as f:
+		return f.read()
+
+
+@pytest.mark.parametrize("rel", sorted(GOLDEN))
+def test_rendered_output_matches_golden(rel):
+	assert GOLDEN[rel] == read_golden(rel), f"{rel} differs from its golden snapshot"
+
+
+def test_no_stale_golden_files():
+	on_disk = set()
+	for root, _, files in os.walk(matrix.GOLDEN_DIR):
+		for name in files:
+			on_disk.add(os.path.relpath(os.path.join(root, name), matrix.GOLDEN_DIR))
+	assert on_disk == set(GOLDEN)
+
+
+def test_matrix_matches_distros_tags():
+	# archlinux is amd64-only, every other OS is built on both architectures
+	cells = matrix.matrix_cells()
+	assert cells
+	assert not [c for c in cells if c.image == "archlinux" and c.arch == "arm64"]
+	assert len({c.name for c in cells}) == len(cells)
+
+
+def test_rendering_is_deterministic():
+	cell = matrix.matrix_cells()[0]
+	assert matrix.render_dockerfile(cell) == matrix.render_dockerfile(cell)
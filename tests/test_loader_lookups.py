@@ -0,0 +1,56 @@
+# ci/loader_lookups.py: LD_DEBUG=libs parsing and a real count where glibc
+# honors LD_DEBUG.
+import os
+import subprocess
+import sys
+
+import pytest
+
+import loader_lookups
+from matrix import CI_DIR
+
+SAMPLE = """\
+     14149:	find library=libG4run.so [0]; searching
+     14149:	 search path=/nfs/geant4/lib:/nfs/clhep/lib		(LD_LIBRARY_PATH)
+     14149:	  trying file=/nfs/geant4/lib/libG4run.so
+     14149:	
+     14149:	find library=libCLHEP-2.4.7.2.so [0]; searching
+     14149:	 search path=/nfs/geant4/lib:/nfs/clhep/lib		(LD_LIBRARY_PATH)
+     14149:	  trying file=/nfs/geant4/lib/libCLHEP-2.4.7.2.so
+     14149:	  trying file=/nfs/clhep/lib/libCLHEP-2.4.7.2.so
+     14149:	
+     14149:	find library=libc.so.6 [0]; searching
+     14149:	 search path=/nfs/geant4/lib:/nfs/clhep/lib		(LD_LIBRARY_PATH)
+     14149:	  trying file=/nfs/geant4/lib/libc.so.6
+     14149:	  trying file=/nfs/clhep/lib/libc.so.6
+     14149:	 search cache=/etc/ld.so.cache
+     14149:	  trying file=/lib/x86_64-linux-gnu/libc.so.6
+     14149:	
+     14149:	calling init: /lib/x86_64-linux-gnu/libc.so.6
+"""
+
+
+def test_parse_ld_debug():
+	assert loader_lookups.parse_ld_debug(SAMPLE) == {"libraries": 3, "lookups": 6, "failed_lookups": 3}
+	assert loader_lookups.parse_ld_debug("") == {"libraries": 0, "lookups": 0, "failed_lookups": 0}
+
+
+def test_ld_library_path_adds_lookups(tmp_path):
+	true = "/bin/true"
+	env = dict(os.environ, LD_LIBRARY_PATH=f"{tmp_path}/a:{tmp_path}/b")
+	current = loader_lookups.count_lookups([true], env)
+	if current["processes"] == 0:
+		pytest.skip("the dynamic loader ignores LD_DEBUG")
+	env.pop("LD_LIBRARY_PATH")
+	without = loader_lookups.count_lookups([true], env)
+	assert current["returncode"] == without["returncode"] == 0
+	assert current["lookups"] > without["lookups"]
+	assert current["failed_lookups"] >= 2
+
+
+def test_cli_compare_json(tmp_path):
+	result = subprocess.run([sys.executable, os.path.join(CI_DIR, "loader_lookups.py"),
+	                         "--compare-without-ld-library-path", "--json", "--", "/bin/true"],
+	                        env=dict(os.environ, LD_LIBRARY_PATH=str(tmp_path)),
+	                        capture_output=True, text=True, check=True)
+	assert "without_ld_library_path" in result.stdout
@@ -0,0 +1,163 @@
+# modules/util/module_export.py: static env files from the modulefiles,
+# checked against a shell and, where available, against the real modulecmd.
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from matrix import REPO_ROOT
+
+pytestmark = pytest.mark.skipif(shutil.which("tclsh") is None, reason="tclsh not available")
+
+OSRELEASE = "testos1-gcc1-x86_64"
+INSTALLS = ["geant4/11.4.2", "clhep/2.4.7.2", "xercesc/3.3.0", "gemc/dev"]
+CLEAN_ENV = {"PATH": "/usr/bin:/bin", "OSRELEASE": OSRELEASE}
+
+
+@pytest.fixture
+def tree(tmp_path):
+	"""A copy of modules/ with fake installs, so sim_system creates SIM_HOME in tmp."""
+	shutil.copytree(os.path.join(REPO_ROOT, "modules"), tmp_path / "modules",
+	                ignore=shutil.ignore_patterns("__pycache__"))
+	for install in INSTALLS:
+		(tmp_path / OSRELEASE / install / "lib").mkdir(parents=True)
+	return tmp_path
+
+
+def export(tree, *args, check=True) -> subprocess.CompletedProcess:
+	env = dict(CLEAN_ENV, PATH=f"{os.path.dirname(shutil.which('tclsh'))}:/usr/bin:/bin")
+	return subprocess.run([sys.executable, str(tree / "modules" / "util" / "module_export.py"), *args],
+	                      env=env, capture_output=True, text=True, check=check)
+
+
+def sourced(shell_command: list, script: str, variables: list) -> dict:
+	out = subprocess.check_output(shell_command + [script], env=CLEAN_ENV, text=True)
+	return dict(zip(variables, out.splitlines()))
+
+
+def test_geant4_with_prereqs(tree):
+	content = export(tree, "geant4/11.4.2").stdout
+	assert "# modules: clhep/2.4.7.2 xercesc/3.3.0 sim_system geant4/11.4.2" in content
+	env = sourced(["bash", "-c"], content + 'echo "$G4INSTALL"; echo "$CLHEP_DIR"; echo "$XERCESCROOT"; '
+	                              'echo "$LD_LIBRARY_PATH"; echo "${PATH%%:*}"',
+	              ["G4INSTALL", "CLHEP_DIR", "XERCESCROOT", "LD_LIBRARY_PATH", "PATH"])
+	sim_home = tree / OSRELEASE
+	assert env["G4INSTALL"] == str(sim_home / "geant4/11.4.2")
+	assert env["CLHEP_DIR"] == str(sim_home / "clhep/2.4.7.2")
+	assert env["XERCESCROOT"] == str(sim_home / "xercesc/3.3.0")
+	assert env["LD_LIBRARY_PATH"] == ":".join(str(sim_home / m / "lib")
+	                                          for m in ("geant4/11.4.2", "xercesc/3.3.0", "clhep/2.4.7.2"))
+	assert env["PATH"] == str(sim_home / "geant4/11.4.2/bin")
+
+
+def test_runpath_marker_drops_ld_library_path(tree):
+	(tree / OSRELEASE / "geant4/11.4.2" / ".g4install-runpath").write_text("# RUNPATH set\n")
+	content = export(tree, "geant4/11.4.2").stdout
+	ld_lines = [line for line in content.splitlines() if line.startswith("export LD_LIBRARY_PATH=")]
+	assert len(ld_lines) == 2
+	assert not [line for line in ld_lines if "geant4" in line]
+
+
+def test_build_variant(tree):
+	content = export(tree, "geant4/11.4.2-v3").stdout
+	assert f"export G4INSTALL='{tree / OSRELEASE / 'geant4/11.4.2-v3'}'" in content
+	assert "export G4_VERSION='11.4.2'" in content
+	assert "export G4_VARIANT='v3'" in content
+	generic = export(tree, "geant4/11.4.2").stdout
+	assert "export G4_VARIANT='generic'" in generic
+	assert "G4RUN_MANAGER_TYPE" not in generic
+	assert "export G4RUN_MANAGER_TYPE='TBB'" in export(tree, "geant4/11.4.2-tbb").stdout
+
+
+def test_vecgeom_variant_loads_vecgeom(tree):
+	(tree / OSRELEASE / "vecgeom/1.2.10/lib").mkdir(parents=True)
+	content = export(tree, "geant4/11.4.2-vecgeom").stdout
+	assert "# modules: clhep/2.4.7.2 xercesc/3.3.0 vecgeom/1.2.10 sim_system geant4/11.4.2-vecgeom" in content
+	vecgeom = tree / OSRELEASE / "vecgeom/1.2.10"
+	assert f"export VECGEOM_BASE_DIR='{vecgeom}'" in content
+	assert f"export VecGeom_DIR='{vecgeom}/lib/cmake/VecGeom'" in content
+
+
+def test_default_version_and_gemc(tree):
+	default = export(tree, "geant4").stdout.split("\n", 1)[1]
+	explicit = export(tree, "geant4/11.4.2").stdout.split("\n", 1)[1]
+	assert default == explicit
+	gemc = export(tree, "gemc/dev").stdout
+	assert f"export GEMC='{tree / OSRELEASE / 'gemc/dev'}'" in gemc
+
+
+def test_csh_flavor(tree):
+	csh = shutil.which("tcsh") or shutil.which("csh")
+	if csh is None:
+		pytest.skip("csh not available")
+	content = export(tree, "geant4/11.4.2", "--shell", "csh").stdout
+	script = tree / "geant4.csh"
+	script.write_text(content)
+	env = sourced([csh, "-f", "-c"], f"source {script}; printenv G4INSTALL; printenv LD_LIBRARY_PATH",
+	              ["G4INSTALL", "LD_LIBRARY_PATH"])
+	assert env["G4INSTALL"] == str(tree / OSRELEASE / "geant4/11.4.2")
+	assert env["LD_LIBRARY_PATH"].count(":") == 2
+
+
+def test_check_detects_changes(tree):
+	output = tree / "geant4.sh"
+	export(tree, "geant4/11.4.2", "-o", str(output))
+	assert export(tree, "geant4/11.4.2", "--check", str(output), check=False).returncode == 0
+	with open(tree / "modules" / "geant4" / ".common", "a") as f:
+		f.write("setenv G4_EXTRA 1\n")
+	assert export(tree, "geant4/11.4.2", "--check", str(output), check=False).returncode == 1
+
+
+def test_concurrent_loads_create_sim_home(tree):
+	shutil.rmtree(tree / OSRELEASE)
+	env = dict(CLEAN_ENV, PATH=f"{os.path.dirname(shutil.which('tclsh'))}:/usr/bin:/bin")
+	jobs = [subprocess.Popen([sys.executable, str(tree / "modules" / "util" / "module_export.py"), "sim_system"],
+	                         env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+	        for _ in range(8)]
+	for job in jobs:
+		assert job.wait() == 0, job.stderr.read()
+	assert (tree / OSRELEASE).is_dir()
+
+
+def test_user_osrelease_is_kept(tree):
+	# set by the user: not exported, so that unloading sim_system keeps it
+	content = export(tree, "sim_system").stdout
+	assert "OSRELEASE" not in content
+	assert f"export SIM_HOME='{tree / OSRELEASE}'" in content
+	# computed: exported, with the marker that lets unload remove it
+	env = {"PATH": f"{os.path.dirname(shutil.which('tclsh'))}:/usr/bin:/bin"}
+	content = subprocess.run([sys.executable, str(tree / "modules" / "util" / "module_export.py"), "sim_system"],
+	                         env=env, capture_output=True, text=True, check=True).stdout
+	assert "export OSRELEASE=" in content
+	assert "export SIM_SYSTEM_OSRELEASE='1'" in content
+
+
+def test_unknown_module(tree):
+	result = export(tree, "geant4/0.0", check=False)
+	assert result.returncode == 2
+	assert "unable to locate a modulefile for 'geant4/0.0'" in result.stderr
+
+
+def modulecmd() -> list:
+	for candidate in (os.environ.get("MODULES_CMD", ""), "/usr/share/Modules/libexec/modulecmd.tcl",
+	                  "/usr/lib/x86_64-linux-gnu/modulecmd.tcl", "/usr/lib/aarch64-linux-gnu/modulecmd.tcl"):
+		if candidate and os.path.isfile(candidate):
+			return [shutil.which("tclsh"), candidate]
+	return []
+
+
+@pytest.mark.skipif(not modulecmd(), reason="Environment Modules not installed")
+@pytest.mark.parametrize("module", ["geant4/11.4.2", "gemc/dev"])
+def test_matches_module_load(tree, module):
+	content = export(tree, module).stdout
+	variables = sorted({line.split("=", 1)[0][len("export "):] for line in content.splitlines()
+	                    if line.startswith("export ")})
+	printer = "".join(f'echo "${{{v}}}"; ' for v in variables)
+	exported = sourced(["bash", "-c"], content + printer, variables)
+	load = subprocess.check_output(modulecmd() + ["sh", "load", module], text=True,
+	                               env=dict(CLEAN_ENV, MODULEPATH=str(tree / "modules"),
+	                                          MODULES_AUTO_HANDLING="1"))
+	loaded = sourced(["bash", "-c"], load + "\n" + printer, variables)
+	assert exported == loaded
@@ -0,0 +1,66 @@
+# modules/util/functions.tcl helpers, run with plain tclsh: they must give the
+# same answers as modules/util/osrelease.py without forking any process.
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from matrix import REPO_ROOT
+
+FUNCTIONS_TCL = os.path.join(REPO_ROOT, "modules", "util", "functions.tcl")
+OSRELEASE_PY = os.path.join(REPO_ROOT, "modules", "util", "osrelease.py")
+
+pytestmark = pytest.mark.skipif(shutil.which("tclsh") is None, reason="tclsh not available")
+
+# any exec from the helpers fails the script
+NO_EXEC = 'rename exec {}\nproc exec args { error "exec called: $args" }\n'
+
+
+def tcl(body: str, env: dict = None) -> str:
+	script = f"source {FUNCTIONS_TCL}\n{NO_EXEC}{body}\n"
+	environ = {k: v for k, v in os.environ.items() if k != "OSRELEASE"}
+	environ.update(env or {})
+	result = subprocess.run([shutil.which("tclsh")], input=script, env=environ, capture_output=True, text=True)
+	assert result.returncode == 0, result.stderr
+	return result.stdout.strip()
+
+
+def test_home_is_repo_root():
+	assert tcl("puts [home]") == REPO_ROOT
+
+
+def test_osrelease_matches_python():
+	expected = subprocess.check_output([sys.executable, OSRELEASE_PY], text=True).strip()
+	assert tcl("puts [osrelease]") == expected
+
+
+def test_osrelease_prefers_environment():
+	assert tcl("puts [osrelease]", {"OSRELEASE": "exported-gcc1-x86_64"}) == "exported-gcc1-x86_64"
+
+
+def test_osrelease_memoized():
+	assert tcl("osrelease\nputs [info exists ::g4install_osrelease]") == "1"
+
+
+def test_gcc_version_from_symlink(tmp_path):
+	bin_dir = tmp_path / "bin"
+	bin_dir.mkdir()
+	(bin_dir / "gcc-99").write_text("#!/bin/sh\n")
+	(bin_dir / "gcc-99").chmod(0o755)
+	(bin_dir / "gcc").symlink_to("gcc-99")
+	assert tcl("puts [gcc_version]", {"PATH": str(bin_dir)}) == "gcc99"
+
+
+def test_gcc_version_from_prefix(tmp_path):
+	bin_dir = tmp_path / "bin"
+	bin_dir.mkdir()
+	(bin_dir / "gcc").write_text("#!/bin/sh\n")
+	(bin_dir / "gcc").chmod(0o755)
+	(tmp_path / "lib" / "gcc" / "x86_64-pc-linux-gnu" / "15.1.1").mkdir(parents=True)
+	assert tcl("puts [gcc_version]", {"PATH": str(bin_dir)}) == "gcc15"
+
+	# ambiguous: leave it to osrelease.py
+	(tmp_path / "lib" / "gcc" / "x86_64-pc-linux-gnu" / "14.2.0").mkdir()
+	assert tcl("puts [gcc_version]", {"PATH": str(bin_dir)}) == ""
@@ -0,0 +1,286 @@
+# Tests of ci/package_install.sh against a small fake Geant4/CLHEP/Xerces-C install.
+import os
+import shutil
+import subprocess
+import tarfile
+
+import pytest
+
+import cvmfs_publish
+from matrix import REPO_ROOT
+
+PACKAGER = os.path.join(REPO_ROOT, "ci", "package_install.sh")
+PACKAGE = "geant4-11.4.2-test-amd64"
+DATASETS = {
+	"G4LEDATA": "G4EMLOW8.8",
+	"G4ENSDFSTATEDATA": "G4ENSDFSTATE3.0",
+	"G4NEUTRONHPDATA": "G4NDL4.7.1",
+}
+
+needs_runpath_tools = pytest.mark.skipif(not all(shutil.which(t) for t in ("cc", "zsh", "patchelf", "readelf")),
+                                         reason="needs a C compiler, zsh, patchelf and readelf")
+needs_cc = pytest.mark.skipif(not all(shutil.which(t) for t in ("cc", "objcopy", "objdump")),
+                              reason="needs a C compiler and binutils")
+
+
+def write(path, content, mode=0o644):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(path, "w", encoding="utf-8") as f:
+		f.write(content)
+	os.chmod(path, mode)
+
+
+@pytest.fixture
+def fake_install(tmp_path):
+	"""A module-style SIM_HOME tree plus the environment `module load geant4` sets."""
+	home = tmp_path / "sim"
+	g4 = home / "geant4" / "11.4.2"
+	clhep = home / "clhep" / "2.4.7.2"
+	xercesc = home / "xercesc" / "3.3.0"
+
+	write(str(g4 / "bin" / "geant4-config"), "#!/bin/sh\necho 11.4.2\n", 0o755)
+	write(str(g4 / "include" / "Geant4" / "G4Version.hh"), "#define G4VERSION_NUMBER 1142\n")
+	write(str(g4 / "lib" / "libG4global.a"), "!<arch>\n")
+	data = g4 / "share" / "Geant4" / "data"
+	for directory in DATASETS.values():
+		write(str(data / directory / "README"), f"{directory}\n")
+	write(str(g4 / "share" / "Geant4" / "geant4make" / "geant4make.sh"), "# make\n")
+	write(str(clhep / "include" / "CLHEP" / "Units.h"), "// same\n")
+	write(str(clhep / "include" / "CLHEP" / "Units-copy.h"), "// same\n")
+	write(str(clhep / "lib" / "libCLHEP.a"), "!<arch>\n")
+	write(str(xercesc / "lib" / "libxerces-c.a"), "!<arch>\n")
+
+	if shutil.which("cc"):
+		src = tmp_path / "g4global.c"
+		src.write_text("int g4global(void) { return 42; }\n")
+		subprocess.check_call(["cc", "-g", "-shared", "-fPIC", "-o",
+		                       str(g4 / "lib" / "libG4global.so"), str(src)])
+
+	env = {k: v for k, v in os.environ.items() if not (k.startswith("G4") and k.endswith("DATA"))}
+	env.update({f"{name}": str(data / directory) for name, directory in DATASETS.items()})
+	env.update({
+		"G4INSTALL": str(g4),
+		"CLHEP_BASE_DIR": str(clhep),
+		"XERCESCROOT": str(xercesc),
+		"GEANT4_VERSION": "11.4.2",
+		# keep a real geant4-config off the PATH: the datasets come from G4*DATA
+		"PATH": "/usr/bin:/bin",
+	})
+	return env
+
+
+def package(tmp_path, env, *options):
+	dist = tmp_path / "dist"
+	out = subprocess.run(["bash", PACKAGER, *options, str(dist), PACKAGE],
+	                     env=env, check=True, capture_output=True, text=True)
+	tarballs = [line for line in out.stdout.splitlines() if line.endswith(".tar.gz")]
+	return dist, tarballs
+
+
+def members(tarball):
+	with tarfile.open(tarball) as tar:
+		return {m.name: m for m in tar.getmembers()}
+
+
+def test_default_package_layout(tmp_path, fake_install):
+	dist, tarballs = package(tmp_path, fake_install)
+	assert tarballs == [str(dist / f"{PACKAGE}.tar.gz")]
+	assert (dist / f"{PACKAGE}.manifest.json").exists()
+	names = members(tarballs[0])
+	assert f"{PACKAGE}/geant4.env" in names
+	assert f"{PACKAGE}/geant4-manifest.json" in names
+	assert f"{PACKAGE}/update_geant4.py" in names
+	assert f"{PACKAGE}/g4bench" in names
+	assert f"{PACKAGE}/install_geant4_data.sh" in names
+	assert f"{PACKAGE}/geant4/11.4.2/lib/libG4global.a" in names
+	assert f"{PACKAGE}/geant4/11.4.2/share/Geant4/geant4make/geant4make.sh" in names
+	assert not [n for n in names if "/data/" in n]
+	with tarfile.open(tarballs[0]) as tar:
+		env = tar.extractfile(f"{PACKAGE}/geant4.env").read().decode()
+	assert ('export LD_LIBRARY_PATH="${G4INSTALL}/lib:${CLHEP_BASE_DIR}/lib:${XERCESCROOT}/lib:${LD_LIBRARY_PATH:-}"'
+	        in env)
+
+
+def test_staging_leaves_install_untouched(tmp_path, fake_install):
+	before = sorted(os.walk(fake_install["G4INSTALL"]))
+	package(tmp_path, fake_install, "--dedupe", "--split-static")
+	assert sorted(os.walk(fake_install["G4INSTALL"])) == before
+
+
+def test_split_static(tmp_path, fake_install):
+	dist, tarballs = package(tmp_path, fake_install, "--split-static")
+	assert tarballs == [str(dist / f"{PACKAGE}.tar.gz"), str(dist / f"{PACKAGE}-static.tar.gz")]
+	runtime = members(tarballs[0])
+	static = members(tarballs[1])
+	assert not [n for n in runtime if n.endswith(".a")]
+	assert f"{PACKAGE}/geant4/11.4.2/lib/libG4global.a" in static
+	assert f"{PACKAGE}/clhep/2.4.7.2/lib/libCLHEP.a" in static
+
+
+def test_dedupe_hard_links_identical_files(tmp_path, fake_install):
+	include = os.path.join(fake_install["CLHEP_BASE_DIR"], "include", "CLHEP")
+	# names the hash tools escape in their text output
+	for odd in ("back\\slash.h", "new\nline.h"):
+		write(os.path.join(include, odd), "// same\n")
+	_, tarballs = package(tmp_path, fake_install, "--dedupe")
+	names = members(tarballs[0])
+	headers = ("Units.h", "Units-copy.h", "back\\slash.h", "new\nline.h")
+	units = [names[f"{PACKAGE}/clhep/2.4.7.2/include/CLHEP/{h}"] for h in headers]
+	assert sum(m.islnk() for m in units) == 3
+
+
+@needs_cc
+def test_strip_debug(tmp_path, fake_install):
+	dist, tarballs = package(tmp_path, fake_install, "--strip-debug")
+	assert str(dist / f"{PACKAGE}-debug.tar.gz") in tarballs
+	debug = members(tarballs[1])
+	assert f"{PACKAGE}/geant4/11.4.2/lib/libG4global.so.debug" in debug
+
+	unpacked = tmp_path / "unpacked"
+	for tarball in tarballs:
+		with tarfile.open(tarball) as tar:
+			tar.extractall(unpacked)
+	lib = unpacked / PACKAGE / "geant4" / "11.4.2" / "lib" / "libG4global.so"
+	sections = subprocess.check_output(["objdump", "-h", str(lib)], text=True)
+	assert ".debug_info" not in sections
+	assert ".gnu_debuglink" in sections
+
+
+@needs_runpath_tools
+def test_runpath(tmp_path, fake_install):
+	before = sorted(os.walk(fake_install["G4INSTALL"]))
+	_, tarballs = package(tmp_path, fake_install, "--runpath")
+	assert sorted(os.walk(fake_install["G4INSTALL"])) == before
+
+	unpacked = tmp_path / "unpacked"
+	with tarfile.open(tarballs[0]) as tar:
+		tar.extractall(unpacked)
+	root = unpacked / PACKAGE
+	assert (root / "geant4" / "11.4.2" / ".g4install-runpath").exists()
+	dynamic = subprocess.check_output(["readelf", "-d", str(root / "geant4" / "11.4.2" / "lib" / "libG4global.so")],
+	                                  text=True)
+	assert "RUNPATH" in dynamic and "[$ORIGIN:$ORIGIN/../../../clhep/2.4.7.2/lib:" in dynamic
+	assert "export LD_LIBRARY_PATH" not in (root / "geant4.env").read_text()
+
+
+@pytest.fixture
+def unpacked(tmp_path, fake_install):
+	"""The runtime tarball unpacked, plus a directory serving the dataset archives."""
+	_, tarballs = package(tmp_path, fake_install)
+	home = tmp_path / "home"
+	with tarfile.open(tarballs[0]) as tar:
+		tar.extractall(home)
+
+	mirror = tmp_path / "mirror"
+	mirror.mkdir()
+	for directory in DATASETS.values():
+		src = tmp_path / "src"
+		write(str(src / directory / "README"), f"{directory}\n")
+		archive = {"G4EMLOW8.8": "G4EMLOW.8.8", "G4ENSDFSTATE3.0": "G4ENSDFSTATE.3.0",
+		           "G4NDL4.7.1": "G4NDL.4.7.1"}[directory]
+		with tarfile.open(mirror / f"{archive}.tar.gz", "w:gz") as tar:
+			tar.add(src / directory, arcname=directory)
+	return home / PACKAGE, mirror
+
+
+def source_env(home, mirror, **env):
+	script = f'source "{home}/geant4.env" && echo "G4LEDATA=$G4LEDATA"'
+	full_env = {"PATH": "/usr/bin:/bin", "GEANT4_DATA_BASE_URL": f"file://{mirror}", **env}
+	return subprocess.run(["bash", "-c", script], env=full_env, capture_output=True, text=True)
+
+
+def test_datasets_manifest(unpacked):
+	home, _ = unpacked
+	manifest = dict(line.split("|") for line in (home / "geant4-datasets.manifest").read_text().splitlines())
+	assert manifest["EM"] == "G4LEDATA G4ENSDFSTATEDATA"
+	assert manifest["QGSP_BIC_HP"] == "G4LEDATA G4ENSDFSTATEDATA G4NEUTRONHPDATA"
+
+
+def test_env_requires_all_data_by_default(unpacked):
+	home, mirror = unpacked
+	result = source_env(home, mirror)
+	assert result.returncode != 0
+	assert "GEANT4_DATA_LAZY=1" in result.stderr
+
+
+def test_lazy_mode_fetches_physics_list_datasets(unpacked):
+	home, mirror = unpacked
+	result = source_env(home, mirror, GEANT4_DATA_LAZY="1", GEANT4_PHYSICS_LIST="FTFP_BERT_EMZ")
+	assert result.returncode == 0, result.stderr
+	assert f"G4LEDATA={home}/geant4-data/G4EMLOW8.8" in result.stdout
+	assert sorted(os.listdir(home / "geant4-data")) == ["G4EMLOW8.8", "G4ENSDFSTATE3.0"]
+
+	# second source: nothing left to download
+	result = source_env(home, mirror, GEANT4_DATA_LAZY="1", GEANT4_PHYSICS_LIST="FTFP_BERT_EMZ")
+	assert "Downloading" not in result.stderr
+
+
+def test_env_sets_thread_limits(unpacked):
+	home, mirror = unpacked
+	script = f'source "{home}/geant4.env" && echo "$G4FORCENUMBEROFTHREADS $OMP_NUM_THREADS"'
+	env = {"PATH": "/usr/bin:/bin", "GEANT4_DATA_LAZY": "1", "G4_THREADS": "3", "OMP_NUM_THREADS": "1"}
+	result = subprocess.run(["bash", "-c", script], env=env, capture_output=True, text=True)
+	assert result.returncode == 0, result.stderr
+	assert result.stdout.split() == ["3", "1"]
+
+
+def test_lazy_mode_without_physics_list_only_sets_variables(unpacked):
+	home, mirror = unpacked
+	result = source_env(home, mirror, GEANT4_DATA_LAZY="1")
+	assert result.returncode == 0, result.stderr
+	assert not (home / "geant4-data").exists()
+
+
+def test_install_data_by_name_and_unknown_physics_list(unpacked):
+	home, mirror = unpacked
+	env = {"PATH": "/usr/bin:/bin", "GEANT4_DATA_BASE_URL": f"file://{mirror}"}
+	subprocess.run([str(home / "install_geant4_data.sh"), "G4NEUTRONHPDATA"], env=env, check=True,
+	               capture_output=True)
+	assert os.listdir(home / "geant4-data") == ["G4NDL4.7.1"]
+
+	result = subprocess.run([str(home / "install_geant4_data.sh"), "--physics-list", "NOPE"], env=env,
+	                        capture_output=True, text=True)
+	assert result.returncode != 0
+	assert "FTFP_BERT" in result.stderr
+
+	# EM option suffixes, including the double underscore ones
+	for name in ("FTFP_BERT_EMZ", "FTFP_BERT__GS", "QGSP_BIC__SS", "QGSP_BIC_HP_EMZ"):
+		result = subprocess.run([str(home / "install_geant4_data.sh"), "--physics-list", name, "--list"], env=env,
+		                        capture_output=True, text=True)
+		assert result.returncode == 0, f"{name}: {result.stderr}"
+
+
+@pytest.mark.parametrize("mv_has_t", [True, False])
+def test_install_data_concurrent_job_wins(tmp_path, unpacked, mv_has_t):
+	home, mirror = unpacked
+	# mv as if another job renamed its copy of the dataset into place just before
+	fake_bin = tmp_path / "bin"
+	fake_bin.mkdir()
+	(fake_bin / "mv").write_text(
+		"#!/bin/sh\n"
+		'for target; do :; done\n'
+		'[ -d "$target" ] || { mkdir -p "$target" && echo other > "$target/README"; }\n'
+		+ ("" if mv_has_t else '[ "$1" = "-T" ] && exit 1\n')
+		+ 'exec /bin/mv "$@"\n')
+	(fake_bin / "mv").chmod(0o755)
+	env = {"PATH": f"{fake_bin}:/usr/bin:/bin", "GEANT4_DATA_BASE_URL": f"file://{mirror}"}
+	result = subprocess.run([str(home / "install_geant4_data.sh"), "G4LEDATA"], env=env, capture_output=True,
+	                        text=True)
+	assert result.returncode == 0, result.stderr
+	assert os.listdir(home / "geant4-data" / "G4EMLOW8.8") == ["README"]
+	assert (home / "geant4-data" / "G4EMLOW8.8" / "README").read_text() == "other\n"
+
+
+def test_install_data_from_packs(tmp_path, unpacked):
+	home, _ = unpacked
+	packs = tmp_path / "packs"
+	packs.mkdir()
+	write(str(tmp_path / "datasets" / "G4EMLOW8.8" / "README"), "packed\n")
+	cvmfs_publish.pack_dataset(str(tmp_path / "datasets" / "G4EMLOW8.8"), str(packs))
+
+	# no mirror: the pack is the only source
+	env = {"PATH": "/usr/bin:/bin", "GEANT4_DATA_BASE_URL": f"file://{tmp_path}/none", "GEANT4_DATA_PACK_DIR": str(packs)}
+	result = subprocess.run([str(home / "install_geant4_data.sh"), "G4LEDATA"], env=env, capture_output=True, text=True)
+	assert result.returncode == 0, result.stderr
+	assert "Unpacking G4LEDATA" in result.stdout
+	assert (home / "geant4-data" / "G4EMLOW8.8" / "README").read_text() == "packed\n"
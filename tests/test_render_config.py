@@ -0,0 +1,37 @@
+# RenderConfig: validated once, memoized, immutable and picklable.
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+from functions import InvalidImageError, RenderConfig, render_config
+from matrix import CI_DIR, os_pairs
+
+
+def test_invalid_image_raises():
+	with pytest.raises(InvalidImageError, match="invalid image 'gentoo'"):
+		render_config("gentoo", "latest")
+
+
+def test_invalid_image_cli_exit_code():
+	result = subprocess.run([sys.executable, "dockerfile_creator.py", "-i", "gentoo", "-t", "1"],
+	                        cwd=CI_DIR, capture_output=True, text=True)
+	assert result.returncode == 1
+	assert "invalid image 'gentoo'" in result.stderr
+
+
+def test_memoized():
+	assert render_config("ubuntu", "24.04") is render_config("ubuntu", "24.04")
+	assert render_config("ubuntu", "24.04") is not render_config("ubuntu", "26.04")
+
+
+@pytest.mark.parametrize("image,tag", os_pairs())
+def test_frozen_hashable_picklable(image, tag):
+	cfg = render_config(image, tag)
+	with pytest.raises(AttributeError):
+		cfg.image = "other"
+	assert {cfg: 1}[cfg] == 1
+	clone = pickle.loads(pickle.dumps(cfg))
+	assert isinstance(clone, RenderConfig) and clone == cfg
+	assert cfg.ca_certificate.endswith("JLabCA.crt")
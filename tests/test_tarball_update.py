@@ -0,0 +1,232 @@
+# Tests of ci/tarball_update.py: manifests and incremental updates over HTTP.
+import functools
+import json
+import os
+import shutil
+import tarfile
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import tarball_update
+
+CHUNK = 1024
+
+
+def write(path, data: bytes, mode=0o644):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(path, "wb") as f:
+		f.write(data)
+	os.chmod(path, mode)
+
+
+def tree_contents(root):
+	contents = {}
+	for rel, st in tarball_update.walk_tree(root):
+		path = os.path.join(root, rel)
+		contents[rel] = os.readlink(path) if os.path.islink(path) else open(path, "rb").read()
+	return contents
+
+
+def publish(root, public, name):
+	manifest = tarball_update.create_manifest(str(root), name, CHUNK, str(public / "chunks"))
+	with open(public / f"{name}.manifest.json", "w") as f:
+		json.dump(manifest, f)
+	return manifest
+
+
+@pytest.fixture
+def server(tmp_path):
+	public = tmp_path / "public"
+	public.mkdir()
+	handler = functools.partial(SimpleHTTPRequestHandler, directory=str(public))
+	httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+	thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+	thread.start()
+	yield public, f"http://127.0.0.1:{httpd.server_address[1]}"
+	httpd.shutdown()
+
+
+@pytest.fixture
+def nightlies(tmp_path):
+	v1 = tmp_path / "v1"
+	write(str(v1 / "geant4.env"), b"export G4=1\n")
+	write(str(v1 / "bin" / "geant4-config"), b"#!/bin/sh\n" + b"x" * 100, 0o755)
+	write(str(v1 / "lib" / "libG4big.so"), b"".join(bytes([i]) * CHUNK for i in range(5)))
+	write(str(v1 / "lib" / "libG4old.so"), b"old" * 500)
+	os.symlink("libG4big.so", v1 / "lib" / "libG4big.so.1")
+
+	v2 = tmp_path / "v2"
+	shutil.copytree(v1, v2, symlinks=True)
+	# one chunk of five changes, one file goes away, one is new
+	big = bytearray((v2 / "lib" / "libG4big.so").read_bytes())
+	big[2 * CHUNK:3 * CHUNK] = b"z" * CHUNK
+	write(str(v2 / "lib" / "libG4big.so"), bytes(big))
+	os.remove(v2 / "lib" / "libG4old.so")
+	write(str(v2 / "lib" / "libG4new.so"), b"new" * 100)
+	os.remove(v2 / "lib" / "libG4big.so.1")
+	os.symlink("libG4new.so", v2 / "lib" / "libG4big.so.1")
+	return v1, v2
+
+
+def unpack(v1, tmp_path, with_manifest=True):
+	install = tmp_path / "install"
+	shutil.copytree(v1, install, symlinks=True)
+	if with_manifest:
+		manifest = tarball_update.create_manifest(str(install), "v1", CHUNK)
+		with open(install / tarball_update.MANIFEST_NAME, "w") as f:
+			json.dump(manifest, f)
+	write(str(install / "geant4-data" / "G4EMLOW8.8" / "README"), b"user data")
+	return install
+
+
+def test_manifest_lists_files_and_symlinks(nightlies):
+	v1, _ = nightlies
+	manifest = tarball_update.create_manifest(str(v1), "v1", CHUNK)
+	assert manifest["symlinks"] == {"lib/libG4big.so.1": "libG4big.so"}
+	assert len(manifest["files"]["lib/libG4big.so"]["chunks"]) == 5
+	assert manifest["files"]["bin/geant4-config"]["mode"] == "755"
+
+
+@pytest.mark.parametrize("with_manifest", [True, False])
+def test_update_downloads_only_changed_chunks(tmp_path, server, nightlies, with_manifest):
+	public, url = server
+	v1, v2 = nightlies
+	publish(v1, public, "v1")
+	publish(v2, public, "v2")
+	install = unpack(v1, tmp_path, with_manifest)
+
+	stats = tarball_update.update(str(install), f"{url}/v2.manifest.json", f"{url}/chunks", log=lambda _: None)
+
+	assert stats["files_changed"] == 2
+	# the modified chunk of libG4big.so and the single chunk of libG4new.so
+	assert stats["chunks_downloaded"] == 2
+	assert stats["chunks_reused"] == 4
+	assert stats["files_removed"] == (1 if with_manifest else 0)
+
+	contents = tree_contents(str(install))
+	expected = tree_contents(str(v2))
+	if not with_manifest:
+		# without a previous manifest nothing can be safely removed
+		expected["lib/libG4old.so"] = contents["lib/libG4old.so"]
+	assert contents == expected
+	assert os.stat(install / "bin" / "geant4-config").st_mode & 0o777 == 0o755
+	assert (install / "geant4-data" / "G4EMLOW8.8" / "README").read_bytes() == b"user data"
+
+	# up to date: a second update transfers nothing
+	stats = tarball_update.update(str(install), f"{url}/v2.manifest.json", f"{url}/chunks", log=lambda _: None)
+	assert stats["files_changed"] == 0
+	assert stats["chunks_downloaded"] == 0
+
+
+def test_corrupted_chunk_is_rejected(tmp_path, server, nightlies):
+	public, url = server
+	v1, v2 = nightlies
+	manifest = publish(v2, public, "v2")
+	digest = manifest["files"]["lib/libG4new.so"]["chunks"][0]
+	write(tarball_update.chunk_path(str(public / "chunks"), digest), b"corrupted")
+	install = unpack(v1, tmp_path)
+
+	with pytest.raises(tarball_update.UpdateError):
+		tarball_update.update(str(install), f"{url}/v2.manifest.json", f"{url}/chunks", log=lambda _: None)
+	# nothing was replaced
+	assert not (install / "lib" / "libG4new.so").exists()
+
+
+def test_mode_change_is_applied(tmp_path, server, nightlies):
+	public, url = server
+	v1, _ = nightlies
+	install = unpack(v1, tmp_path)
+	os.chmod(v1 / "bin" / "geant4-config", 0o700)
+	publish(v1, public, "v1-mode")
+
+	stats = tarball_update.update(str(install), f"{url}/v1-mode.manifest.json", f"{url}/chunks",
+	                              log=lambda _: None)
+	assert stats["files_changed"] == 1
+	assert stats["chunks_downloaded"] == 0
+	assert os.stat(install / "bin" / "geant4-config").st_mode & 0o777 == 0o700
+
+
+@pytest.mark.parametrize("files,symlinks", [
+	({"../outside": None}, {}),
+	({"/tmp/outside": None}, {}),
+	({"lib/../../outside": None}, {}),
+	({"escape/outside": None}, {}),
+	({}, {"lib/evil": "../../outside"}),
+	({}, {"lib/evil": "/etc"}),
+])
+def test_malicious_manifest_is_rejected(tmp_path, server, nightlies, files, symlinks):
+	public, url = server
+	v1, _ = nightlies
+	install = unpack(v1, tmp_path)
+	# a directory symlink of the install pointing out of it
+	os.symlink(str(tmp_path), install / "escape")
+	manifest = publish(v1, public, "v1")
+	entry = manifest["files"]["geant4.env"]
+	manifest["files"].update({rel: entry for rel in files})
+	manifest["symlinks"].update(symlinks)
+	with open(public / "evil.manifest.json", "w") as f:
+		json.dump(manifest, f)
+	before = sorted(os.listdir(tmp_path))
+
+	with pytest.raises(tarball_update.UpdateError, match="outside|relative path"):
+		tarball_update.update(str(install), f"{url}/evil.manifest.json", f"{url}/chunks", log=lambda _: None)
+	assert sorted(os.listdir(tmp_path)) == before
+	assert not os.path.exists("/tmp/outside")
+
+
+def test_invalid_chunk_name_is_rejected(tmp_path, server, nightlies):
+	public, url = server
+	v1, _ = nightlies
+	install = unpack(v1, tmp_path)
+	manifest = publish(v1, public, "v1")
+	manifest["files"]["geant4.env"]["chunks"] = ["../../../outside"]
+	with open(public / "evil.manifest.json", "w") as f:
+		json.dump(manifest, f)
+	with pytest.raises(tarball_update.UpdateError, match="invalid chunk"):
+		tarball_update.update(str(install), f"{url}/evil.manifest.json", f"{url}/chunks", log=lambda _: None)
+
+
+def publish_tarball(root, public, name):
+	"""<name>.tar.gz with a <name>/ top-level directory, and its sidecar manifest (no chunk store)."""
+	manifest = tarball_update.create_manifest(str(root), name, CHUNK)
+	with open(public / f"{name}.manifest.json", "w") as f:
+		json.dump(manifest, f)
+	with tarfile.open(public / f"{name}.tar.gz", "w:gz") as tar:
+		tar.add(str(root), arcname=name)
+	return manifest
+
+
+def test_update_from_tarball(tmp_path, server, nightlies):
+	public, url = server
+	v1, v2 = nightlies
+	# a hard link to a changed file (package_install.sh --dedupe)
+	os.link(v2 / "lib" / "libG4new.so", v2 / "lib" / "libG4new-copy.so")
+	publish_tarball(v2, public, "v2")
+	install = unpack(v1, tmp_path)
+
+	stats = tarball_update.update(str(install), f"{url}/v2.manifest.json", log=lambda _: None)
+
+	assert stats["files_changed"] == 3
+	assert stats["chunks_downloaded"] == 2
+	assert stats["chunks_reused"] == 4
+	assert stats["bytes_downloaded"] == (public / "v2.tar.gz").stat().st_size
+	assert tree_contents(str(install)) == tree_contents(str(v2))
+	assert (install / "geant4-data" / "G4EMLOW8.8" / "README").read_bytes() == b"user data"
+
+
+def test_update_from_tarball_missing_chunks(tmp_path, server, nightlies):
+	public, url = server
+	v1, v2 = nightlies
+	publish_tarball(v1, public, "v2")
+	# the manifest of v2 with the tarball of v1
+	manifest = tarball_update.create_manifest(str(v2), "v2", CHUNK)
+	with open(public / "v2.manifest.json", "w") as f:
+		json.dump(manifest, f)
+	install = unpack(v1, tmp_path)
+	with pytest.raises(tarball_update.UpdateError, match="not found in the tarball"):
+		tarball_update.update(str(install), f"{url}/v2.manifest.json", log=lambda _: None)
+	assert not (install / "lib" / "libG4new.so").exists()
+	with pytest.raises(tarball_update.UpdateError, match="no chunk store"):
+		tarball_update.update(str(install), f"{url}/v2.json", log=lambda _: None)